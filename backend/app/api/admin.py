@@ -3,10 +3,12 @@ from datetime import datetime
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
-from ..crud import _dump_list, dump_user_data
+from ..crud import _dump_list, dump_user_data, record_lapses
 from ..db import get_db
+from ..forecast import invalidate_forecast
 from ..models import Card, Collection, StudyLog, User
-from ..schemas import DumpResponse, HealthResponse, SyncRequest, SyncResponse
+from ..schemas import DumpResponse, HealthResponse, ReplayResponse, SyncRequest, SyncResponse
+from ..services.replay import replay_users
 from .utils import get_current_user
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -165,6 +167,7 @@ def sync_user(
 
     db.commit()
 
+    new_logs: list[StudyLog] = []
     for incoming in payload.study_logs:
         incoming_card_id = id_map["cards"].get(str(incoming.card_id), incoming.card_id)
         existing = db.query(StudyLog).filter(
@@ -184,7 +187,24 @@ def sync_user(
             last_modified=now
         )
         db.add(log)
+        new_logs.append(log)
         received["study_logs"] += 1
 
+    record_lapses(db, owner_id, new_logs)
     db.commit()
+    invalidate_forecast(owner_id)
     return SyncResponse(status="accepted", received=received, id_map=id_map)
+
+
+@router.post("/replay", response_model=ReplayResponse)
+def replay_study_logs(
+    current_user: User = Depends(get_current_user)
+) -> ReplayResponse:
+    stats = replay_users([current_user.id])
+    return ReplayResponse(
+        users=stats.users,
+        cards=stats.cards,
+        logs=stats.logs,
+        seconds=stats.seconds,
+        cards_per_second=stats.cards_per_second
+    )
@@ -6,7 +6,9 @@ from uuid import uuid4
 
 import httpx
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from jose import JWTError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from ..config import settings
@@ -19,7 +21,7 @@ from ..crud import (
     store_refresh_token,
     update_user_settings
 )
-from ..db import get_db
+from ..db import get_async_db, get_db
 from ..models import User
 from ..schemas import (
     AuthLoginRequest,
@@ -119,53 +121,50 @@ def _fetch_google_token_info(id_token: str) -> dict:
     return response.json()
 
 
-@router.post("/register", response_model=AuthResponse)
-def register(payload: AuthRegisterRequest, db: Session = Depends(get_db)) -> AuthResponse:
+def _issue_tokens(db: Session, user: User) -> AuthResponse:
+    access_token, access_expires = create_access_token(user.id)
+    refresh_token, refresh_expires, _ = create_refresh_token(user.id)
+    store_refresh_token(db, user.id, hash_token(refresh_token), refresh_expires)
+    return _build_auth_response(user, access_token, refresh_token, access_expires)
+
+
+def _ensure_available(db: Session, payload: AuthRegisterRequest) -> None:
     if get_user_by_username(db, payload.username):
         raise HTTPException(status_code=400, detail="Username already exists")
     if payload.email and get_user_by_email(db, payload.email):
         raise HTTPException(status_code=400, detail="Email already exists")
 
-    hashed = hash_password(payload.password)
+
+def _register_user(db: Session, payload: AuthRegisterRequest, hashed: str) -> AuthResponse:
+    _ensure_available(db, payload)
     user = create_user(
         db,
         username=payload.username,
         hashed_password=hashed,
         email=payload.email
     )
-    access_token, access_expires = create_access_token(user.id)
-    refresh_token, refresh_expires, _ = create_refresh_token(user.id)
-    store_refresh_token(db, user.id, hash_token(refresh_token), refresh_expires)
-    return _build_auth_response(user, access_token, refresh_token, access_expires)
+    return _issue_tokens(db, user)
 
 
-@router.post("/login", response_model=AuthResponse)
-def login(payload: AuthLoginRequest, db: Session = Depends(get_db)) -> AuthResponse:
-    user = get_user_by_username(db, payload.username)
-    if not user and "@" in payload.username:
-        user = get_user_by_email(db, payload.username)
+def _find_login_user(db: Session, username: str) -> User:
+    user = get_user_by_username(db, username)
+    if not user and "@" in username:
+        user = get_user_by_email(db, username)
     if not user or not user.is_active or user.auth_provider != "password":
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    if not verify_password(payload.password, user.hashed_password):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-
-    access_token, access_expires = create_access_token(user.id)
-    refresh_token, refresh_expires, _ = create_refresh_token(user.id)
-    store_refresh_token(db, user.id, hash_token(refresh_token), refresh_expires)
-    return _build_auth_response(user, access_token, refresh_token, access_expires)
+    return user
 
 
-@router.post("/refresh", response_model=AuthResponse)
-def refresh(payload: AuthRefreshRequest, db: Session = Depends(get_db)) -> AuthResponse:
+def _refresh_tokens(db: Session, raw_refresh_token: str) -> AuthResponse:
     try:
-        token_payload = decode_token(payload.refresh_token)
+        token_payload = decode_token(raw_refresh_token)
         if token_payload.get("type") != "refresh":
             raise JWTError("Invalid token type")
         user_id = token_subject(token_payload)
     except JWTError as exc:
         raise HTTPException(status_code=401, detail="Invalid refresh token") from exc
 
-    token_hash = hash_token(payload.refresh_token)
+    token_hash = hash_token(raw_refresh_token)
     stored = get_refresh_token(db, token_hash)
     if not stored or stored.revoked_at is not None:
         raise HTTPException(status_code=401, detail="Refresh token revoked")
@@ -183,6 +182,37 @@ def refresh(payload: AuthRefreshRequest, db: Session = Depends(get_db)) -> AuthR
     return _build_auth_response(user, access_token, refresh_token, access_expires)
 
 
+# bcrypt is CPU-bound, so the async auth endpoints hand hashing to the
+# threadpool and keep the event loop for database I/O.
+@router.post("/register", response_model=AuthResponse)
+async def register(
+    payload: AuthRegisterRequest,
+    db: AsyncSession = Depends(get_async_db)
+) -> AuthResponse:
+    await db.run_sync(_ensure_available, payload)
+    hashed = await run_in_threadpool(hash_password, payload.password)
+    return await db.run_sync(_register_user, payload, hashed)
+
+
+@router.post("/login", response_model=AuthResponse)
+async def login(
+    payload: AuthLoginRequest,
+    db: AsyncSession = Depends(get_async_db)
+) -> AuthResponse:
+    user = await db.run_sync(_find_login_user, payload.username)
+    if not await run_in_threadpool(verify_password, payload.password, user.hashed_password):
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    return await db.run_sync(_issue_tokens, user)
+
+
+@router.post("/refresh", response_model=AuthResponse)
+async def refresh(
+    payload: AuthRefreshRequest,
+    db: AsyncSession = Depends(get_async_db)
+) -> AuthResponse:
+    return await db.run_sync(_refresh_tokens, payload.refresh_token)
+
+
 @router.post("/logout")
 def logout(payload: AuthLogoutRequest, db: Session = Depends(get_db)) -> dict:
     try:
@@ -301,7 +331,4 @@ def google_callback(
             oauth_subject=sub
         )
 
-    access_token, access_expires = create_access_token(user.id)
-    refresh_token, refresh_expires, _ = create_refresh_token(user.id)
-    store_refresh_token(db, user.id, hash_token(refresh_token), refresh_expires)
-    return _build_auth_response(user, access_token, refresh_token, access_expires)
+    return _issue_tokens(db, user)
@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
-from ..crud import card_to_dict, create_card, delete_card, list_cards, update_card
+from ..crud import card_to_dict, create_card, create_cards_from_dict, delete_card, list_cards, update_card
 from ..db import get_db
-from ..schemas import CardCreate, CardOut, CardUpdate
-from ..models import Card, User
+from ..dict_segment import get_segment_index
+from ..schemas import CardCreate, CardMineRequest, CardMineResponse, CardOut, CardUpdate
+from ..models import Card, Collection, User
 from .utils import get_current_user
 
 router = APIRouter(prefix="/cards", tags=["cards"])
@@ -41,6 +42,33 @@ def create_card_endpoint(
     return CardOut(**card_to_dict(card))
 
 
+@router.post("/mine", response_model=CardMineResponse)
+def mine_cards_endpoint(
+    payload: CardMineRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> CardMineResponse:
+    collection = db.query(Collection).filter(
+        Collection.owner_id == current_user.id,
+        Collection.id == payload.collection_id
+    ).first()
+    if not collection:
+        raise HTTPException(status_code=404, detail="Collection not found")
+    index = get_segment_index(db)
+    dict_ids = list(
+        dict.fromkeys(index.words[word][0] for _, _, word in index.segment(payload.text) if word is not None)
+    )
+    created, existing, duplicates = create_cards_from_dict(db, current_user.id, collection.id, dict_ids)
+    return CardMineResponse(
+        collection_id=collection.id,
+        chars=len(payload.text),
+        words=len(dict_ids),
+        created=created,
+        existing=existing,
+        duplicates=duplicates
+    )
+
+
 @router.put("/{card_id}", response_model=CardOut)
 def update_card_endpoint(
     card_id: int,
@@ -7,7 +7,9 @@ from sqlalchemy.orm import Session
 from ..crud import update_user_settings
 from ..datasets import DATASET_CATALOG, DATASET_MAP
 from ..db import get_db
+from ..dict_snapshot import get_snapshot
 from ..models import DictWord, User
+from ..pagination import Cursor, cursor_scope, decode_cursor, dict_marker, encode_cursor
 from ..schemas import (
     DatasetInfo,
     DatasetPackResponse,
@@ -97,6 +99,7 @@ def get_pack(
     dataset_id: str,
     offset: int = 0,
     limit: int = 500,
+    cursor: str | None = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> DatasetPackResponse:
@@ -108,14 +111,44 @@ def get_pack(
 
     offset = max(0, offset)
     limit = max(1, min(limit, MAX_PACK_LIMIT))
-
-    query = db.query(DictWord)
+    scope = cursor_scope("pack", dataset_id)
+    page = decode_cursor(cursor, scope) if cursor else None
+    snapshot = dict_marker(db)
     filters = dataset.filters or {}
     hsk_levels = filters.get("hsk_levels")
+
+    store = get_snapshot(snapshot)
+    if store is not None:
+        matched = store.filter(None, hsk_levels or [], [], None, None)
+        if page:
+            window = store.after(matched, page.after[0])[:limit]
+            offset = 0
+        else:
+            window = matched[offset:offset + limit]
+        items = [DictWordOut(**store.entry(int(position))) for position in window]
+        return DatasetPackResponse(
+            dataset_id=dataset_id,
+            total=len(matched),
+            offset=offset,
+            limit=limit,
+            items=items,
+            next_cursor=encode_cursor(
+                Cursor(after=[items[-1].id], total=len(matched), snapshot=snapshot, scope=scope)
+            ) if len(items) == limit else None
+        )
+
+    query = db.query(DictWord)
     if isinstance(hsk_levels, list) and hsk_levels:
         query = query.filter(DictWord.hsk_level.in_(hsk_levels))
 
-    total = query.count()
+    if page and page.snapshot == snapshot:
+        total = page.total
+    else:
+        total = query.count()
+
+    if page:
+        query = query.filter(DictWord.id > page.after[0])
+        offset = 0
     rows = query.order_by(DictWord.id.asc()).offset(offset).limit(limit).all()
 
     return DatasetPackResponse(
@@ -123,5 +156,8 @@ def get_pack(
         total=total,
         offset=offset,
         limit=limit,
-        items=[_dict_word_out(word) for word in rows]
+        items=[_dict_word_out(word) for word in rows],
+        next_cursor=encode_cursor(
+            Cursor(after=[rows[-1].id], total=total, snapshot=snapshot, scope=scope)
+        ) if len(rows) == limit else None
     )
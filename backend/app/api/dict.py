@@ -1,19 +1,55 @@
 import json
 import re
+from functools import reduce
+from typing import Iterator
 
+import numpy as np
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from ..db import get_db
+from ..config import settings
+from ..db import get_async_db, get_db, is_interrupted, query_deadline
+from ..dict_cache import dict_generation, search_cache
+from ..dict_rank import RANK_EXACT_GLOSS, RANK_EXACT_KEY, RANK_TEXT, RANK_TEXT_MAX_HITS
+from ..dict_segment import SegmentIndex, get_segment_index
+from ..dict_snapshot import KEY_KINDS, DictSnapshot, compact_pinyin, get_snapshot
+from ..dict_suggest import SUGGEST_KINDS, get_suggest_index
+from ..migrations import PINYIN_COMPACT_SQL
 from ..models import User
-from ..schemas import DictFacetCounts, DictSearchResponse, DictWordOut
-from ..services.importer import normalize_pinyin_search
-from .utils import get_current_user
+from ..pagination import Cursor, cursor_scope, decode_cursor, dict_marker, encode_cursor
+from ..pinyin import query_prefixes, syllable_key
+from ..schemas import (
+    DictCacheStats,
+    DictFacetCounts,
+    DictSearchResponse,
+    DictSegment,
+    DictSegmentRequest,
+    DictSegmentResponse,
+    DictSuggestion,
+    DictSuggestResponse,
+    DictWordKey,
+    DictWordOut,
+    DictWordsRequest,
+    DictWordsResponse
+)
+from ..services.importer import normalize_pinyin, normalize_pinyin_search
+from .utils import get_current_user, get_current_user_async
 
 router = APIRouter(prefix="/dict", tags=["dict"])
 
 MAX_LIMIT = 200
+MAX_SUGGEST_LIMIT = 20
+MAX_BATCH_WORDS = 2000
+# Bound parameters per IN (...) list.
+BATCH_CHUNK = 500
+# Queries made only of Han characters go through the n-gram index.
+HAN_QUERY = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\U00020000-\U0002ffff]+")
+NGRAM_FIELDS = {"simplified": (0,), "traditional": (1,), "all": (0, 1)}
+MAX_NGRAM_PROBES = 4
 
 
 def _load_list(value: str | None) -> list[str]:
@@ -45,9 +81,13 @@ def _parse_csv(raw: str | None) -> list[str]:
     return [part.strip() for part in raw.split(",") if part.strip()]
 
 
-def _build_fts_match(query: str, mode: str) -> str:
+def _fts_tokens(query: str) -> list[str]:
     cleaned = re.sub(r"[^\w\u4e00-\u9fff]+", " ", query.strip(), flags=re.UNICODE)
-    tokens = [token for token in re.split(r"\s+", cleaned) if token]
+    return [token for token in re.split(r"\s+", cleaned) if token]
+
+
+def _build_fts_match(query: str, mode: str) -> str:
+    tokens = _fts_tokens(query)
     if not tokens:
         return ""
     tokens = [token if token.endswith("*") else f"{token}*" for token in tokens]
@@ -72,39 +112,272 @@ def _dict_word_out(row: dict) -> DictWordOut:
     )
 
 
-def _fts_available(db: Session) -> bool:
-    result = db.execute(
-        text("SELECT name FROM sqlite_master WHERE type='table' AND name='dict_word_fts'")
-    ).fetchone()
-    return result is not None
+def _reading_key(pinyin: str | None) -> str:
+    # Tone-sensitive, style-insensitive: "nǐ hǎo", "ni3 hao3" and "NI3  HAO3"
+    # compare equal; the neutral tone may be written as 5 or left bare.
+    numbered = normalize_pinyin(pinyin or "", style="numbers").lower().replace("5", "")
+    return re.sub(r"\s+", " ", numbered).strip()
 
 
-@router.get("/search", response_model=DictSearchResponse)
-def search_dict(
-    query: str | None = None,
-    mode: str = "all",
-    hsk: str | None = None,
-    pos: str | None = None,
-    freq_min: float | None = None,
-    freq_max: float | None = None,
-    limit: int = 50,
-    offset: int = 0,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+def _search_tables(db: Session) -> set[str]:
+    rows = db.execute(
+        text(
+            "SELECT name FROM sqlite_master "
+            "WHERE type='table' AND name IN ('dict_word_fts', 'dict_word_fts_vocab', 'dict_word_ngram')"
+        )
+    ).fetchall()
+    return {row[0] for row in rows}
+
+
+def _ngram_grams(query: str) -> list[str]:
+    if len(query) <= 2:
+        return [query]
+    bigrams = list(dict.fromkeys(query[pos:pos + 2] for pos in range(len(query) - 1)))
+    if len(bigrams) <= MAX_NGRAM_PROBES:
+        return bigrams
+    # A few spread-out bigrams narrow the candidates enough; instr() below
+    # confirms the full substring.
+    step = (len(bigrams) - 1) / (MAX_NGRAM_PROBES - 1)
+    return [bigrams[round(idx * step)] for idx in range(MAX_NGRAM_PROBES)]
+
+
+def _ngram_clause(query: str, mode: str, params: dict) -> str:
+    fields = NGRAM_FIELDS[mode]
+    field_sql = ", ".join(str(field) for field in fields)
+    probes = []
+    for idx, gram in enumerate(_ngram_grams(query)):
+        params[f"gram{idx}"] = gram
+        probes.append(
+            f"SELECT word_id FROM dict_word_ngram WHERE gram = :gram{idx} AND field IN ({field_sql})"
+        )
+    clause = f"d.id IN ({' INTERSECT '.join(probes)})"
+    if len(query) > 2:
+        params["ngram_query"] = query
+        columns = [column for column, field in (("simplified", 0), ("traditional", 1)) if field in fields]
+        checks = " OR ".join(f"instr(d.{column}, :ngram_query) > 0" for column in columns)
+        clause += f" AND ({checks})"
+    return clause
+
+
+def _syllable_clause(probes: list[str], params: dict) -> str:
+    # One index range per segmentation: "ni hao" also finds "ni hao ma", and
+    # the open end lets the last syllable be unfinished.
+    clauses = []
+    for idx, probe in enumerate(probes):
+        params[f"py{idx}"] = probe
+        params[f"py{idx}_end"] = probe + chr(0x10FFFF)
+        clauses.append(f"(d.pinyin_syllables >= :py{idx} AND d.pinyin_syllables < :py{idx}_end)")
+    return f"({' OR '.join(clauses)})"
+
+
+def _fts_hit_bound(db: Session, query: str) -> int:
+    # Every match holds each token, so the rarest token's document count,
+    # summed over the terms it prefixes, bounds the match from above.
+    bound = None
+    for token in _fts_tokens(query):
+        prefix = token.rstrip("*").lower()
+        docs = db.execute(
+            text(
+                "SELECT COALESCE(SUM(doc), 0) FROM dict_word_fts_vocab "
+                "WHERE term >= :prefix AND term < :prefix_end"
+            ),
+            {"prefix": prefix, "prefix_end": prefix + chr(0x10FFFF)}
+        ).scalar()
+        bound = docs if bound is None else min(bound, docs)
+    return bound or 0
+
+
+def _rank_clauses(query: str, mode: str, use_bm25: bool, params: dict) -> tuple[str, str | None]:
+    """Relevance expression for a free-text query, plus its exact-key test.
+
+    The exact-key test only compares indexed columns, so it can also drive
+    a cheap probe for the exact hits on their own.
+    """
+    exact_keys = []
+    if mode in {"all", "simplified"}:
+        exact_keys.append("simplified = :rank_q")
+    if mode in {"all", "traditional"}:
+        exact_keys.append("traditional = :rank_q")
+    if exact_keys:
+        params["rank_q"] = query
+    normalized = normalize_pinyin_search(query)
+    if mode in {"all", "pinyin"} and query_prefixes(normalized):
+        exact_keys.append("pinyin_syllables = :rank_py")
+        params["rank_py"] = syllable_key(normalized)
+    exact_key = f"(d.{' OR d.'.join(exact_keys)})" if exact_keys else None
+
+    gloss = None
+    if mode in {"all", "meanings"}:
+        # Meanings are JSON lists, so a whole gloss is the quoted query.
+        gloss = "instr(d.meanings, :rank_gloss) > 0"
+        params["rank_gloss"] = json.dumps(query, ensure_ascii=False)
+
+    # Exact rows score full text relevance. Folding the boosts into one
+    # CASE tests each condition once per row.
+    branches = []
+    if exact_keys:
+        # Exact rows are collected once through the key indexes; every hit
+        # then costs one lookup in that small set.
+        exact = f"d.id IN (SELECT id FROM dict_word WHERE {' OR '.join(exact_keys)})"
+        gloss_bonus = f" + {RANK_EXACT_GLOSS} * ({gloss})" if gloss else ""
+        branches.append(f"WHEN {exact} THEN {RANK_EXACT_KEY + RANK_TEXT}{gloss_bonus}")
+    if gloss:
+        branches.append(f"WHEN {gloss} THEN {RANK_EXACT_GLOSS + RANK_TEXT}")
+    # bm25() is negative, better matches lower; 1 - 1 / (1 - bm25) maps it
+    # to [0, 1) and calls it once per row.
+    text_score = f"{RANK_TEXT} * (1.0 - 1.0 / (1.0 - bm25(dict_word_fts)))" if use_bm25 else "0.0"
+    score = "COALESCE(d.rank_prior, 0.0)"
+    if branches:
+        score += f" + (CASE {' '.join(branches)} ELSE {text_score} END)"
+    elif use_bm25:
+        score += f" + {text_score}"
+    return score, exact_key
+
+
+def _key_clause(query: str, mode: str, match: str, params: dict) -> str:
+    clauses = []
+    for kind in KEY_KINDS if mode == "all" else (mode,):
+        name = f"key_{kind}"
+        if kind == "pinyin":
+            # A range over the indexed expression; LIKE cannot use an index on it.
+            column = PINYIN_COMPACT_SQL
+            value = compact_pinyin(normalize_pinyin_search(query))
+            if match == "prefix":
+                clauses.append(f"({column} >= :{name} AND {column} < :{name}_end)")
+                params[name] = value
+                params[f"{name}_end"] = value + chr(0x10FFFF)
+            else:
+                clauses.append(f"{column} = :{name}")
+                params[name] = value
+        elif match == "prefix":
+            # A range keeps the simplified/traditional index usable.
+            clauses.append(f"(d.{kind} >= :{name} AND d.{kind} < :{name}_end)")
+            params[name] = query
+            params[f"{name}_end"] = query + chr(0x10FFFF)
+        else:
+            clauses.append(f"d.{kind} = :{name}")
+            params[name] = query
+    return f"({' OR '.join(clauses)})"
+
+
+def _snapshot_positions(store: DictSnapshot, query: str | None, mode: str, match: str) -> np.ndarray:
+    prefix = match == "prefix"
+    hits = [
+        store.lookup(
+            kind,
+            compact_pinyin(normalize_pinyin_search(query or "")) if kind == "pinyin" else query or "",
+            prefix=prefix
+        )
+        for kind in (KEY_KINDS if mode == "all" else (mode,))
+    ]
+    return reduce(np.union1d, hits)
+
+
+def _search_snapshot(
+    store: DictSnapshot,
+    positions: np.ndarray | None,
+    hsk_levels: list[int],
+    pos_values: list[str],
+    freq_min: float | None,
+    freq_max: float | None,
+    limit: int,
+    offset: int,
+    page: Cursor | None,
+    marker: str,
+    scope: str,
+    facets: bool
+) -> DictSearchResponse:
+    matched = store.filter(positions, hsk_levels, pos_values, freq_min, freq_max)
+    if page:
+        window = store.after(matched, page.after[0])[:limit]
+    else:
+        window = matched[offset:offset + limit]
+    results = [DictWordOut(**store.entry(int(position))) for position in window]
+    facet_counts = None
+    if facets:
+        hsk_counts, pos_counts = store.facets(matched)
+        facet_counts = DictFacetCounts(hsk=hsk_counts, pos=pos_counts)
+
+    return DictSearchResponse(
+        total=len(matched),
+        total_estimate=len(matched),
+        results=results,
+        facets=facet_counts,
+        next_cursor=encode_cursor(
+            Cursor(after=[results[-1].id], total=len(matched), snapshot=marker, scope=scope)
+        ) if len(results) == limit else None
+    )
+
+
+def _search(
+    db: Session,
+    query: str | None,
+    mode: str,
+    hsk: str | None,
+    pos: str | None,
+    freq_min: float | None,
+    freq_max: float | None,
+    limit: int,
+    offset: int,
+    cursor: str | None = None,
+    facets: bool = True,
+    match: str = "auto",
+    sort: str = "id"
 ) -> DictSearchResponse:
     if mode not in {"all", "simplified", "traditional", "pinyin", "meanings"}:
         raise HTTPException(status_code=400, detail="Invalid mode")
+    if match not in {"auto", "exact", "prefix"}:
+        raise HTTPException(status_code=400, detail="Invalid match")
+    if sort not in {"id", "relevance"}:
+        raise HTTPException(status_code=400, detail="Invalid sort")
+    keyed = bool(query) and match != "auto"
+    if keyed and mode == "meanings":
+        raise HTTPException(status_code=400, detail="Exact and prefix match need a key mode")
 
     limit = max(1, min(limit, MAX_LIMIT))
     offset = max(0, offset)
     hsk_levels = _parse_hsk(hsk)
     pos_values = _parse_csv(pos)
-
-    match = ""
-    use_fts = bool(query) and _fts_available(db)
+    # Relevance applies to free-text matches; key lookups and browsing keep
+    # dictionary order.
+    ranked = sort == "relevance" and bool(query) and not keyed
+    scope = cursor_scope("search", query, mode, match, hsk_levels, pos_values, freq_min, freq_max, ranked)
+    page = decode_cursor(cursor, scope) if cursor else None
+    marker = dict_marker(db)
+
+    # Key lookups and filter-only browsing are answered from the mapped
+    # snapshot when it matches the current dictionary.
+    store = get_snapshot(marker) if keyed or not query else None
+    if store is not None:
+        return _search_snapshot(
+            store,
+            _snapshot_positions(store, query, mode, match) if keyed else None,
+            hsk_levels,
+            pos_values,
+            freq_min,
+            freq_max,
+            limit,
+            offset,
+            page,
+            marker,
+            scope,
+            facets
+        )
+
+    fts_match = ""
+    syllable_probes = (
+        query_prefixes(normalize_pinyin_search(query)) if query and not keyed and mode == "pinyin" else []
+    )
+    tables = _search_tables(db) if query and not keyed and not syllable_probes else set()
+    use_ngram = (
+        mode in NGRAM_FIELDS
+        and "dict_word_ngram" in tables
+        and HAN_QUERY.fullmatch(query or "") is not None
+    )
+    use_fts = not use_ngram and "dict_word_fts" in tables
     if use_fts and query:
-        match = _build_fts_match(query, mode)
-        if not match:
+        fts_match = _build_fts_match(query, mode)
+        if not fts_match:
             use_fts = False
 
     base_from = "FROM dict_word d"
@@ -112,12 +385,19 @@ def search_dict(
         base_from += " JOIN dict_word_fts ON d.id = dict_word_fts.rowid"
 
     where_clauses: list[str] = []
+    filter_clauses: list[str] = []
     params: dict = {"limit": limit, "offset": offset}
 
     if query:
-        if use_fts:
+        if keyed:
+            where_clauses.append(_key_clause(query, mode, match, params))
+        elif syllable_probes:
+            where_clauses.append(_syllable_clause(syllable_probes, params))
+        elif use_ngram:
+            where_clauses.append(_ngram_clause(query, mode, params))
+        elif use_fts:
             where_clauses.append("dict_word_fts MATCH :match")
-            params["match"] = match
+            params["match"] = fts_match
             if mode == "pinyin":
                 normalized = normalize_pinyin_search(query)
                 if normalized:
@@ -157,7 +437,7 @@ def search_dict(
             key = f"hsk{idx}"
             placeholders.append(f":{key}")
             params[key] = level
-        where_clauses.append(f"d.hsk_level IN ({', '.join(placeholders)})")
+        filter_clauses.append(f"d.hsk_level IN ({', '.join(placeholders)})")
 
     if pos_values:
         placeholders = []
@@ -165,70 +445,425 @@ def search_dict(
             key = f"pos{idx}"
             placeholders.append(f":{key}")
             params[key] = value
-        where_clauses.append(f"d.pos IN ({', '.join(placeholders)})")
+        filter_clauses.append(f"d.pos IN ({', '.join(placeholders)})")
 
     if freq_min is not None:
-        where_clauses.append("d.frequency >= :freq_min")
+        filter_clauses.append("d.frequency >= :freq_min")
         params["freq_min"] = freq_min
     if freq_max is not None:
-        where_clauses.append("d.frequency <= :freq_max")
+        filter_clauses.append("d.frequency <= :freq_max")
         params["freq_max"] = freq_max
 
+    where_clauses += filter_clauses
     where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
     select_columns = (
         "d.id, d.simplified, d.traditional, d.pinyin, d.pinyin_normalized, "
         "d.meanings, d.examples, d.tags, d.hsk_level, d.pos, d.frequency"
     )
-
-    rows = db.execute(
-        text(
-            f"""
-            SELECT {select_columns}
-            {base_from}
-            {where_sql}
-            ORDER BY d.id ASC
-            LIMIT :limit OFFSET :offset
+    score_sql = "NULL"
+    order_sql = "id ASC"
+    page_sql = ""
+    if page:
+        page_sql = "WHERE id > :after_id"
+        params["after_id"] = page.after[-1]
+        params["offset"] = 0
+    exact_source = ""
+    if ranked:
+        # bm25() is the costly part of the score. Broad prefixes match so
+        # many rows that it barely separates them, so beyond a bounded match
+        # they are ranked on exact hits and the stored prior alone.
+        use_bm25 = (
+            use_fts
+            and "dict_word_fts_vocab" in tables
+            and _fts_hit_bound(db, query) <= RANK_TEXT_MAX_HITS
+        )
+        score_sql, exact_key = _rank_clauses(query, mode, use_bm25, params)
+        order_sql = "score DESC, id ASC"
+        if page:
+            page_sql = "WHERE score < :after_score OR (score = :after_score AND id > :after_id)"
+            params["after_score"] = page.after[0]
+        elif exact_key and offset == 0:
+            # Top-k shortcut: exact hits outrank everything else, so when
+            # they alone fill the first page the rest of the match is never
+            # scored. The probe reads only the key indexes; the page itself
+            # is still confined to `hits`, which the first page materializes
+            # for the total anyway. Exact rows score 1.0 on text without
+            # bm25(), so the FTS join is not needed to rank them.
+            exact_score, _ = _rank_clauses(query, mode, False, params)
+            exact_filter = " AND ".join([exact_key] + filter_clauses)
+            exact_hits = db.execute(
+                text(f"SELECT COUNT(*) FROM (SELECT 1 FROM dict_word d WHERE {exact_filter} LIMIT :limit)"),
+                params
+            ).scalar()
+            if exact_hits == limit:
+                exact_source = f"""
+                    SELECT d.id AS id, {exact_score} AS score
+                    FROM dict_word d
+                    WHERE {exact_filter} AND d.id IN (SELECT id FROM hits)
+                    """
+
+    # The page and the aggregates come back in a single statement. Aggregate
+    # rows carry is_facet = 1 and hold the joint (hsk, pos) histogram, whose
+    # marginals are the total and the two facets. Only the first
+    # search_count_cap + 1 matches are counted; past that the total is an
+    # estimate and the facets are flagged approximate. A ranked match is scored once into `hits`; in id order it is
+    # inlined instead, so the page and the capped count each stop early.
+    reuse_total = page is not None and page.snapshot == marker
+    count_cap = settings.search_count_cap
+    params["count_limit"] = count_cap + 1 if count_cap > 0 else -1
+    aggregate_sql = ""
+    if facets or not reuse_total:
+        group_sql = "GROUP BY hsk_level, pos" if facets else ""
+        aggregate_sql = f"""
+            UNION ALL
+            SELECT 1, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, hsk_level, pos, NULL, COUNT(*)
+            FROM (SELECT hsk_level, pos FROM hits LIMIT :count_limit)
+            {group_sql}
             """
-        ),
-        params
-    ).mappings().all()
+    materialize = "MATERIALIZED" if ranked else "NOT MATERIALIZED"
+
+    def run(hits_score: str, page_source: str, aggregates: str) -> list:
+        return db.execute(
+            text(
+                f"""
+                WITH hits AS {materialize} (
+                    SELECT d.id AS id, d.hsk_level AS hsk_level, d.pos AS pos, {hits_score} AS score
+                    {base_from}
+                    {where_sql}
+                ),
+                page AS (
+                    {page_source}
+                    ORDER BY {order_sql}
+                    LIMIT :limit OFFSET :offset
+                )
+                SELECT 0 AS is_facet, page.score AS score, {select_columns}, NULL AS facet_count
+                FROM page JOIN dict_word d ON d.id = page.id
+                {aggregates}
+                ORDER BY 1, 2 DESC, 3
+                """
+            ),
+            params
+        ).mappings().all()
+
+    budget = settings.search_deadline_ms / 1000
+    partial = False
+    try:
+        with query_deadline(db, budget):
+            result_rows = None
+            if exact_source:
+                result_rows = run("NULL", exact_source, aggregate_sql)
+                # The key probe ignores the text match; if some exact rows
+                # fell outside it, rank the whole match after all.
+                if sum(1 for row in result_rows if not row["is_facet"]) < limit:
+                    result_rows = None
+            if result_rows is None:
+                result_rows = run(score_sql, f"SELECT id, score FROM hits {page_sql}", aggregate_sql)
+    except OperationalError as exc:
+        if not is_interrupted(exc):
+            raise
+        # Over budget: drop the ranking and the aggregates and return what
+        # an id-ordered page finds within a second budget.
+        db.rollback()
+        partial = True
+        result_rows = []
+        if not (ranked and page):
+            materialize = "NOT MATERIALIZED"
+            order_sql = "id ASC"
+            try:
+                with query_deadline(db, budget):
+                    result_rows = run("NULL", f"SELECT id, score FROM hits {'' if ranked else page_sql}", "")
+            except OperationalError as retry_exc:
+                if not is_interrupted(retry_exc):
+                    raise
+                db.rollback()
+
+    rows = [row for row in result_rows if not row["is_facet"]]
+    total = page.total if page is not None and reuse_total else 0
+    total_is_exact = page.exact if page is not None and reuse_total else True
+    hsk_counts: dict[str, int] = {}
+    pos_counts: dict[str, int] = {}
+    capped = False
+    if aggregate_sql and not partial:
+        total = 0
+        for row in result_rows:
+            if not row["is_facet"]:
+                continue
+            total += row["facet_count"]
+            if row["hsk_level"] is not None:
+                key = str(row["hsk_level"])
+                hsk_counts[key] = hsk_counts.get(key, 0) + row["facet_count"]
+            if row["pos"] is not None:
+                key = str(row["pos"])
+                pos_counts[key] = pos_counts.get(key, 0) + row["facet_count"]
+        if count_cap > 0 and total > count_cap:
+            total = count_cap
+            total_is_exact = False
+            capped = True
+    elif partial and not reuse_total:
+        # A lower bound: everything before and on this page matched.
+        total = offset + len(rows)
+        total_is_exact = False
+    facet_counts = DictFacetCounts(hsk=hsk_counts, pos=pos_counts) if facets and not partial else None
+
+    # A partial ranked page came back in id order, so it cannot be continued.
+    can_continue = len(rows) == limit and not (partial and ranked)
+    return DictSearchResponse(
+        total=total,
+        total_estimate=total,
+        total_is_exact=total_is_exact,
+        facets_approximate=capped and facet_counts is not None,
+        partial=partial,
+        results=[_dict_word_out(row) for row in rows],
+        facets=facet_counts,
+        next_cursor=encode_cursor(
+            Cursor(
+                after=[rows[-1]["score"], rows[-1]["id"]] if ranked else [rows[-1]["id"]],
+                total=total,
+                snapshot=marker,
+                scope=scope,
+                exact=total_is_exact
+            )
+        ) if can_continue else None
+    )
 
-    total_row = db.execute(
-        text(f"SELECT COUNT(*) as count {base_from} {where_sql}"),
-        params
-    ).mappings().first()
-    total = total_row["count"] if total_row else 0
 
-    hsk_rows = db.execute(
-        text(
-            f"""
-            SELECT d.hsk_level as key, COUNT(*) as count
-            {base_from}
-            {where_sql}
-            GROUP BY d.hsk_level
-            """
-        ),
-        params
-    ).mappings().all()
-    pos_rows = db.execute(
+@router.get("/search", response_model=DictSearchResponse)
+async def search_dict(
+    query: str | None = None,
+    mode: str = "all",
+    hsk: str | None = None,
+    pos: str | None = None,
+    freq_min: float | None = None,
+    freq_max: float | None = None,
+    limit: int = 50,
+    offset: int = 0,
+    cursor: str | None = None,
+    facets: bool = True,
+    match: str = "auto",
+    sort: str = "id",
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+) -> DictSearchResponse:
+    query = query.strip() if query else None
+    # The marker moves with imports run by any process; the generation only
+    # with changes this process made.
+    marker = await db.run_sync(dict_marker)
+    key = (
+        marker,
+        query,
+        mode,
+        tuple(_parse_hsk(hsk)),
+        tuple(_parse_csv(pos)),
+        freq_min,
+        freq_max,
+        max(1, min(limit, MAX_LIMIT)),
+        max(0, offset),
+        cursor,
+        facets,
+        match,
+        sort
+    )
+    generation = dict_generation()
+    cached = search_cache.get(key, generation)
+    if cached is not None:
+        return cached
+    response = await db.run_sync(
+        _search, query, mode, hsk, pos, freq_min, freq_max, limit, offset, cursor, facets, match, sort
+    )
+    if not response.partial:
+        search_cache.put(key, generation, response)
+    return response
+
+
+def _suggest_prefixes(query: str) -> list[str]:
+    # The query as typed covers headwords and glosses; pinyin keys are
+    # compact, so tone marks and numbers are folded away first.
+    readings = query_prefixes(normalize_pinyin_search(query))
+    return [query.lower()] + [compact_pinyin(reading) for reading in readings]
+
+
+def _suggest_sql(db: Session, query: str, limit: int) -> list[DictSuggestion]:
+    # Used until the in-memory index is (re)built: headword and syllable
+    # prefixes are index ranges, glosses and initials are left out.
+    params: dict = {"limit": limit, "q": query, "q_end": query + chr(0x10FFFF)}
+    clauses = ["(d.simplified >= :q AND d.simplified < :q_end)"]
+    probes = query_prefixes(normalize_pinyin_search(query))
+    if probes:
+        clauses.append(_syllable_clause(probes, params))
+    rows = db.execute(
         text(
             f"""
-            SELECT d.pos as key, COUNT(*) as count
-            {base_from}
-            {where_sql}
-            GROUP BY d.pos
+            SELECT d.id, d.simplified, d.traditional, d.pinyin, d.meanings, d.hsk_level, d.frequency,
+                   d.simplified >= :q AND d.simplified < :q_end AS by_headword
+            FROM dict_word d
+            WHERE {' OR '.join(clauses)}
+            ORDER BY d.frequency IS NULL, d.frequency DESC, d.hsk_level IS NULL, d.hsk_level ASC, d.id ASC
+            LIMIT :limit
             """
         ),
         params
     ).mappings().all()
-
-    facets = DictFacetCounts(
-        hsk={str(row["key"]): row["count"] for row in hsk_rows if row["key"] is not None},
-        pos={str(row["key"]): row["count"] for row in pos_rows if row["key"] is not None}
+    return [
+        DictSuggestion(
+            id=row["id"],
+            simplified=row["simplified"],
+            traditional=row["traditional"],
+            pinyin=row["pinyin"],
+            gloss=next(iter(_load_list(row["meanings"])), None),
+            hsk_level=row["hsk_level"],
+            frequency=row["frequency"],
+            match="simplified" if row["by_headword"] else "pinyin"
+        )
+        for row in rows
+    ]
+
+
+@router.get("/suggest", response_model=DictSuggestResponse)
+async def suggest_dict(
+    query: str,
+    limit: int = 10,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+) -> DictSuggestResponse:
+    query = query.strip()
+    limit = max(1, min(limit, MAX_SUGGEST_LIMIT))
+    if not query:
+        return DictSuggestResponse(query=query, results=[])
+
+    index = get_suggest_index(await db.run_sync(dict_marker))
+    if index is None:
+        results = await db.run_sync(_suggest_sql, query, limit)
+        return DictSuggestResponse(query=query, results=results)
+
+    results = []
+    for word, kind in index.top(_suggest_prefixes(query), limit):
+        word_id, simplified, traditional, pinyin_text, gloss, hsk_level, frequency = index.words[word]
+        results.append(
+            DictSuggestion(
+                id=word_id,
+                simplified=simplified,
+                traditional=traditional,
+                pinyin=pinyin_text,
+                gloss=gloss,
+                hsk_level=hsk_level,
+                frequency=frequency,
+                match=SUGGEST_KINDS[kind]
+            )
+        )
+    return DictSuggestResponse(query=query, results=results)
+
+
+def _fetch_words(db: Session, column: str, values: list) -> list[dict]:
+    rows: list[dict] = []
+    for start in range(0, len(values), BATCH_CHUNK):
+        params = {f"v{idx}": value for idx, value in enumerate(values[start:start + BATCH_CHUNK])}
+        rows.extend(
+            db.execute(
+                text(
+                    "SELECT id, simplified, traditional, pinyin, pinyin_normalized, "
+                    "meanings, examples, tags, hsk_level, pos, frequency "
+                    f"FROM dict_word WHERE {column} IN ({', '.join(f':{key}' for key in params)})"
+                ),
+                params
+            ).mappings().all()
+        )
+    return rows
+
+
+def _words(db: Session, ids: list[int], keys: list[DictWordKey]) -> DictWordsResponse:
+    if len(ids) + len(keys) > MAX_BATCH_WORDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_WORDS} ids and keys per request")
+
+    by_id = {row["id"]: row for row in _fetch_words(db, "id", list(dict.fromkeys(ids)))}
+    by_headword: dict[str, list[dict]] = {}
+    for row in _fetch_words(db, "simplified", list(dict.fromkeys(key.simplified for key in keys))):
+        by_headword.setdefault(row["simplified"], []).append(row)
+
+    picked: dict[int, dict] = {}
+    missing_ids = []
+    for word_id in ids:
+        if word_id in by_id:
+            picked.setdefault(word_id, by_id[word_id])
+        else:
+            missing_ids.append(word_id)
+    missing_keys = []
+    for key in keys:
+        reading = _reading_key(key.pinyin) if key.pinyin else None
+        matches = [
+            row
+            for row in sorted(by_headword.get(key.simplified, []), key=lambda row: row["id"])
+            if reading is None or _reading_key(row["pinyin"]) == reading
+        ]
+        if not matches:
+            missing_keys.append(key)
+        for row in matches:
+            picked.setdefault(row["id"], row)
+    return DictWordsResponse(
+        results=[_dict_word_out(row) for row in picked.values()],
+        missing_ids=list(dict.fromkeys(missing_ids)),
+        missing_keys=missing_keys
     )
 
-    return DictSearchResponse(
-        total=total,
-        results=[_dict_word_out(row) for row in rows],
-        facets=facets
+
+@router.get("/words", response_model=DictWordsResponse)
+async def get_words(
+    ids: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+) -> DictWordsResponse:
+    parsed = _parse_csv(ids)
+    if not all(part.isdigit() for part in parsed):
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    return await db.run_sync(_words, [int(part) for part in parsed], [])
+
+
+@router.post("/words", response_model=DictWordsResponse)
+async def post_words(
+    payload: DictWordsRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+) -> DictWordsResponse:
+    return await db.run_sync(_words, payload.ids, payload.keys)
+
+
+def _segment_tokens(index: SegmentIndex, source: str) -> Iterator[dict]:
+    words = index.words
+    for start, token, word in index.segment(source):
+        if word is None:
+            yield {"start": start, "text": token}
+            continue
+        word_id, _, traditional, pinyin_text, gloss, hsk_level = words[word]
+        yield {
+            "start": start,
+            "text": token,
+            "id": word_id,
+            "traditional": traditional,
+            "pinyin": pinyin_text,
+            "gloss": gloss,
+            "hsk_level": hsk_level
+        }
+
+
+@router.post("/segment", response_model=DictSegmentResponse)
+def segment_text(
+    payload: DictSegmentRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    index = get_segment_index(db)
+    tokens = _segment_tokens(index, payload.text)
+    if payload.stream:
+        lines = (json.dumps(token, ensure_ascii=False) + "\n" for token in tokens)
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+
+    segments = [DictSegment(**token) for token in tokens]
+    return DictSegmentResponse(
+        tokens=segments,
+        chars=len(payload.text),
+        matched_chars=sum(len(segment.text) for segment in segments if segment.id is not None)
     )
+
+
+@router.get("/cache", response_model=DictCacheStats)
+def get_cache_stats(current_user: User = Depends(get_current_user)) -> DictCacheStats:
+    return DictCacheStats(**search_cache.snapshot())
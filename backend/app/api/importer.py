@@ -1,7 +1,7 @@
 import json
 from pathlib import Path
 
-from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
 from sqlalchemy.orm import Session
 
 from ..db import get_db
@@ -13,13 +13,14 @@ from ..schemas import (
     ImportUploadResponse
 )
 from ..services.import_jobs import (
+    cancel_import_job,
     create_import_file,
     create_import_job,
     get_import_file,
     get_import_job,
-    get_import_logs,
-    run_job
+    get_import_logs
 )
+from ..services.import_worker import wake_import_workers
 from ..services.importer import CsvMapping
 from .utils import get_current_user
 
@@ -56,7 +57,6 @@ def upload_file(
 @router.post("/trigger", response_model=ImportJobResponse)
 def trigger_import(
     payload: ImportTriggerRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> ImportJobResponse:
@@ -75,10 +75,11 @@ def trigger_import(
         mapping=mapping,
         pinyin_style=payload.pinyin_style,
         dedupe=payload.dedupe,
-        replace=payload.replace
+        replace=payload.replace,
+        diff=payload.diff
     )
 
-    background_tasks.add_task(run_job, job.id)
+    wake_import_workers()
     return ImportJobResponse(job_id=job.id, status=job.status)
 
 
@@ -104,3 +105,19 @@ def get_status(
         created_at=job.created_at,
         finished_at=job.finished_at
     )
+
+
+@router.post("/cancel/{job_id}", response_model=ImportJobResponse)
+def cancel_import(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> ImportJobResponse:
+    job = get_import_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status in ("done", "error"):
+        raise HTTPException(status_code=409, detail="Job already finished")
+
+    job = cancel_import_job(db, job)
+    return ImportJobResponse(job_id=job.id, status=job.status)
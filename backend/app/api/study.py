@@ -1,46 +1,146 @@
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 
-from ..crud import card_to_dict, record_study
-from ..db import get_db
-from ..models import User
-from ..schemas import CardOut, StudyResponseIn, StudyResponseOut, StudyScheduleOut
+from ..crud import (
+    card_to_dict,
+    get_logged_client_keys,
+    list_card_states,
+    record_study,
+    record_study_batch
+)
+from ..db import get_async_db, get_db
+from ..forecast import due_forecast
+from ..models import Card, User
+from ..schemas import (
+    CardOut,
+    StudyBatchIn,
+    StudyBatchOut,
+    StudyCardState,
+    StudyForecastOut,
+    StudyResponseIn,
+    StudyResponseOut,
+    StudyScheduleOut,
+    StudySessionCreate,
+    StudySessionNextOut,
+    StudySessionOut
+)
 from ..scheduler import recommend
-from .utils import get_current_user
+from ..services.srs import FSRSEngine, SchedulerEngine, engine_for_user, refit_user_engine_job
+from ..study_sessions import create_session, delete_session, expires_at, get_session, peek_cards
+from .utils import get_current_user, get_current_user_async
 
 router = APIRouter(prefix="/study", tags=["study"])
 
 
+def _schedule(
+    db: Session,
+    user_id: int,
+    n: int,
+    collection_id: int | None
+) -> StudyScheduleOut:
+    cards = recommend(db, user_id, n=n, collection_id=collection_id)
+    return StudyScheduleOut(
+        generated_at=datetime.utcnow(),
+        count=len(cards),
+        cards=[CardOut(**card_to_dict(card)) for card in cards]
+    )
+
+
 @router.get("/schedule", response_model=StudyScheduleOut)
-def get_schedule(
+async def get_schedule(
     n: int = 20,
     collection_id: int | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+) -> StudyScheduleOut:
+    return await db.run_sync(_schedule, current_user.id, n, collection_id)
+
+
+@router.post("/sessions", response_model=StudySessionOut)
+def start_session(
+    payload: StudySessionCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
-) -> StudyScheduleOut:
-    cards = recommend(db, current_user.id, n=n, collection_id=collection_id)
-    return StudyScheduleOut(
-        generated_at=datetime.utcnow(),
-        count=len(cards),
+) -> StudySessionOut:
+    cards = recommend(db, current_user.id, n=payload.n, collection_id=payload.collection_id)
+    session = create_session(current_user.id, [card.id for card in cards])
+    return StudySessionOut(
+        session_id=session.id,
+        remaining=len(session.queue),
+        reviewed=session.reviewed,
+        expires_at=expires_at(session)
+    )
+
+
+@router.get("/sessions/{session_id}/next", response_model=StudySessionNextOut)
+def next_session_cards(
+    session_id: str,
+    k: int = 1,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> StudySessionNextOut:
+    session = get_session(current_user.id, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    card_ids = peek_cards(session, max(1, min(k, 50)))
+    cards: list[Card] = []
+    if card_ids:
+        by_id = {
+            card.id: card
+            for card in db.query(Card)
+            .options(selectinload(Card.collections))
+            .filter(Card.owner_id == current_user.id, Card.id.in_(card_ids))
+            .all()
+        }
+        cards = [by_id[card_id] for card_id in card_ids if card_id in by_id]
+
+    return StudySessionNextOut(
+        session_id=session.id,
+        remaining=len(session.queue),
+        reviewed=session.reviewed,
         cards=[CardOut(**card_to_dict(card)) for card in cards]
     )
 
 
-@router.post("/response", response_model=StudyResponseOut)
-def post_response(
-    payload: StudyResponseIn,
+@router.delete("/sessions/{session_id}")
+def end_session(
+    session_id: str,
+    current_user: User = Depends(get_current_user)
+) -> dict:
+    if not delete_session(current_user.id, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"status": "deleted"}
+
+
+@router.get("/forecast", response_model=StudyForecastOut)
+def get_forecast(
+    days: int = 30,
+    collection_id: int | None = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
+) -> StudyForecastOut:
+    return StudyForecastOut(**due_forecast(db, current_user.id, days=days, collection_id=collection_id))
+
+
+def _respond(
+    db: Session,
+    user_id: int,
+    payload: StudyResponseIn,
+    engine: SchedulerEngine
 ) -> StudyResponseOut:
     try:
         card, log = record_study(
             db,
-            current_user.id,
+            user_id,
             payload.card_id,
             payload.q,
-            payload.response_time_ms
+            payload.response_time_ms,
+            engine=engine
         )
     except ValueError as exc:
         raise HTTPException(status_code=404, detail=str(exc)) from exc
@@ -49,3 +149,73 @@ def post_response(
         card=CardOut(**card_to_dict(card)),
         logged_at=log.timestamp
     )
+
+
+@router.post("/response", response_model=StudyResponseOut)
+async def post_response(
+    payload: StudyResponseIn,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+) -> StudyResponseOut:
+    engine = engine_for_user(current_user)
+    response = await db.run_sync(_respond, current_user.id, payload, engine)
+    if engine.name == FSRSEngine.name:
+        background_tasks.add_task(refit_user_engine_job, current_user.id)
+    return response
+
+
+def _respond_batch(
+    db: Session,
+    user_id: int,
+    payload: StudyBatchIn,
+    engine: SchedulerEngine
+) -> StudyBatchOut:
+    now = datetime.utcnow()
+    logged = get_logged_client_keys(
+        db, user_id, [item.idempotency_key for item in payload.responses]
+    )
+    pending = []
+    for item in payload.responses:
+        if item.idempotency_key in logged:
+            continue
+        logged.add(item.idempotency_key)
+        pending.append(item)
+
+    try:
+        record_study_batch(
+            db,
+            user_id,
+            [(item.card_id, item.q, item.response_time_ms) for item in pending],
+            now=now,
+            client_keys=[item.idempotency_key for item in pending],
+            engine=engine
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except IntegrityError as exc:
+        # A concurrent retry logged the same keys first.
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Duplicate review submission") from exc
+
+    card_ids = sorted({item.card_id for item in payload.responses})
+    return StudyBatchOut(
+        applied=len(pending),
+        skipped=len(payload.responses) - len(pending),
+        logged_at=now,
+        cards=[StudyCardState(**state) for state in list_card_states(db, user_id, card_ids)]
+    )
+
+
+@router.post("/responses", response_model=StudyBatchOut)
+async def post_responses(
+    payload: StudyBatchIn,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+) -> StudyBatchOut:
+    engine = engine_for_user(current_user)
+    response = await db.run_sync(_respond_batch, current_user.id, payload, engine)
+    if response.applied and engine.name == FSRSEngine.name:
+        background_tasks.add_task(refit_user_engine_job, current_user.id)
+    return response
@@ -1,25 +1,23 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from ..crud import get_user
-from ..db import get_db
+from ..db import get_async_db, get_db
 from ..models import User
 from ..security import decode_token, token_subject
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
+def _token_user_id(token: str) -> int:
     try:
         payload = decode_token(token)
         if payload.get("type") != "access":
             raise JWTError("Invalid token type")
-        user_id = token_subject(payload)
+        return token_subject(payload)
     except JWTError as exc:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -27,7 +25,8 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"}
         ) from exc
 
-    user = get_user(db, user_id)
+
+def _require_active(user: User | None) -> User:
     if not user or not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -35,3 +34,17 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"}
         )
     return user
+
+
+def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> User:
+    return _require_active(get_user(db, _token_user_id(token)))
+
+
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    return _require_active(await db.get(User, _token_user_id(token)))
@@ -50,6 +50,16 @@ class Settings:
     api_port: int
     log_level: str
     database_url: str
+    async_database_url: Optional[str]
+    threadpool_size: int
+    search_cache_size: int
+    search_cache_ttl_seconds: float
+    dict_snapshot_path: Optional[str]
+    search_deadline_ms: int
+    search_count_cap: int
+    import_workers: int
+    import_lease_seconds: float
+    import_poll_seconds: float
     cors_origins: List[str]
     jwt_secret: str
     jwt_algorithm: str
@@ -71,6 +81,16 @@ settings = Settings(
     api_port=int(os.getenv("API_PORT", "8000")),
     log_level=os.getenv("LOG_LEVEL", "info"),
     database_url=_normalize_sqlite_url(os.getenv("DATABASE_URL", _default_db)),
+    async_database_url=os.getenv("ASYNC_DATABASE_URL"),
+    threadpool_size=int(os.getenv("THREADPOOL_SIZE", "40")),
+    search_cache_size=int(os.getenv("SEARCH_CACHE_SIZE", "2048")),
+    search_cache_ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "600")),
+    dict_snapshot_path=os.getenv("DICT_SNAPSHOT_PATH") or None,
+    search_deadline_ms=int(os.getenv("SEARCH_DEADLINE_MS", "300")),
+    search_count_cap=int(os.getenv("SEARCH_COUNT_CAP", "10000")),
+    import_workers=int(os.getenv("IMPORT_WORKERS", "2")),
+    import_lease_seconds=float(os.getenv("IMPORT_LEASE_SECONDS", "60")),
+    import_poll_seconds=float(os.getenv("IMPORT_POLL_SECONDS", "2")),
     cors_origins=_split_csv(
         os.getenv("CORS_ORIGINS", "http://localhost:5173,http://127.0.0.1:5173")
     ),
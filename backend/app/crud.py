@@ -2,12 +2,19 @@ from __future__ import annotations
 
 import json
 from datetime import datetime
-from typing import Iterable, List, Optional
+from typing import Iterable, Iterator, List, Optional, Sequence
 
+import numpy as np
+from sqlalchemy import DateTime, bindparam, func, insert, update
 from sqlalchemy.orm import Session
 
-from .models import Card, Collection, RefreshToken, StudyLog, User, card_collection
-from .srs import apply_sm2
+from .forecast import invalidate_forecast
+from .models import Card, Collection, DictWord, RefreshToken, StudyLog, User, card_collection
+from .srs import CardStateBatch, SchedulerEngine, SM2Engine
+from .study_sessions import mark_reviewed
+
+SQL_CHUNK_SIZE = 500
+LAPSE_MAX_EASE = 2
 
 
 def _dump_list(value: Optional[Iterable[str]]) -> str:
@@ -23,6 +30,11 @@ def _load_list(value: Optional[str]) -> List[str]:
         return [value]
 
 
+def _chunked(values: Sequence, size: int = SQL_CHUNK_SIZE) -> Iterator[Sequence]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
 def get_user(db: Session, user_id: int) -> Optional[User]:
     return db.query(User).filter(User.id == user_id).first()
 
@@ -137,6 +149,7 @@ def update_collection(
 
 
 def delete_collection(db: Session, collection: Collection) -> None:
+    invalidate_forecast(collection.owner_id)
     collection.cards = []
     db.commit()
     db.refresh(collection)
@@ -185,9 +198,84 @@ def create_card(
         db.commit()
         db.refresh(card)
 
+    invalidate_forecast(owner_id)
     return card
 
 
+def create_cards_from_dict(
+    db: Session,
+    owner_id: int,
+    collection_id: int,
+    dict_ids: Sequence[int]
+) -> tuple[int, int, int]:
+    """Add a card for every dictionary word the user has no card for yet.
+
+    A word is already known when one of the user's cards was created from
+    it or shares its headword. New cards are inserted in the order given
+    and added to the collection in a single transaction. Repeated ids are
+    dropped first. Returns (created, already known, duplicates), where a
+    duplicate shares its headword with a word created earlier in the same
+    call.
+    """
+    dict_ids = list(dict.fromkeys(dict_ids))
+    known_ids: set[int] = set()
+    words: dict[int, DictWord] = {}
+    for chunk in _chunked(dict_ids):
+        known_ids.update(
+            row[0]
+            for row in db.query(Card.created_from_dict_id)
+            .filter(Card.owner_id == owner_id, Card.created_from_dict_id.in_(chunk))
+        )
+        words.update((word.id, word) for word in db.query(DictWord).filter(DictWord.id.in_(chunk)))
+    candidates = [words[word_id] for word_id in dict_ids if word_id in words and word_id not in known_ids]
+
+    known_headwords: set[str] = set()
+    for chunk in _chunked(list({word.simplified for word in candidates})):
+        known_headwords.update(
+            row[0] for row in db.query(Card.simplified).filter(Card.owner_id == owner_id, Card.simplified.in_(chunk))
+        )
+    fresh: dict[str, DictWord] = {}
+    duplicates = 0
+    for word in candidates:
+        if word.simplified in known_headwords:
+            continue
+        if word.simplified in fresh:
+            duplicates += 1
+        else:
+            fresh[word.simplified] = word
+    existing = len(words) - len(fresh) - duplicates
+    if not fresh:
+        return 0, existing, duplicates
+
+    now = datetime.utcnow()
+    card_ids = db.scalars(
+        insert(Card).returning(Card.id, sort_by_parameter_order=True),
+        [
+            {
+                "owner_id": owner_id,
+                "simplified": word.simplified,
+                "pinyin": word.pinyin or "",
+                "meanings_json": word.meanings or "[]",
+                "examples_json": word.examples or "[]",
+                "tags_json": word.tags or "[]",
+                "created_from_dict_id": word.id,
+                "next_due": now,
+                "created_at": now,
+                "updated_at": now,
+                "last_modified": now
+            }
+            for word in fresh.values()
+        ]
+    ).all()
+    db.execute(
+        insert(card_collection),
+        [{"card_id": card_id, "collection_id": collection_id} for card_id in card_ids]
+    )
+    db.commit()
+    invalidate_forecast(owner_id)
+    return len(card_ids), existing, duplicates
+
+
 def update_card(
     db: Session,
     card: Card,
@@ -223,10 +311,12 @@ def update_card(
     card.last_modified = now
     db.commit()
     db.refresh(card)
+    invalidate_forecast(card.owner_id)
     return card
 
 
 def delete_card(db: Session, card: Card) -> None:
+    invalidate_forecast(card.owner_id)
     db.query(StudyLog).filter(StudyLog.card_id == card.id).delete()
     card.collections = []
     db.commit()
@@ -255,28 +345,202 @@ def record_study(
     user_id: int,
     card_id: int,
     quality: int,
-    response_time_ms: int
+    response_time_ms: int,
+    engine: Optional[SchedulerEngine] = None
 ) -> tuple[Card, StudyLog]:
     card = db.query(Card).filter(Card.owner_id == user_id, Card.id == card_id).first()
     if not card:
         raise ValueError("Card not found")
 
-    apply_sm2(card, quality)
+    now = datetime.utcnow()
+    (engine or SM2Engine()).review(card, quality, now)
+    if quality <= LAPSE_MAX_EASE:
+        card.lapse_count = (card.lapse_count or 0) + 1
+        card.last_failed_at = now
     log = StudyLog(
         card_id=card.id,
         user_id=user_id,
+        timestamp=now,
         ease=quality,
         correct=quality >= 3,
         response_time_ms=response_time_ms,
-        last_modified=datetime.utcnow()
+        last_modified=now
     )
     db.add(log)
     db.commit()
+    invalidate_forecast(user_id)
+    mark_reviewed(user_id, [card.id])
     db.refresh(card)
     db.refresh(log)
     return card, log
 
 
+def record_study_batch(
+    db: Session,
+    user_id: int,
+    reviews: Sequence[tuple[int, int, int]],
+    now: Optional[datetime] = None,
+    client_keys: Optional[Sequence[Optional[str]]] = None,
+    engine: Optional[SchedulerEngine] = None
+) -> List[int]:
+    if now is None:
+        now = datetime.utcnow()
+    if engine is None:
+        engine = SM2Engine()
+    if not reviews:
+        return []
+
+    card_ids = sorted({card_id for card_id, _, _ in reviews})
+    rows_by_id: dict[int, tuple] = {}
+    for chunk in _chunked(card_ids):
+        rows = (
+            db.query(
+                Card.id,
+                Card.easiness,
+                Card.interval_days,
+                Card.repetitions,
+                Card.stability,
+                Card.difficulty,
+                Card.next_due,
+                Card.lapse_count,
+                Card.last_failed_at
+            )
+            .filter(Card.owner_id == user_id, Card.id.in_(chunk))
+            .all()
+        )
+        for row in rows:
+            rows_by_id[row.id] = row
+    if len(rows_by_id) != len(card_ids):
+        raise ValueError("Card not found")
+
+    loaded = [rows_by_id[card_id] for card_id in card_ids]
+    state = CardStateBatch.from_columns(
+        [row.easiness for row in loaded],
+        [row.interval_days for row in loaded],
+        [row.repetitions for row in loaded],
+        [row.stability for row in loaded],
+        [row.difficulty for row in loaded],
+        [row.next_due or now for row in loaded]
+    )
+    lapse_counts = [row.lapse_count or 0 for row in loaded]
+    last_failed = [row.last_failed_at for row in loaded]
+    positions = {card_id: pos for pos, card_id in enumerate(card_ids)}
+
+    # Reviews of the same card depend on each other, so split the batch into
+    # rounds in which every card appears at most once and run them in order.
+    rounds: list[list[tuple[int, int, int]]] = []
+    seen: dict[int, int] = {}
+    for review in reviews:
+        index = seen.get(review[0], 0)
+        seen[review[0]] = index + 1
+        if index == len(rounds):
+            rounds.append([])
+        rounds[index].append(review)
+
+    for batch in rounds:
+        index = np.array([positions[card_id] for card_id, _, _ in batch])
+        quality = np.array([quality for _, quality, _ in batch])
+        state.put(index, engine.review_batch(state.take(index), quality, now))
+        for pos, value in zip(index.tolist(), quality.tolist()):
+            if value <= LAPSE_MAX_EASE:
+                lapse_counts[pos] += 1
+                last_failed[pos] = now
+
+    db.execute(
+        update(Card),
+        [
+            {
+                "id": card_id,
+                **state.row(pos),
+                "lapse_count": lapse_counts[pos],
+                "last_failed_at": last_failed[pos],
+                "updated_at": now,
+                "last_modified": now
+            }
+            for pos, card_id in enumerate(card_ids)
+        ]
+    )
+    db.execute(
+        insert(StudyLog),
+        [
+            {
+                "card_id": card_id,
+                "user_id": user_id,
+                "timestamp": now,
+                "ease": quality,
+                "correct": quality >= 3,
+                "response_time_ms": response_time_ms,
+                "client_key": client_keys[pos] if client_keys else None,
+                "last_modified": now
+            }
+            for pos, (card_id, quality, response_time_ms) in enumerate(reviews)
+        ]
+    )
+    db.commit()
+    invalidate_forecast(user_id)
+    mark_reviewed(user_id, card_ids)
+    return card_ids
+
+
+def get_logged_client_keys(db: Session, user_id: int, client_keys: Sequence[str]) -> set[str]:
+    logged: set[str] = set()
+    for chunk in _chunked(list(client_keys)):
+        rows = (
+            db.query(StudyLog.client_key)
+            .filter(StudyLog.user_id == user_id, StudyLog.client_key.in_(chunk))
+            .all()
+        )
+        logged.update(row[0] for row in rows)
+    return logged
+
+
+def list_card_states(db: Session, user_id: int, card_ids: Sequence[int]) -> List[dict]:
+    states: List[dict] = []
+    for chunk in _chunked(list(card_ids)):
+        rows = (
+            db.query(
+                Card.id,
+                Card.easiness,
+                Card.interval_days,
+                Card.repetitions,
+                Card.next_due,
+                Card.last_modified
+            )
+            .filter(Card.owner_id == user_id, Card.id.in_(chunk))
+            .all()
+        )
+        states.extend(dict(row._mapping) for row in rows)
+    return states
+
+
+def record_lapses(db: Session, user_id: int, logs: Iterable[StudyLog]) -> None:
+    lapses: dict[int, list] = {}
+    for log in logs:
+        if log.ease > LAPSE_MAX_EASE:
+            continue
+        entry = lapses.setdefault(log.card_id, [0, log.timestamp])
+        entry[0] += 1
+        if log.timestamp and (entry[1] is None or log.timestamp > entry[1]):
+            entry[1] = log.timestamp
+    if not lapses:
+        return
+
+    cards = Card.__table__
+    failed_at = bindparam("failed_at", type_=DateTime)
+    db.execute(
+        cards.update()
+        .where(cards.c.id == bindparam("card_id"), cards.c.owner_id == user_id)
+        .values(
+            lapse_count=func.coalesce(cards.c.lapse_count, 0) + bindparam("lapses"),
+            last_failed_at=func.max(func.coalesce(cards.c.last_failed_at, failed_at), failed_at)
+        ),
+        [
+            {"card_id": card_id, "lapses": count, "failed_at": failed_at_value}
+            for card_id, (count, failed_at_value) in lapses.items()
+        ]
+    )
+
+
 def card_to_dict(card: Card) -> dict:
     return {
         "id": card.id,
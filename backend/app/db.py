@@ -1,7 +1,14 @@
+import sqlite3
+import time
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Callable, Iterator, Optional
 
 from sqlalchemy import create_engine, event
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.engine.interfaces import AdaptedConnection
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
 from .config import settings
 
@@ -17,10 +24,13 @@ connect_args = {}
 engine_options = {"pool_pre_ping": True}
 
 if DATABASE_URL.startswith("sqlite:///"):
+    ASYNC_DATABASE_URL = settings.async_database_url or DATABASE_URL.replace(
+        "sqlite:///", "sqlite+aiosqlite:///", 1
+    )
     connect_args = {"check_same_thread": False, "timeout": 30}
     engine = create_engine(DATABASE_URL, connect_args=connect_args, **engine_options)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, connect_args=connect_args, **engine_options)
 
-    @event.listens_for(engine, "connect")
     def _set_sqlite_pragmas(dbapi_connection, _connection_record) -> None:
         cursor = dbapi_connection.cursor()
         cursor.execute("PRAGMA journal_mode=WAL")
@@ -28,9 +38,21 @@ if DATABASE_URL.startswith("sqlite:///"):
         cursor.execute("PRAGMA busy_timeout=5000")
         cursor.execute("PRAGMA foreign_keys=ON")
         cursor.close()
+
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
 else:
+    # Other backends need an async driver URL, e.g. postgresql+asyncpg://.
+    ASYNC_DATABASE_URL = settings.async_database_url or DATABASE_URL
     engine = create_engine(DATABASE_URL, connect_args=connect_args, **engine_options)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, connect_args=connect_args, **engine_options)
+# SQLite VM instructions between deadline checks.
+PROGRESS_STEPS = 1000
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Async endpoints run the shared sync helpers through AsyncSession.run_sync
+# and read results after the commit, so instances must not expire.
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
@@ -40,3 +62,65 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def _sqlite_connection(db: Session) -> Optional[sqlite3.Connection]:
+    raw = db.connection().connection.dbapi_connection
+    return raw if isinstance(raw, sqlite3.Connection) else None
+
+
+def _set_progress_handler(db: Session, handler: Optional[Callable[[], bool]], steps: int) -> bool:
+    """Install `handler` on the session's SQLite connection.
+
+    aiosqlite runs every call on its own worker thread, so for async
+    sessions the handler is set through the driver on that thread rather
+    than on the sqlite3 connection from here. Returns False for backends
+    other than SQLite.
+    """
+    raw = db.connection().connection.dbapi_connection
+    if isinstance(raw, sqlite3.Connection):
+        raw.set_progress_handler(handler, steps)
+        return True
+    if isinstance(raw, AdaptedConnection) and db.get_bind().dialect.driver == "aiosqlite":
+        raw.run_async(lambda connection: connection.set_progress_handler(handler, steps))
+        return True
+    return False
+
+
+def begin_immediate(db: Session) -> None:
+    """Open the session's SQLite transaction now, taking the write lock.
+
+    pysqlite only opens a transaction before DML, so DDL issued first would
+    run in autocommit mode, and a read that is later followed by a write
+    fails outright if another connection commits in between. Other drivers,
+    aiosqlite included, are left alone.
+    """
+    raw = _sqlite_connection(db)
+    if raw is not None and not raw.in_transaction:
+        raw.execute("BEGIN IMMEDIATE")
+
+
+@contextmanager
+def query_deadline(db: Session, seconds: Optional[float]) -> Iterator[None]:
+    """Interrupt SQLite statements still running `seconds` from now.
+
+    An interrupted statement raises OperationalError; see is_interrupted().
+    Other backends run unbounded.
+    """
+    deadline = time.monotonic() + (seconds or 0)
+    if not seconds or not _set_progress_handler(db, lambda: time.monotonic() > deadline, PROGRESS_STEPS):
+        yield
+        return
+    try:
+        yield
+    finally:
+        _set_progress_handler(db, None, 0)
+
+
+def is_interrupted(exc: OperationalError) -> bool:
+    return "interrupted" in str(exc.orig)
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Hashable, Optional
+
+from .config import settings
+
+_lock = threading.Lock()
+_generation = 0
+
+
+def dict_generation() -> int:
+    return _generation
+
+
+def bump_dict_generation() -> int:
+    # Called whenever an import job finishes. Every cache keyed by the
+    # generation becomes unreachable at once and ages out of the LRU.
+    global _generation
+    with _lock:
+        _generation += 1
+        return _generation
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+
+class SearchCache:
+    # The generation is per process; callers put dict_marker() in the key so
+    # imports run by other processes are seen as well.
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, generation: int) -> Optional[Any]:
+        full_key = (generation, key)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(full_key)
+            if cached and now - cached[0] < self.ttl_seconds:
+                self._entries.move_to_end(full_key)
+                self.stats.hits += 1
+                return cached[1]
+            if cached:
+                del self._entries[full_key]
+                self.stats.expirations += 1
+            self.stats.misses += 1
+            return None
+
+    def put(self, key: Hashable, generation: int, value: Any) -> None:
+        # Callers pass the generation read before computing, so a result that
+        # raced an import is dropped instead of being served as current.
+        if self.max_entries <= 0 or generation != dict_generation():
+            return
+        with self._lock:
+            self._entries[(generation, key)] = (time.monotonic(), value)
+            self._entries.move_to_end((generation, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "generation": dict_generation(),
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                **asdict(self.stats)
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+search_cache = SearchCache(settings.search_cache_size, settings.search_cache_ttl_seconds)
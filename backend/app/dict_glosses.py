@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import List, Optional
+
+MAX_GLOSSES = 3
+MAX_GLOSS_LENGTH = 40
+
+_GLOSS_SPLIT = re.compile(r"\s*;\s*")
+
+
+def format_glosses(raw: Optional[str]) -> List[str]:
+    """Short English glosses from a dict_word.meanings JSON list.
+
+    Semicolon-separated senses are split, lowercased and stripped of
+    parenthesized notes; long and repeated glosses are dropped.
+    """
+    try:
+        meanings = json.loads(raw) if raw else []
+    except json.JSONDecodeError:
+        meanings = [raw]
+    if not isinstance(meanings, list):
+        meanings = [meanings]
+    glosses: List[str] = []
+    for meaning in meanings:
+        for gloss in _GLOSS_SPLIT.split(str(meaning).strip().lower()):
+            gloss = re.sub(r"\s*\([^)]*\)", "", gloss).strip()
+            if gloss and len(gloss) <= MAX_GLOSS_LENGTH and gloss not in glosses:
+                glosses.append(gloss)
+    return glosses[:MAX_GLOSSES]
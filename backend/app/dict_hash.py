@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Optional
+
+
+def content_hash(
+    meanings: Optional[str],
+    examples: Optional[str],
+    tags: Optional[str],
+    hsk_level: Optional[int],
+    pos: Optional[str],
+    frequency: Optional[float]
+) -> str:
+    """Digest of a dict_word payload as stored, for dict_word.content_hash.
+
+    Diff imports key rows by (simplified, traditional, pinyin) and rewrite
+    a row only when this digest changes.
+    """
+    payload = "\x1f".join(repr(value) for value in (meanings, examples, tags, hsk_level, pos, frequency))
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from typing import Optional
+
+# Relevance weights for dictionary search. An exact headword or pinyin hit
+# always outscores a row without one (8 + 2 > 4 + 2 + 2 + 1), so a first
+# page filled by exact hits is final without scoring the rest of the match.
+RANK_EXACT_KEY = 8.0
+RANK_EXACT_GLOSS = 4.0
+RANK_TEXT = 2.0
+RANK_FREQUENCY = 2.0
+RANK_HSK = 1.0
+# Frequency at which the frequency term reaches half its weight.
+RANK_FREQUENCY_PIVOT = 10.0
+# Largest full-text match still scored with bm25().
+RANK_TEXT_MAX_HITS = 5000
+
+
+def rank_prior(frequency: Optional[float], hsk_level: Optional[int]) -> float:
+    """Query-independent part of the score, stored as dict_word.rank_prior.
+
+    Frequency saturates so a handful of very common words cannot drown out
+    text relevance; lower HSK levels score higher.
+    """
+    frequency = max(frequency or 0.0, 0.0)
+    score = RANK_FREQUENCY * frequency / (frequency + RANK_FREQUENCY_PIVOT)
+    if hsk_level is not None and 1 <= hsk_level <= 9:
+        score += RANK_HSK * (10 - hsk_level) / 9.0
+    return score
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Iterator, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal
+from .dict_cache import dict_generation
+from .dict_glosses import format_glosses
+from .pagination import dict_marker
+
+# Longest headword looked up; CC-CEDICT idioms and proverbs stay below it.
+MAX_WORD_LENGTH = 16
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_build_lock = threading.Lock()
+_current: Optional[SegmentIndex] = None
+
+
+class SegmentIndex:
+    """Forward maximal-match segmenter over dict_word.simplified.
+
+    The trie is stored flat: every prefix of every headword maps to the
+    rank of its best entry (frequency first, then HSK level), or to -1 for
+    a prefix that is not itself a word. Walking it is one dict probe per
+    character, which is far cheaper in Python than a tree of node objects.
+    """
+
+    def __init__(self, db: Session, generation: int, marker: str) -> None:
+        self.generation = generation
+        self.marker = marker
+        rows = db.execute(
+            text(
+                """
+                SELECT id, simplified, traditional, pinyin, meanings, hsk_level
+                FROM dict_word
+                ORDER BY frequency IS NULL, frequency DESC,
+                         hsk_level IS NULL, hsk_level ASC, id ASC
+                """
+            )
+        )
+        self.words: List[tuple] = []
+        self.prefixes: dict[str, int] = {}
+        prefixes = self.prefixes
+        for row in rows:
+            headword = row.simplified
+            if not headword or len(headword) > MAX_WORD_LENGTH or prefixes.get(headword, -1) >= 0:
+                continue
+            glosses = format_glosses(row.meanings)
+            prefixes[headword] = len(self.words)
+            self.words.append(
+                (row.id, headword, row.traditional, row.pinyin, glosses[0] if glosses else None, row.hsk_level)
+            )
+            for size in range(1, len(headword)):
+                prefixes.setdefault(headword[:size], -1)
+
+    def is_current(self, marker: str) -> bool:
+        return self.generation == dict_generation() and self.marker == marker
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def segment(self, source: str) -> Iterator[tuple[int, str, Optional[int]]]:
+        """Yield (start, text, word) tokens covering `source` in order.
+
+        `word` indexes self.words, or is None for text with no dictionary
+        entry; consecutive characters of that kind are yielded as one run.
+        """
+        prefixes = self.prefixes
+        size = len(source)
+        position = 0
+        unknown = -1
+        while position < size:
+            end = 0
+            word = -1
+            stop = min(size, position + MAX_WORD_LENGTH)
+            probe = position + 1
+            while probe <= stop:
+                found = prefixes.get(source[position:probe])
+                if found is None:
+                    break
+                if found >= 0:
+                    end, word = probe, found
+                probe += 1
+            if word < 0:
+                if unknown < 0:
+                    unknown = position
+                position += 1
+                continue
+            if unknown >= 0:
+                yield unknown, source[unknown:position], None
+                unknown = -1
+            yield position, source[position:end], word
+            position = end
+        if unknown >= 0:
+            yield unknown, source[unknown:], None
+
+
+def _build() -> SegmentIndex:
+    global _current
+    db = SessionLocal()
+    try:
+        # Read the generation and marker first, as the suggest index does: an
+        # import finishing mid-build leaves the new index stale.
+        index = SegmentIndex(db, dict_generation(), dict_marker(db))
+    finally:
+        db.close()
+    with _lock:
+        _current = index
+    return index
+
+
+def warm_segment_index() -> None:
+    db = SessionLocal()
+    try:
+        get_segment_index(db)
+    except Exception as exc:  # pragma: no cover - best effort
+        logger.warning("Segment index build failed: %s", exc)
+    finally:
+        db.close()
+
+
+def get_segment_index(db: Session) -> SegmentIndex:
+    """Current index, building it first when missing or stale.
+
+    Staleness is checked against dict_marker() as well as the generation,
+    so imports run by other processes are seen. Unlike suggestions there
+    is no SQL fallback worth having, so callers wait for the build;
+    concurrent callers share a single build.
+    """
+    marker = dict_marker(db)
+    current = _current
+    if current is not None and current.is_current(marker):
+        return current
+    with _build_lock:
+        current = _current
+        if current is not None and current.is_current(marker):
+            return current
+        return _build()
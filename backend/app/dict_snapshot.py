@@ -0,0 +1,375 @@
+from __future__ import annotations
+
+import argparse
+import bisect
+import json
+import logging
+import math
+import mmap
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .config import BASE_DIR, settings
+from .db import SessionLocal
+from .pagination import dict_marker
+
+MAGIC = b"FCDSNAP1"
+FORMAT_VERSION = 1
+FIELD_SEP = "\x1e"
+ITEM_SEP = "\x1f"
+KEY_KINDS = ("simplified", "traditional", "pinyin")
+# Valid UTF-8 never contains 0xff, so prefix + 0xff sorts after every key
+# that starts with prefix.
+PREFIX_END = b"\xff"
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_loaded: Optional[DictSnapshot] = None
+
+
+def snapshot_path() -> Path:
+    if settings.dict_snapshot_path:
+        return Path(settings.dict_snapshot_path)
+    if settings.database_url.startswith("sqlite:///"):
+        db_path = Path(settings.database_url.replace("sqlite:///", "", 1))
+        if db_path.name not in ("", ":memory:"):
+            return db_path.with_name(f"{db_path.name}.dict-snapshot")
+    return BASE_DIR / "data" / "dict.snapshot"
+
+
+def _load_list(value: Optional[str]) -> list[str]:
+    if not value:
+        return []
+    try:
+        data = json.loads(value)
+        if isinstance(data, list):
+            return [str(item) for item in data]
+    except json.JSONDecodeError:
+        pass
+    return [value]
+
+
+def _clean(value: Optional[str]) -> str:
+    if not value:
+        return ""
+    return value.replace(FIELD_SEP, " ").replace(ITEM_SEP, " ")
+
+
+def _pack_list(values: Iterable[str]) -> str:
+    return ITEM_SEP.join(_clean(value) for value in values)
+
+
+def compact_pinyin(value: Optional[str]) -> str:
+    return (value or "").replace(" ", "")
+
+
+class SortedKeys(Sequence):
+    # A sorted key column viewed as a sequence of bytes, so the stdlib bisect
+    # can search it without materializing the keys.
+    def __init__(self, arena: memoryview, offsets: np.ndarray) -> None:
+        self.arena = arena
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> bytes:
+        return bytes(self.arena[int(self.offsets[index]):int(self.offsets[index + 1])])
+
+
+class DictSnapshot:
+    """Read-only, memory-mapped view of dict_word.
+
+    Records are stored in id order. Each key kind has its own sorted key
+    arena plus the record positions in that order, so exact and prefix
+    lookups are two bisects. Text fields are pre-split with control
+    separators so hydrating a row never goes through json.loads.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with open(path, "rb") as handle:
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        stat = os.stat(path)
+        self.file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        buffer = memoryview(self._mmap)
+        if bytes(buffer[:8]) != MAGIC:
+            raise ValueError(f"Not a dictionary snapshot: {path}")
+        header_size = int(np.frombuffer(buffer, dtype="<u4", count=1, offset=8)[0])
+        header = json.loads(bytes(buffer[12:12 + header_size]))
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {header.get('version')}")
+
+        self.marker: str = header["marker"]
+        self.count: int = header["count"]
+        self.pos_names: List[str] = header["pos_names"]
+        sections = header["sections"]
+
+        def array(name: str) -> np.ndarray:
+            offset, dtype, length = sections[name]
+            return np.frombuffer(buffer, dtype=dtype, count=length, offset=offset)
+
+        def blob(name: str) -> memoryview:
+            offset, _, length = sections[name]
+            return buffer[offset:offset + length]
+
+        self.ids = array("ids")
+        self.hsk = array("hsk")
+        self.pos = array("pos")
+        self.frequency = array("frequency")
+        self._record_offsets = array("record_offsets")
+        self._records = blob("records")
+        self._keys = {
+            kind: (SortedKeys(blob(f"{kind}_keys"), array(f"{kind}_key_offsets")), array(f"{kind}_rows"))
+            for kind in KEY_KINDS
+        }
+
+    def lookup(self, kind: str, needle: str, prefix: bool = False) -> np.ndarray:
+        keys, rows = self._keys[kind]
+        raw = needle.encode("utf-8")
+        if not raw:
+            return np.empty(0, dtype=np.int64)
+        start = bisect.bisect_left(keys, raw)
+        end = bisect.bisect_left(keys, raw + PREFIX_END) if prefix else bisect.bisect_right(keys, raw)
+        return np.sort(rows[start:end].astype(np.int64))
+
+    def filter(
+        self,
+        positions: Optional[np.ndarray],
+        hsk_levels: Sequence[int],
+        pos_values: Sequence[str],
+        freq_min: Optional[float],
+        freq_max: Optional[float]
+    ) -> np.ndarray:
+        selected = np.arange(self.count) if positions is None else positions
+        if hsk_levels:
+            selected = selected[np.isin(self.hsk[selected], hsk_levels)]
+        if pos_values:
+            codes = [code for code, name in enumerate(self.pos_names) if name in pos_values]
+            selected = selected[np.isin(self.pos[selected], codes)]
+        if freq_min is not None:
+            selected = selected[self.frequency[selected] >= freq_min]
+        if freq_max is not None:
+            selected = selected[self.frequency[selected] <= freq_max]
+        return selected
+
+    def facets(self, positions: np.ndarray) -> tuple[dict, dict]:
+        hsk = self.hsk[positions]
+        hsk = hsk[hsk >= 0]
+        levels, level_counts = np.unique(hsk, return_counts=True)
+        pos = self.pos[positions]
+        pos = pos[pos >= 0]
+        codes, code_counts = np.unique(pos, return_counts=True)
+        return (
+            {str(int(level)): int(count) for level, count in zip(levels, level_counts)},
+            {self.pos_names[int(code)]: int(count) for code, count in zip(codes, code_counts)}
+        )
+
+    def after(self, positions: np.ndarray, after_id: int) -> np.ndarray:
+        return positions[np.searchsorted(self.ids[positions], after_id, side="right"):]
+
+    def entry(self, position: int) -> dict:
+        start = int(self._record_offsets[position])
+        end = int(self._record_offsets[position + 1])
+        fields = bytes(self._records[start:end]).decode("utf-8").split(FIELD_SEP)
+        simplified, traditional, pinyin, pinyin_normalized, meanings, examples, tags = fields
+        hsk = int(self.hsk[position])
+        pos = int(self.pos[position])
+        frequency = float(self.frequency[position])
+        return {
+            "id": int(self.ids[position]),
+            "simplified": simplified,
+            "traditional": traditional or None,
+            "pinyin": pinyin or None,
+            "pinyin_normalized": pinyin_normalized or None,
+            "meanings": meanings.split(ITEM_SEP) if meanings else [],
+            "examples": examples.split(ITEM_SEP) if examples else [],
+            "tags": tags.split(ITEM_SEP) if tags else [],
+            "hsk_level": hsk if hsk >= 0 else None,
+            "pos": self.pos_names[pos] if pos >= 0 else None,
+            "frequency": None if math.isnan(frequency) else frequency
+        }
+
+
+def _key_sections(values: List[str]) -> tuple[np.ndarray, np.ndarray, bytes]:
+    encoded = [value.encode("utf-8") for value in values]
+    order = sorted(range(len(encoded)), key=encoded.__getitem__)
+    ordered = [encoded[row] for row in order]
+    offsets = np.zeros(len(ordered) + 1, dtype="<u8")
+    np.cumsum([len(key) for key in ordered], out=offsets[1:])
+    return np.asarray(order, dtype="<u4"), offsets, b"".join(ordered)
+
+
+def build_snapshot(db: Session, marker: str, path: Optional[Path] = None) -> Path:
+    path = path or snapshot_path()
+    rows = db.execute(
+        text(
+            """
+            SELECT id, simplified, traditional, pinyin, pinyin_normalized,
+                   meanings, examples, tags, hsk_level, pos, frequency
+            FROM dict_word
+            ORDER BY id ASC
+            """
+        )
+    )
+
+    ids: List[int] = []
+    hsk: List[int] = []
+    pos_codes: List[int] = []
+    frequency: List[float] = []
+    records: List[bytes] = []
+    keys: dict[str, List[str]] = {kind: [] for kind in KEY_KINDS}
+    pos_names: dict[str, int] = {}
+    for row in rows:
+        ids.append(row.id)
+        hsk.append(row.hsk_level if row.hsk_level is not None else -1)
+        pos_codes.append(pos_names.setdefault(row.pos, len(pos_names)) if row.pos else -1)
+        frequency.append(row.frequency if row.frequency is not None else math.nan)
+        records.append(
+            FIELD_SEP.join(
+                [
+                    _clean(row.simplified),
+                    _clean(row.traditional),
+                    _clean(row.pinyin),
+                    _clean(row.pinyin_normalized),
+                    _pack_list(_load_list(row.meanings)),
+                    _pack_list(_load_list(row.examples)),
+                    _pack_list(_load_list(row.tags))
+                ]
+            ).encode("utf-8")
+        )
+        keys["simplified"].append(row.simplified or "")
+        keys["traditional"].append(row.traditional or "")
+        keys["pinyin"].append(compact_pinyin(row.pinyin_normalized))
+
+    record_offsets = np.zeros(len(records) + 1, dtype="<u8")
+    np.cumsum([len(record) for record in records], out=record_offsets[1:])
+    sections: List[tuple[str, object]] = [
+        ("ids", np.asarray(ids, dtype="<i8")),
+        ("frequency", np.asarray(frequency, dtype="<f8")),
+        ("record_offsets", record_offsets),
+        ("pos", np.asarray(pos_codes, dtype="<i2")),
+        ("hsk", np.asarray(hsk, dtype="i1")),
+        ("records", b"".join(records))
+    ]
+    for kind in KEY_KINDS:
+        order, offsets, arena = _key_sections(keys[kind])
+        sections += [
+            (f"{kind}_rows", order),
+            (f"{kind}_key_offsets", offsets),
+            (f"{kind}_keys", arena)
+        ]
+
+    # Section offsets depend on the header size, so lay out relative to the
+    # end of a header padded to a fixed 4 KiB page.
+    header_space = 4096
+    layout: dict[str, list] = {}
+    cursor = header_space
+    for name, data in sections:
+        cursor = (cursor + 7) // 8 * 8
+        if isinstance(data, np.ndarray):
+            layout[name] = [cursor, data.dtype.str, int(data.size)]
+            cursor += data.nbytes
+        else:
+            layout[name] = [cursor, "bytes", len(data)]
+            cursor += len(data)
+    header = json.dumps(
+        {
+            "version": FORMAT_VERSION,
+            "marker": marker,
+            "count": len(ids),
+            "pos_names": list(pos_names),
+            "sections": layout
+        }
+    ).encode("utf-8")
+    if 12 + len(header) > header_space:
+        raise ValueError("Snapshot header too large")
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle, temp_name = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(handle, "wb") as output:
+            output.write(MAGIC)
+            output.write(np.uint32(len(header)).astype("<u4").tobytes())
+            output.write(header)
+            for name, data in sections:
+                output.seek(layout[name][0])
+                output.write(data.tobytes() if isinstance(data, np.ndarray) else data)
+            output.flush()
+            os.fsync(output.fileno())
+        # Readers keep their old mapping until they notice the new file.
+        os.replace(temp_name, path)
+    except BaseException:
+        if os.path.exists(temp_name):
+            os.unlink(temp_name)
+        raise
+    return path
+
+
+def get_snapshot(marker: str) -> Optional[DictSnapshot]:
+    """Return the mapped snapshot if it was built for `marker`, else None."""
+    global _loaded
+    current = _loaded
+    if current is not None and current.marker == marker:
+        return current
+
+    with _lock:
+        path = snapshot_path()
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if _loaded is None or _loaded.file_id != file_id:
+            # The old mapping is left to the garbage collector; arrays handed
+            # out to in-flight requests still reference it.
+            try:
+                _loaded = DictSnapshot(path)
+            except (OSError, ValueError, KeyError):
+                _loaded = None
+                return None
+        return _loaded if _loaded.marker == marker else None
+
+
+def refresh_snapshot(db: Session) -> bool:
+    marker = dict_marker(db)
+    if get_snapshot(marker) is not None:
+        return False
+    build_snapshot(db, marker)
+    return True
+
+
+def warm_snapshot() -> None:
+    # Run off the request path at startup; until it finishes, searches use SQLite.
+    db = SessionLocal()
+    try:
+        refresh_snapshot(db)
+    except Exception as exc:  # pragma: no cover - best effort
+        logger.warning("Dictionary snapshot build failed: %s", exc)
+    finally:
+        db.close()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build the memory-mapped dictionary snapshot.")
+    parser.add_argument("--path", type=Path, default=None)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        path = build_snapshot(db, dict_marker(db), args.path)
+    finally:
+        db.close()
+    print(f"Wrote dictionary snapshot to {path}")
+
+
+if __name__ == "__main__":
+    main()
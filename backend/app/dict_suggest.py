@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import bisect
+import logging
+import re
+import threading
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal
+from .dict_cache import dict_generation
+from .dict_glosses import format_glosses
+from .dict_snapshot import PREFIX_END, SortedKeys
+from .pagination import dict_marker
+
+# dict_word columns each suggestion key comes from.
+SUGGEST_KINDS = ("simplified", "pinyin", "initials", "english")
+# Below this many prefix matches the whole range is ranked directly;
+# above it, walking entries in rank order reaches k matches sooner.
+RANGE_SCAN_LIMIT = 4096
+RANK_WALK_BLOCK = 8192
+
+_GLOSS_LEAD = re.compile(r"^(?:to|a|an|the)\s+")
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_current: Optional[SuggestIndex] = None
+_building = False
+
+
+class SuggestIndex:
+    """Prefix index over headword, pinyin, pinyin initial and gloss keys.
+
+    All keys live in one sorted arena; a prefix is two bisects. Every entry
+    also has the rank of its word (frequency first, then HSK level), so
+    the top k of a range come from a partial sort, or, for short prefixes
+    that match much of the dictionary, from walking entries best-first
+    until k distinct words have matched.
+    """
+
+    def __init__(self, db: Session, generation: int, marker: str) -> None:
+        self.generation = generation
+        self.marker = marker
+        rows = db.execute(
+            text(
+                """
+                SELECT id, simplified, traditional, pinyin, pinyin_syllables,
+                       meanings, hsk_level, frequency
+                FROM dict_word
+                ORDER BY frequency IS NULL, frequency DESC,
+                         hsk_level IS NULL, hsk_level ASC, id ASC
+                """
+            )
+        )
+
+        # Words are stored in rank order, so a word's index is its rank.
+        self.words: List[tuple] = []
+        keys: List[bytes] = []
+        entry_word: List[int] = []
+        entry_kind: List[int] = []
+        for row in rows:
+            word = len(self.words)
+            glosses = format_glosses(row.meanings)
+            self.words.append(
+                (
+                    row.id,
+                    row.simplified,
+                    row.traditional,
+                    row.pinyin,
+                    glosses[0] if glosses else None,
+                    row.hsk_level,
+                    row.frequency
+                )
+            )
+            syllables = (row.pinyin_syllables or "").split()
+            candidates = [
+                (row.simplified or "", 0),
+                ("".join(syllables), 1),
+                ("".join(syllable[0] for syllable in syllables) if len(syllables) > 1 else "", 2)
+            ]
+            for gloss in glosses:
+                candidates.append((gloss, 3))
+                stripped = _GLOSS_LEAD.sub("", gloss)
+                if stripped != gloss:
+                    candidates.append((stripped, 3))
+            seen = set()
+            for key, kind in candidates:
+                if key and key not in seen:
+                    seen.add(key)
+                    keys.append(key.encode("utf-8"))
+                    entry_word.append(word)
+                    entry_kind.append(kind)
+
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        offsets = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum([len(keys[entry]) for entry in order], out=offsets[1:])
+        self._keys = SortedKeys(memoryview(b"".join(keys[entry] for entry in order)), offsets)
+        self.entry_word = np.asarray(entry_word, dtype=np.int32)[order]
+        self.entry_kind = np.asarray(entry_kind, dtype=np.int8)[order]
+        # Entry positions ordered best word first, for the rank walk.
+        self._by_rank = np.argsort(self.entry_word, kind="stable").astype(np.int32)
+
+    def __len__(self) -> int:
+        return len(self.entry_word)
+
+    def _range(self, prefix: str) -> tuple[int, int]:
+        raw = prefix.encode("utf-8")
+        return (
+            bisect.bisect_left(self._keys, raw),
+            bisect.bisect_left(self._keys, raw + PREFIX_END)
+        )
+
+    def top(self, prefixes: List[str], limit: int) -> List[tuple[int, int]]:
+        """Best `limit` (word, kind) pairs whose keys start with any prefix."""
+        ranges = [self._range(prefix) for prefix in dict.fromkeys(prefixes) if prefix]
+        ranges = [(start, end) for start, end in ranges if end > start]
+        if not ranges:
+            return []
+        matched = sum(end - start for start, end in ranges)
+        if matched <= RANGE_SCAN_LIMIT:
+            entries = np.concatenate([np.arange(start, end) for start, end in ranges])
+            entries = entries[np.argsort(self.entry_word[entries], kind="stable")]
+            return self._distinct(entries, limit)
+
+        picked: List[tuple[int, int]] = []
+        seen: set[int] = set()
+        for block in range(0, len(self._by_rank), RANK_WALK_BLOCK):
+            entries = self._by_rank[block:block + RANK_WALK_BLOCK]
+            hit = np.zeros(len(entries), dtype=bool)
+            for start, end in ranges:
+                hit |= (entries >= start) & (entries < end)
+            for entry in entries[hit]:
+                word = int(self.entry_word[entry])
+                if word not in seen:
+                    seen.add(word)
+                    picked.append((word, int(self.entry_kind[entry])))
+                    if len(picked) == limit:
+                        return picked
+        return picked
+
+    def _distinct(self, entries: np.ndarray, limit: int) -> List[tuple[int, int]]:
+        picked: List[tuple[int, int]] = []
+        seen: set[int] = set()
+        for entry in entries:
+            word = int(self.entry_word[entry])
+            if word not in seen:
+                seen.add(word)
+                picked.append((word, int(self.entry_kind[entry])))
+                if len(picked) == limit:
+                    break
+        return picked
+
+
+def _rebuild() -> None:
+    global _current, _building
+    db = SessionLocal()
+    try:
+        # Read the generation and marker first: an import finishing mid-build
+        # leaves the new index already stale, and the next request rebuilds.
+        index = SuggestIndex(db, dict_generation(), dict_marker(db))
+        with _lock:
+            _current = index
+    except Exception as exc:  # pragma: no cover - best effort
+        logger.warning("Suggest index build failed: %s", exc)
+    finally:
+        db.close()
+        with _lock:
+            _building = False
+
+
+def schedule_rebuild() -> bool:
+    """Start a background rebuild unless one is already running."""
+    global _building
+    with _lock:
+        if _building:
+            return False
+        _building = True
+    threading.Thread(target=_rebuild, name="dict-suggest", daemon=True).start()
+    return True
+
+
+def rebuild_suggest_index() -> SuggestIndex:
+    """Build synchronously; used at startup and by tests."""
+    global _building
+    with _lock:
+        _building = True
+    _rebuild()
+    return _current
+
+
+def get_suggest_index(marker: str) -> Optional[SuggestIndex]:
+    """Current index, or None while it is missing or being rebuilt.
+
+    A stale index is not served: after a replace import its words may no
+    longer exist. `marker` is the caller's dict_marker(), which catches
+    imports other processes ran. Callers fall back to SQLite until the
+    rebuild lands.
+    """
+    current = _current
+    if current is not None and current.generation == dict_generation() and current.marker == marker:
+        return current
+    schedule_rebuild()
+    return None
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .models import Card, card_collection
+
+MAX_FORECAST_DAYS = 365
+CACHE_MAX_ENTRIES = 1024
+# Invalidation is per process, so the TTL bounds how stale another worker's
+# cache can be after a write it did not see.
+CACHE_TTL_SECONDS = 300
+
+_lock = threading.Lock()
+_versions: dict[int, int] = {}
+_cache: OrderedDict[tuple, tuple[float, dict]] = OrderedDict()
+
+
+def invalidate_forecast(user_id: int) -> None:
+    with _lock:
+        _versions[user_id] = _versions.get(user_id, 0) + 1
+
+
+def _compute_forecast(
+    db: Session,
+    user_id: int,
+    today: date,
+    days: int,
+    collection_id: Optional[int]
+) -> dict:
+    horizon = datetime.combine(today + timedelta(days=days), datetime.min.time())
+    day = func.date(Card.next_due)
+    query = (
+        db.query(day, func.count(Card.id))
+        .filter(Card.owner_id == user_id)
+        .filter(Card.next_due < horizon)
+    )
+    if collection_id is not None:
+        query = query.join(card_collection).filter(
+            card_collection.c.collection_id == collection_id
+        )
+
+    counts = [0] * days
+    overdue = 0
+    for raw_day, count in query.group_by(day).all():
+        offset = (date.fromisoformat(raw_day) - today).days
+        if offset < 0:
+            overdue += count
+            offset = 0
+        counts[offset] += count
+
+    return {"start": today, "days": days, "overdue": overdue, "counts": counts}
+
+
+def due_forecast(
+    db: Session,
+    user_id: int,
+    days: int = 30,
+    collection_id: Optional[int] = None
+) -> dict:
+    days = max(1, min(days, MAX_FORECAST_DAYS))
+    today = datetime.utcnow().date()
+    with _lock:
+        key = (user_id, _versions.get(user_id, 0), collection_id, days, today)
+        cached = _cache.get(key)
+        if cached and time.monotonic() - cached[0] < CACHE_TTL_SECONDS:
+            _cache.move_to_end(key)
+            return cached[1]
+
+    forecast = _compute_forecast(db, user_id, today, days, collection_id)
+    with _lock:
+        _cache[key] = (time.monotonic(), forecast)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return forecast
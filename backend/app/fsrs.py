@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_WEIGHTS = np.array(
+    [
+        0.4, 0.6, 2.4, 5.8,
+        4.93, 0.94, 0.86, 0.01,
+        1.49, 0.14, 0.94,
+        2.18, 0.05, 0.34, 1.26,
+        0.29, 2.61
+    ]
+)
+
+WEIGHT_BOUNDS = np.array(
+    [
+        [0.1, 100.0], [0.1, 100.0], [0.1, 100.0], [0.1, 100.0],
+        [1.0, 10.0], [0.01, 5.0], [0.01, 5.0], [0.0, 0.5],
+        [0.0, 3.0], [0.0, 0.8], [0.01, 2.5],
+        [0.5, 5.0], [0.01, 0.2], [0.01, 0.9], [0.01, 2.0],
+        [0.0, 1.0], [1.0, 4.0]
+    ]
+)
+
+DEFAULT_RETENTION = 0.9
+MIN_STABILITY = 0.01
+MAX_STABILITY = 36500.0
+SECONDS_PER_DAY = 86400.0
+
+
+def grade_from_quality(quality: np.ndarray) -> np.ndarray:
+    # SM-2 quality 0-5 onto FSRS grades: 0-2 again, 3 hard, 4 good, 5 easy.
+    return np.clip(np.asarray(quality, dtype=np.int64) - 1, 1, 4)
+
+
+def _w(weights: np.ndarray, index: int) -> np.ndarray:
+    # Keeps a trailing axis so a (P, 17) candidate matrix broadcasts over (P, n).
+    return weights[..., index:index + 1] if weights.ndim > 1 else weights[index]
+
+
+def initial_stability(weights: np.ndarray, grade: np.ndarray) -> np.ndarray:
+    return np.take(weights[..., :4], grade - 1, axis=-1)
+
+
+def initial_difficulty(weights: np.ndarray, grade: np.ndarray) -> np.ndarray:
+    return np.clip(_w(weights, 4) - (grade - 3) * _w(weights, 5), 1.0, 10.0)
+
+
+def retrievability(elapsed_days: np.ndarray, stability: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + elapsed_days / (9.0 * stability))
+
+
+def next_difficulty(weights: np.ndarray, difficulty: np.ndarray, grade: np.ndarray) -> np.ndarray:
+    updated = difficulty - _w(weights, 6) * (grade - 3)
+    reverted = _w(weights, 7) * _w(weights, 4) + (1.0 - _w(weights, 7)) * updated
+    return np.clip(reverted, 1.0, 10.0)
+
+
+def next_stability(
+    weights: np.ndarray,
+    difficulty: np.ndarray,
+    stability: np.ndarray,
+    recall: np.ndarray,
+    grade: np.ndarray
+) -> np.ndarray:
+    hard_penalty = np.where(grade == 2, _w(weights, 15), 1.0)
+    easy_bonus = np.where(grade == 4, _w(weights, 16), 1.0)
+    recalled = stability * (
+        1.0
+        + np.exp(_w(weights, 8))
+        * (11.0 - difficulty)
+        * np.power(stability, -_w(weights, 9))
+        * (np.exp(_w(weights, 10) * (1.0 - recall)) - 1.0)
+        * hard_penalty
+        * easy_bonus
+    )
+    forgotten = (
+        _w(weights, 11)
+        * np.power(difficulty, -_w(weights, 12))
+        * (np.power(stability + 1.0, _w(weights, 13)) - 1.0)
+        * np.exp(_w(weights, 14) * (1.0 - recall))
+    )
+    return np.clip(np.where(grade == 1, forgotten, recalled), MIN_STABILITY, MAX_STABILITY)
+
+
+def next_interval(stability: np.ndarray, retention: float = DEFAULT_RETENTION) -> np.ndarray:
+    days = np.rint(9.0 * stability * (1.0 / retention - 1.0))
+    return np.maximum(1, days).astype(np.int64)
+
+
+@dataclass
+class ReviewHistory:
+    starts: np.ndarray
+    counts: np.ndarray
+    elapsed_days: np.ndarray
+    grades: np.ndarray
+
+    @property
+    def reviews(self) -> int:
+        return int(self.counts.sum())
+
+    def sample(self, max_reviews: int, seed: int = 0) -> ReviewHistory:
+        if self.reviews <= max_reviews:
+            return self
+        order = np.random.default_rng(seed).permutation(len(self.starts))
+        keep = np.sort(order[: int(np.searchsorted(np.cumsum(self.counts[order]), max_reviews)) + 1])
+        counts = self.counts[keep]
+        offsets = np.r_[0, np.cumsum(counts)[:-1]]
+        rows = np.repeat(self.starts[keep] - offsets, counts) + np.arange(counts.sum())
+        return ReviewHistory(
+            starts=offsets,
+            counts=counts,
+            elapsed_days=self.elapsed_days[rows],
+            grades=self.grades[rows]
+        )
+
+    @classmethod
+    def from_logs(
+        cls,
+        card_ids: np.ndarray,
+        timestamps: np.ndarray,
+        quality: np.ndarray
+    ) -> ReviewHistory:
+        card_ids = np.asarray(card_ids, dtype=np.int64)
+        seconds = np.asarray(timestamps, dtype="datetime64[us]").astype(np.int64) / 1e6
+        starts = np.flatnonzero(np.r_[True, card_ids[1:] != card_ids[:-1]])
+        counts = np.diff(np.r_[starts, len(card_ids)])
+        elapsed = np.r_[0.0, np.diff(seconds)] / SECONDS_PER_DAY
+        elapsed[starts] = 0.0
+        return cls(
+            starts=starts,
+            counts=counts,
+            elapsed_days=np.maximum(elapsed, 0.0),
+            grades=grade_from_quality(quality)
+        )
+
+
+def log_loss(weights: np.ndarray, history: ReviewHistory) -> np.ndarray:
+    weights = np.atleast_2d(weights)
+    first = history.starts
+    stability = initial_stability(weights, history.grades[first])
+    difficulty = initial_difficulty(weights, history.grades[first])
+    total = np.zeros(weights.shape[0])
+    samples = 0
+
+    for review in range(1, int(history.counts.max(initial=0))):
+        active = np.flatnonzero(history.counts > review)
+        rows = history.starts[active] + review
+        grade = history.grades[rows]
+        current_stability = stability[:, active]
+        current_difficulty = difficulty[:, active]
+        recall = np.clip(
+            retrievability(history.elapsed_days[rows], current_stability), 1e-6, 1.0 - 1e-6
+        )
+        total -= np.where(grade > 1, np.log(recall), np.log1p(-recall)).sum(axis=1)
+        samples += len(rows)
+        stability[:, active] = next_stability(
+            weights, current_difficulty, current_stability, recall, grade
+        )
+        difficulty[:, active] = next_difficulty(weights, current_difficulty, grade)
+
+    return total / max(samples, 1)
+
+
+def fit_weights(
+    history: ReviewHistory,
+    initial: Optional[np.ndarray] = None,
+    iterations: int = 40,
+    learning_rate: float = 0.03,
+    tolerance: float = 1e-5,
+    max_reviews: int = 100_000
+) -> np.ndarray:
+    low, high = WEIGHT_BOUNDS[:, 0], WEIGHT_BOUNDS[:, 1]
+    span = high - low
+    weights = np.clip(DEFAULT_WEIGHTS if initial is None else np.asarray(initial, dtype=float), low, high)
+    if history.reviews <= len(history.starts):
+        return weights
+    # Whole card histories are sampled, so the cost of a fit is bounded no
+    # matter how many reviews the user has logged.
+    history = history.sample(max_reviews)
+
+    # Adam in bound-normalized space. The gradient comes from forward
+    # differences, and all 1 + 17 candidates are scored in one vectorized
+    # pass over the history so Python overhead is paid once per step.
+    size = len(weights)
+    step = 1e-3
+    position = (weights - low) / span
+    moment = np.zeros(size)
+    velocity = np.zeros(size)
+    previous = np.inf
+    for iteration in range(1, iterations + 1):
+        candidates = np.repeat(position[None, :], size + 1, axis=0)
+        candidates[1:] += np.eye(size) * step
+        losses = log_loss(low + np.clip(candidates, 0.0, 1.0) * span, history)
+        gradient = (losses[1:] - losses[0]) / step
+
+        moment = 0.9 * moment + 0.1 * gradient
+        velocity = 0.999 * velocity + 0.001 * gradient ** 2
+        corrected = (moment / (1 - 0.9 ** iteration)) / (
+            np.sqrt(velocity / (1 - 0.999 ** iteration)) + 1e-8
+        )
+        position = np.clip(position - learning_rate * corrected, 0.0, 1.0)
+
+        if abs(previous - losses[0]) < tolerance:
+            break
+        previous = losses[0]
+
+    return low + position * span
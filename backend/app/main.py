@@ -1,18 +1,33 @@
+import threading
 from contextlib import asynccontextmanager
 
+from anyio import to_thread
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .api import api_router
 from .config import settings
-from .db import Base, engine
+from .db import Base, async_engine, engine
+from .dict_segment import warm_segment_index
+from .dict_snapshot import warm_snapshot
+from .dict_suggest import schedule_rebuild
 from .migrations import apply_sqlite_migrations
+from .services.import_worker import start_import_workers, stop_import_workers
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     Base.metadata.create_all(bind=engine)
     apply_sqlite_migrations(engine)
+    # Sync endpoints each hold a worker thread for the whole request.
+    to_thread.current_default_thread_limiter().total_tokens = settings.threadpool_size
+    threading.Thread(target=warm_snapshot, name="dict-snapshot", daemon=True).start()
+    schedule_rebuild()
+    threading.Thread(target=warm_segment_index, name="dict-segment", daemon=True).start()
+    # The first poll requeues jobs left behind by a previous run.
+    start_import_workers()
     yield
+    stop_import_workers()
+    await async_engine.dispose()
 
 
 app = FastAPI(title=settings.app_name, version="0.2.0", lifespan=lifespan)
@@ -1,5 +1,230 @@
+import re
+from typing import Callable, Optional
+
 from sqlalchemy import text
 
+from .dict_hash import content_hash
+from .dict_rank import rank_prior
+from .pinyin import syllable_key
+
+# Longest headword the n-gram triggers index in full.
+NGRAM_MAX_POSITION = 256
+# dict_word_ngram.field codes.
+NGRAM_FIELDS = (("simplified", 0), ("traditional", 1))
+# Tables a replace import rebuilds under STAGING_SUFFIX names and renames
+# into place; see swap_dict_staging.
+DICT_TABLES = ("dict_word", "dict_word_fts", "dict_word_ngram")
+STAGING_SUFFIX = "_staging"
+RETIRED_SUFFIX = "_retired"
+# Index names are global and SQLite cannot rename an index, so a staged
+# table takes the other name of each pair and the names alternate.
+SWAP_INDEX_SUFFIX = "_swap"
+# Pinyin with the spaces removed, the key the snapshot's pinyin column
+# holds; search filters on this exact expression so its index applies.
+PINYIN_COMPACT_SQL = "replace(pinyin_normalized, ' ', '')"
+
+
+def swap_index_name(name: str) -> str:
+    if name.endswith(SWAP_INDEX_SUFFIX):
+        return name[:-len(SWAP_INDEX_SUFFIX)]
+    return name + SWAP_INDEX_SUFFIX
+
+
+def _create_index(conn, name: str, definition: str) -> None:
+    # CREATE INDEX IF NOT EXISTS, also satisfied by the swapped name.
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name"),
+        {"name": swap_index_name(name)}
+    ).first()
+    if not exists:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}"))
+
+
+def _table_indexes(conn, table: str) -> list:
+    return conn.execute(
+        text(
+            "SELECT name, sql FROM sqlite_master "
+            "WHERE type = 'index' AND tbl_name = :table AND sql IS NOT NULL"
+        ),
+        {"table": table}
+    ).fetchall()
+
+
+def _ngram_inserts(row: str, source: str, target: str = "dict_word_ngram") -> list[str]:
+    # Character unigrams and bigrams of the headword columns. Substrings of
+    # one or two characters are a single probe; longer ones intersect bigrams.
+    statements = []
+    for column, field in NGRAM_FIELDS:
+        for size, bound in ((1, "<="), (2, "<")):
+            statements.append(
+                f"INSERT OR IGNORE INTO {target} (gram, field, word_id) "
+                f"SELECT substr({row}.{column}, p.n, {size}), {field}, {row}.id "
+                f"FROM {source} WHERE p.n {bound} length({row}.{column})"
+            )
+    return statements
+
+
+def _fill_ngram_table(conn, target: str, source: str) -> None:
+    # Writes the grams in key order into an empty table, rather than
+    # inserting into the B-tree at random positions.
+    statements = _ngram_inserts("d", f"{source} d, dict_ngram_pos p", target)
+    prefix = f"INSERT OR IGNORE INTO {target} (gram, field, word_id) "
+    selects = " UNION ALL ".join(statement[len(prefix):] for statement in statements)
+    conn.execute(text(f"{prefix}{selects} ORDER BY 1, 2, 3"))
+
+
+def rebuild_ngram_index(conn, after_id: Optional[int] = None) -> None:
+    """Rebuild the n-gram index, or with `after_id` only add rows above it."""
+    if after_id is not None:
+        for statement in _ngram_inserts("d", "dict_word d, dict_ngram_pos p"):
+            conn.execute(text(f"{statement} AND d.id > :after_id"), {"after_id": after_id})
+        return
+    # The word_id index is built after the table is filled.
+    indexes = _table_indexes(conn, "dict_word_ngram")
+    conn.execute(text("DELETE FROM dict_word_ngram"))
+    for name, _ in indexes:
+        conn.execute(text(f'DROP INDEX "{name}"'))
+    _fill_ngram_table(conn, "dict_word_ngram", "dict_word")
+    for _, sql in indexes:
+        conn.execute(text(sql))
+
+
+def rebuild_fts_index(conn, after_id: Optional[int] = None) -> None:
+    """Rebuild dict_word_fts, or with `after_id` only add rows above it."""
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'dict_word_fts'")
+    ).first()
+    if not exists:
+        return
+    if after_id is None:
+        conn.execute(text("INSERT INTO dict_word_fts(dict_word_fts) VALUES('rebuild')"))
+        return
+    conn.execute(
+        text(
+            "INSERT INTO dict_word_fts(rowid, simplified, traditional, pinyin, meanings) "
+            "SELECT id, simplified, traditional, pinyin, meanings FROM dict_word WHERE id > :after_id"
+        ),
+        {"after_id": after_id}
+    )
+
+
+def _staged_sql(sql: str, table: str) -> str:
+    # Only the first whole-word occurrence is the object being created; an
+    # index name such as idx_dict_word_hsk has no word boundary inside it.
+    return re.sub(rf"\b{table}\b", table + STAGING_SUFFIX, sql, count=1)
+
+
+def drop_dict_tables(conn, suffix: str) -> None:
+    """Drop leftover staging or retired copies of the dictionary tables."""
+    for table in DICT_TABLES:
+        conn.execute(text(f"DROP TABLE IF EXISTS {table}{suffix}"))
+
+
+def create_dict_staging(conn) -> None:
+    """Create empty, unindexed staging copies of the dictionary tables.
+
+    Copies left by an interrupted import are dropped first.
+    """
+    drop_dict_tables(conn, STAGING_SUFFIX)
+    drop_dict_tables(conn, RETIRED_SUFFIX)
+    for table in DICT_TABLES:
+        row = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :table"),
+            {"table": table}
+        ).first()
+        if row is not None:
+            conn.execute(text(_staged_sql(row[0], table)))
+
+
+def _stage_indexes(conn) -> None:
+    for name, sql in _table_indexes(conn, "dict_word"):
+        conn.execute(text(_staged_sql(sql, "dict_word").replace(name, swap_index_name(name), 1)))
+
+
+def _stage_fts(conn) -> None:
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": "dict_word_fts" + STAGING_SUFFIX}
+    ).first()
+    if not exists:
+        return
+    # The staged index keeps content='dict_word', which names the live
+    # table, so it is filled directly instead of with 'rebuild'.
+    conn.execute(
+        text(
+            f"INSERT INTO dict_word_fts{STAGING_SUFFIX}(rowid, simplified, traditional, pinyin, meanings) "
+            f"SELECT id, simplified, traditional, pinyin, meanings FROM dict_word{STAGING_SUFFIX}"
+        )
+    )
+
+
+def _stage_ngram(conn) -> None:
+    _fill_ngram_table(conn, "dict_word_ngram" + STAGING_SUFFIX, "dict_word" + STAGING_SUFFIX)
+
+
+def _stage_ngram_indexes(conn) -> None:
+    for name, sql in _table_indexes(conn, "dict_word_ngram"):
+        conn.execute(text(_staged_sql(sql, "dict_word_ngram").replace(name, swap_index_name(name), 1)))
+
+
+def _stage_analyze(conn) -> None:
+    conn.execute(text(f"ANALYZE dict_word{STAGING_SUFFIX}"))
+    conn.execute(text(f"ANALYZE dict_word_ngram{STAGING_SUFFIX}"))
+
+
+# Steps that index a filled dict_word staging table. Callers commit after
+# each one, so other writers wait for a single step, not the whole build.
+DICT_STAGING_STEPS: tuple[Callable, ...] = (
+    _stage_indexes,
+    _stage_fts,
+    _stage_ngram,
+    _stage_ngram_indexes,
+    _stage_analyze
+)
+
+
+def swap_dict_staging(conn) -> None:
+    """Rename the staging tables into place and the live ones aside.
+
+    Only catalog rows change, so the transaction is short, and readers see
+    either the old dictionary or the new one. The dict_word triggers are
+    recreated on the new table; statistics gathered on the staging tables
+    move with them, since RENAME leaves sqlite_stat1 alone.
+    """
+    triggers = conn.execute(
+        text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'dict_word'")
+    ).fetchall()
+    for name, _ in triggers:
+        conn.execute(text(f'DROP TRIGGER "{name}"'))
+    swapped = []
+    for table in DICT_TABLES:
+        staged = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": table + STAGING_SUFFIX}
+        ).first()
+        if staged is None:
+            continue
+        conn.execute(text(f"ALTER TABLE {table} RENAME TO {table}{RETIRED_SUFFIX}"))
+        conn.execute(text(f"ALTER TABLE {table}{STAGING_SUFFIX} RENAME TO {table}"))
+        swapped.append(table)
+    stats = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+    ).first()
+    if stats:
+        for table in swapped:
+            conn.execute(text("DELETE FROM sqlite_stat1 WHERE tbl = :table"), {"table": table})
+            # A WITHOUT ROWID table's own B-tree is listed under its name.
+            conn.execute(
+                text(
+                    "UPDATE sqlite_stat1 SET tbl = :table, "
+                    "idx = CASE WHEN idx = :staged THEN :table ELSE idx END "
+                    "WHERE tbl = :staged"
+                ),
+                {"table": table, "staged": table + STAGING_SUFFIX}
+            )
+    for _, sql in triggers:
+        conn.execute(text(sql))
+
 
 def apply_sqlite_migrations(engine) -> None:
     if engine.dialect.name != "sqlite":
@@ -16,20 +241,36 @@ def apply_sqlite_migrations(engine) -> None:
             ("last_modified", "last_modified DATETIME")
         ],
         "cards": [
-            ("last_modified", "last_modified DATETIME")
+            ("last_modified", "last_modified DATETIME"),
+            ("lapse_count", "lapse_count INTEGER DEFAULT 0"),
+            ("last_failed_at", "last_failed_at DATETIME"),
+            ("stability", "stability REAL"),
+            ("difficulty", "difficulty REAL")
         ],
         "study_logs": [
-            ("last_modified", "last_modified DATETIME")
+            ("last_modified", "last_modified DATETIME"),
+            ("client_key", "client_key TEXT")
         ],
         "dict_word": [
             ("last_modified", "last_modified DATETIME"),
             ("pinyin_normalized", "pinyin_normalized TEXT"),
+            ("pinyin_syllables", "pinyin_syllables TEXT"),
             ("hsk_level", "hsk_level INTEGER"),
             ("pos", "pos TEXT"),
-            ("frequency", "frequency REAL")
+            ("frequency", "frequency REAL"),
+            ("rank_prior", "rank_prior REAL"),
+            ("content_hash", "content_hash TEXT")
+        ],
+        "import_jobs": [
+            ("diff", "diff BOOLEAN DEFAULT 0"),
+            ("lease_owner", "lease_owner TEXT"),
+            ("lease_expires_at", "lease_expires_at DATETIME"),
+            ("attempts", "attempts INTEGER DEFAULT 0"),
+            ("cancel_requested", "cancel_requested BOOLEAN DEFAULT 0")
         ]
     }
 
+    added: set[tuple[str, str]] = set()
     with engine.begin() as conn:
         for table, columns in migrations.items():
             result = conn.execute(text(f"PRAGMA table_info({table})")).fetchall()
@@ -40,17 +281,64 @@ def apply_sqlite_migrations(engine) -> None:
                 if column_name in existing:
                     continue
                 conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {definition}"))
+                added.add((table, column_name))
 
         if "users" in migrations:
             conn.execute(text("UPDATE users SET auth_provider = 'password' WHERE auth_provider IS NULL"))
             conn.execute(text("UPDATE users SET is_active = 1 WHERE is_active IS NULL"))
 
-        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_dict_word_simplified ON dict_word (simplified)"))
-        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_dict_word_traditional ON dict_word (traditional)"))
-        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_dict_word_pinyin_norm ON dict_word (pinyin_normalized)"))
-        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_dict_word_hsk ON dict_word (hsk_level)"))
-        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_dict_word_pos ON dict_word (pos)"))
-        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_dict_word_freq ON dict_word (frequency)"))
+        if ("cards", "lapse_count") in added:
+            conn.execute(
+                text(
+                    """
+                    UPDATE cards
+                    SET lapse_count = (
+                      SELECT COUNT(*) FROM study_logs
+                      WHERE study_logs.card_id = cards.id AND study_logs.ease <= 2
+                    ),
+                    last_failed_at = (
+                      SELECT MAX(timestamp) FROM study_logs
+                      WHERE study_logs.card_id = cards.id AND study_logs.ease <= 2
+                    )
+                    """
+                )
+            )
+
+        conn.execute(
+            text("CREATE INDEX IF NOT EXISTS idx_cards_owner_last_failed ON cards (owner_id, last_failed_at)")
+        )
+        conn.execute(
+            text("CREATE INDEX IF NOT EXISTS idx_cards_owner_next_due ON cards (owner_id, next_due)")
+        )
+        conn.execute(
+            text("CREATE INDEX IF NOT EXISTS idx_cards_owner_dict_id ON cards (owner_id, created_from_dict_id)")
+        )
+        conn.execute(
+            text("CREATE INDEX IF NOT EXISTS idx_cards_owner_simplified ON cards (owner_id, simplified)")
+        )
+        conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS idx_study_logs_user_card_time "
+                "ON study_logs (user_id, card_id, timestamp)"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_study_logs_client_key "
+                "ON study_logs (user_id, client_key) WHERE client_key IS NOT NULL"
+            )
+        )
+
+        _create_index(conn, "idx_dict_word_simplified", "dict_word (simplified)")
+        _create_index(conn, "idx_dict_word_traditional", "dict_word (traditional)")
+        _create_index(conn, "idx_dict_word_pinyin_norm", "dict_word (pinyin_normalized)")
+        # Serves the compact pinyin key lookups when no snapshot is loaded.
+        _create_index(conn, "idx_dict_word_pinyin_compact", f"dict_word ({PINYIN_COMPACT_SQL})")
+        _create_index(conn, "idx_dict_word_pinyin_syllables", "dict_word (pinyin_syllables)")
+        _create_index(conn, "idx_dict_word_hsk", "dict_word (hsk_level)")
+        _create_index(conn, "idx_dict_word_pos", "dict_word (pos)")
+        _create_index(conn, "idx_dict_word_hsk_pos", "dict_word (hsk_level, pos)")
+        _create_index(conn, "idx_dict_word_freq", "dict_word (frequency)")
 
         conn.execute(
             text(
@@ -75,6 +363,38 @@ def apply_sqlite_migrations(engine) -> None:
                 """
             )
         )
+        # Syllable segmentation needs the Python syllable table, so the
+        # backfill runs row by row outside SQL.
+        pending = conn.execute(
+            text(
+                "SELECT id, pinyin_normalized FROM dict_word "
+                "WHERE pinyin_syllables IS NULL AND pinyin_normalized IS NOT NULL AND pinyin_normalized != ''"
+            )
+        ).fetchall()
+        if pending:
+            conn.execute(
+                text("UPDATE dict_word SET pinyin_syllables = :syllables WHERE id = :id"),
+                [{"id": row[0], "syllables": syllable_key(row[1])} for row in pending]
+            )
+        pending = conn.execute(
+            text("SELECT id, frequency, hsk_level FROM dict_word WHERE rank_prior IS NULL")
+        ).fetchall()
+        if pending:
+            conn.execute(
+                text("UPDATE dict_word SET rank_prior = :prior WHERE id = :id"),
+                [{"id": row[0], "prior": rank_prior(row[1], row[2])} for row in pending]
+            )
+        pending = conn.execute(
+            text(
+                "SELECT id, meanings, examples, tags, hsk_level, pos, frequency "
+                "FROM dict_word WHERE content_hash IS NULL"
+            )
+        ).fetchall()
+        if pending:
+            conn.execute(
+                text("UPDATE dict_word SET content_hash = :hash WHERE id = :id"),
+                [{"id": row[0], "hash": content_hash(*row[1:])} for row in pending]
+            )
 
         try:
             conn.execute(
@@ -128,6 +448,80 @@ def apply_sqlite_migrations(engine) -> None:
                 )
             )
             conn.execute(text("INSERT INTO dict_word_fts(dict_word_fts) VALUES('rebuild')"))
+            conn.execute(
+                text(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS dict_word_fts_vocab "
+                    "USING fts5vocab(dict_word_fts, 'row')"
+                )
+            )
         except Exception:
             # FTS5 may not be available in some SQLite builds.
             pass
+
+        conn.execute(
+            text(
+                """
+                CREATE TABLE IF NOT EXISTS dict_word_ngram (
+                  gram TEXT NOT NULL,
+                  field INTEGER NOT NULL,
+                  word_id INTEGER NOT NULL,
+                  PRIMARY KEY (gram, field, word_id)
+                ) WITHOUT ROWID
+                """
+            )
+        )
+        _create_index(conn, "idx_dict_word_ngram_word", "dict_word_ngram (word_id)")
+        conn.execute(text("CREATE TABLE IF NOT EXISTS dict_ngram_pos (n INTEGER PRIMARY KEY)"))
+        conn.execute(
+            text(
+                f"""
+                INSERT OR IGNORE INTO dict_ngram_pos (n)
+                WITH RECURSIVE seq(n) AS (
+                  SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < {NGRAM_MAX_POSITION}
+                )
+                SELECT n FROM seq
+                """
+            )
+        )
+        # Triggers cannot use CTEs, so they expand headwords by joining the
+        # fixed position table instead.
+        inserts = ";\n".join(_ngram_inserts("new", "dict_ngram_pos p"))
+        conn.execute(
+            text(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS dict_word_ngram_ai
+                AFTER INSERT ON dict_word BEGIN
+                  {inserts};
+                END;
+                """
+            )
+        )
+        conn.execute(
+            text(
+                """
+                CREATE TRIGGER IF NOT EXISTS dict_word_ngram_ad
+                AFTER DELETE ON dict_word BEGIN
+                  DELETE FROM dict_word_ngram WHERE word_id = old.id;
+                END;
+                """
+            )
+        )
+        conn.execute(
+            text(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS dict_word_ngram_au
+                AFTER UPDATE OF simplified, traditional ON dict_word BEGIN
+                  DELETE FROM dict_word_ngram WHERE word_id = old.id;
+                  {inserts};
+                END;
+                """
+            )
+        )
+        missing = conn.execute(
+            text(
+                "SELECT EXISTS(SELECT 1 FROM dict_word) "
+                "AND NOT EXISTS(SELECT 1 FROM dict_word_ngram)"
+            )
+        ).scalar()
+        if missing:
+            rebuild_ngram_index(conn)
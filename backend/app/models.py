@@ -3,6 +3,9 @@ from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, St
 from sqlalchemy.orm import relationship
 
 from .db import Base
+from .dict_hash import content_hash
+from .dict_rank import rank_prior
+from .pinyin import syllable_key
 
 card_collection = Table(
     "card_collection",
@@ -77,6 +80,10 @@ class Card(Base):
     interval_days = Column(Integer, default=0)
     repetitions = Column(Integer, default=0)
     next_due = Column(DateTime, default=datetime.utcnow)
+    lapse_count = Column(Integer, default=0)
+    last_failed_at = Column(DateTime, nullable=True)
+    stability = Column(Float, nullable=True)
+    difficulty = Column(Float, nullable=True)
 
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
@@ -97,6 +104,7 @@ class StudyLog(Base):
     ease = Column(Integer, nullable=False)
     correct = Column(Boolean, default=False)
     response_time_ms = Column(Integer, default=0)
+    client_key = Column(String, nullable=True)
     last_modified = Column(DateTime, default=datetime.utcnow)
 
     card = relationship("Card", back_populates="study_logs")
@@ -111,12 +119,35 @@ class DictWord(Base):
     traditional = Column(String, nullable=True)
     pinyin = Column(String, nullable=True)
     pinyin_normalized = Column(String, nullable=True)
+    pinyin_syllables = Column(
+        String,
+        nullable=True,
+        default=lambda ctx: syllable_key(ctx.get_current_parameters().get("pinyin_normalized"))
+    )
     meanings = Column(Text, nullable=True)
     examples = Column(Text, nullable=True)
     tags = Column(Text, nullable=True)
     hsk_level = Column(Integer, nullable=True)
     pos = Column(String, nullable=True)
     frequency = Column(Float, nullable=True)
+    rank_prior = Column(
+        Float,
+        nullable=True,
+        default=lambda ctx: rank_prior(
+            ctx.get_current_parameters().get("frequency"),
+            ctx.get_current_parameters().get("hsk_level")
+        )
+    )
+    content_hash = Column(
+        String,
+        nullable=True,
+        default=lambda ctx: content_hash(
+            *(
+                ctx.get_current_parameters().get(key)
+                for key in ("meanings", "examples", "tags", "hsk_level", "pos", "frequency")
+            )
+        )
+    )
     last_modified = Column(DateTime, default=datetime.utcnow)
 
 
@@ -140,11 +171,18 @@ class ImportJob(Base):
     pinyin_style = Column(String, default="numbers")
     dedupe = Column(Boolean, default=True)
     replace = Column(Boolean, default=False)
+    diff = Column(Boolean, default=False)
     status = Column(String, default="queued")
     progress = Column(Integer, default=0)
     stats_json = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     finished_at = Column(DateTime, nullable=True)
+    # Set by the worker that claimed the job and renewed while it runs; a
+    # lease past its expiry belongs to a dead worker and is recovered.
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0)
+    cancel_requested = Column(Boolean, default=False)
 
     logs = relationship("ImportJobLog", back_populates="job")
 
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+@dataclass
+class Cursor:
+    # Sort key of the last row on the previous page; the next page starts
+    # strictly after it, so every page is a single index range scan.
+    after: list
+    # The total is counted on the first page and carried along, valid for as
+    # long as the dictionary snapshot it was counted against.
+    total: int
+    snapshot: str
+    scope: str
+    # False when `total` is a capped estimate rather than a full count.
+    exact: bool = True
+
+
+def cursor_scope(*params: Any) -> str:
+    # Ties a cursor to the filters it was issued for.
+    raw = json.dumps(params, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def dict_marker(db: Session) -> str:
+    # Imports append rows with fresh ids, and a replace import finishes a job,
+    # so the highest id plus the last finished job identify the dictionary
+    # contents. Both are single index probes.
+    row = db.execute(
+        text(
+            """
+            SELECT
+                (SELECT MAX(id) FROM dict_word),
+                (SELECT MAX(finished_at) FROM import_jobs WHERE status = 'done')
+            """
+        )
+    ).fetchone()
+    return cursor_scope(*(row or ()))[:8]
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    raw = json.dumps(
+        {"a": cursor.after, "t": cursor.total, "s": cursor.snapshot, "q": cursor.scope, "e": int(cursor.exact)},
+        separators=(",", ":"),
+        ensure_ascii=False
+    )
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, scope: str) -> Cursor:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw)
+        cursor = Cursor(
+            after=list(data["a"]),
+            total=int(data["t"]),
+            snapshot=str(data["s"]),
+            scope=str(data["q"]),
+            exact=bool(data.get("e", 1))
+        )
+    except (ValueError, KeyError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
+    if cursor.scope != scope:
+        raise HTTPException(status_code=400, detail="Cursor does not match query")
+    return cursor
+
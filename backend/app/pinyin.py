@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import re
+from typing import List, Optional
+
+# Toneless Hanyu Pinyin syllables, with v for ü as in pinyin_normalized.
+SYLLABLES = frozenset(
+    """
+    a ai an ang ao
+    ba bai ban bang bao bei ben beng bi bian biao bie bin bing bo bu
+    ca cai can cang cao ce cen ceng cha chai chan chang chao che chen cheng chi
+    chong chou chu chua chuai chuan chuang chui chun chuo ci cong cou cu cuan cui
+    cun cuo
+    da dai dan dang dao de dei den deng di dia dian diao die ding diu dong dou du
+    duan dui dun duo
+    e ei en eng er
+    fa fan fang fei fen feng fo fou fu
+    ga gai gan gang gao ge gei gen geng gong gou gu gua guai guan guang gui gun guo
+    ha hai han hang hao he hei hen heng hm hng hong hou hu hua huai huan huang hui
+    hun huo
+    ji jia jian jiang jiao jie jin jing jiong jiu ju juan jue jun
+    ka kai kan kang kao ke kei ken keng kong kou ku kua kuai kuan kuang kui kun kuo
+    la lai lan lang lao le lei leng li lia lian liang liao lie lin ling liu lo long
+    lou lu luan lun luo lv lve
+    m ma mai man mang mao me mei men meng mi mian miao mie min ming miu mo mou mu
+    n na nai nan nang nao ne nei nen neng ng ni nian niang niao nie nin ning niu
+    nong nou nu nuan nun nuo nv nve
+    o ou
+    pa pai pan pang pao pei pen peng pi pian piao pie pin ping po pou pu
+    qi qia qian qiang qiao qie qin qing qiong qiu qu quan que qun
+    r ran rang rao re ren reng ri rong rou ru rua ruan rui run ruo
+    sa sai san sang sao se sen seng sha shai shan shang shao she shei shen sheng
+    shi shou shu shua shuai shuan shuang shui shun shuo si song sou su suan sui sun
+    suo
+    ta tai tan tang tao te tei teng ti tian tiao tie ting tong tou tu tuan tui tun
+    tuo
+    wa wai wan wang wei wen weng wo wu
+    xi xia xian xiang xiao xie xin xing xiong xiu xu xuan xue xun
+    ya yan yang yao ye yi yin ying yo yong you yu yuan yue yun
+    za zai zan zang zao ze zei zen zeng zha zhai zhan zhang zhao zhe zhei zhen
+    zheng zhi zhong zhou zhu zhua zhuai zhuan zhuang zhui zhun zhuo zi zong zou zu
+    zuan zui zun zuo
+    """.split()
+)
+SYLLABLE_PREFIXES = frozenset(
+    syllable[:size] for syllable in SYLLABLES for size in range(1, len(syllable) + 1)
+)
+MAX_SYLLABLE_LENGTH = max(len(syllable) for syllable in SYLLABLES)
+# Vowelless interjections only ever stand alone; inside a run they would
+# split "xian" into "xia n". Erhua "r" may still close a run.
+STANDALONE_SYLLABLES = frozenset({"m", "n", "ng", "hm", "hng", "r"})
+MAX_SEGMENTATIONS = 4
+
+_BOUNDARY = re.compile(r"[\s'’\-]+")
+
+
+def segment_pinyin(
+    chunk: str,
+    limit: int = MAX_SEGMENTATIONS,
+    partial_tail: bool = False
+) -> List[List[str]]:
+    """Split unspaced toneless pinyin into syllables.
+
+    Returns up to `limit` segmentations, fewest syllables first. With
+    `partial_tail`, the last piece may be an unfinished syllable, as typed.
+    """
+    size = len(chunk)
+    # best[i] holds the shortest segmentations of chunk[i:].
+    best: List[List[List[str]]] = [[] for _ in range(size + 1)]
+    best[size] = [[]]
+    for start in range(size - 1, -1, -1):
+        candidates: List[List[str]] = []
+        for end in range(start + 1, min(size, start + MAX_SYLLABLE_LENGTH) + 1):
+            piece = chunk[start:end]
+            whole = piece not in STANDALONE_SYLLABLES or (
+                end == size and (start == 0 or piece == "r")
+            )
+            if whole and piece in SYLLABLES:
+                candidates.extend([piece] + rest for rest in best[end])
+            elif partial_tail and end == size and piece in SYLLABLE_PREFIXES:
+                candidates.append([piece])
+        candidates.sort(key=len)
+        best[start] = candidates[:limit]
+    return best[0]
+
+
+def syllable_key(normalized: Optional[str]) -> Optional[str]:
+    """Space-delimited syllables of a pinyin_normalized value.
+
+    Tokens that are already syllables pass through; run-together tokens are
+    split with their best segmentation, and anything else is kept verbatim.
+    """
+    if not normalized:
+        return None
+    syllables: List[str] = []
+    for token in _BOUNDARY.split(normalized.lower()):
+        if not token:
+            continue
+        if token in SYLLABLES:
+            syllables.append(token)
+            continue
+        segmentations = segment_pinyin(token, limit=1)
+        syllables.extend(segmentations[0] if segmentations else [token])
+    return " ".join(syllables) or None
+
+
+def query_prefixes(normalized: str, limit: int = MAX_SEGMENTATIONS) -> List[str]:
+    """Syllable-key prefixes for a pinyin query, one per plausible reading.
+
+    Explicit spaces and apostrophes are kept as boundaries; each chunk fans
+    out into its segmentations and the combinations are capped at `limit`.
+    Returns an empty list when the query is not pinyin.
+    """
+    chunks = [chunk for chunk in _BOUNDARY.split(normalized.lower()) if chunk]
+    if not chunks or not all(chunk.isascii() and chunk.isalpha() for chunk in chunks):
+        return []
+    readings: List[List[str]] = [[]]
+    for index, chunk in enumerate(chunks):
+        options = segment_pinyin(chunk, limit=limit, partial_tail=index == len(chunks) - 1)
+        if not options:
+            return []
+        readings = [reading + option for reading in readings for option in options]
+        readings.sort(key=len)
+        readings = readings[:limit]
+    return [" ".join(reading) for reading in readings]
@@ -1,9 +1,10 @@
 from datetime import datetime
 from typing import List, Optional
 
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 
-from .models import Card, StudyLog, card_collection
+from .models import Card, card_collection
 
 
 def recommend(
@@ -29,40 +30,23 @@ def recommend(
     if len(due_cards) >= n:
         return due_cards
 
-    remaining = n - len(due_cards)
-    due_ids = {card.id for card in due_cards}
-
-    failed_query = (
-        db.query(StudyLog.card_id)
-        .join(Card, Card.id == StudyLog.card_id)
-        .filter(StudyLog.user_id == user_id)
+    # Cards ranked by their most recent lapse. Due cards are excluded by
+    # next_due so the query stays on idx_cards_owner_last_failed; a card
+    # with no due date at all is not in the due list and stays eligible.
+    fallback_query = (
+        db.query(Card)
         .filter(Card.owner_id == user_id)
-        .filter(StudyLog.ease <= 2)
+        .filter(Card.last_failed_at.isnot(None))
+        .filter(or_(Card.next_due.is_(None), Card.next_due > now))
     )
-    if collection_id is not None:
-        failed_query = failed_query.join(card_collection).filter(
-            card_collection.c.collection_id == collection_id
-        )
-    failed_card_ids = (
-        failed_query
-        .order_by(StudyLog.timestamp.desc())
-        .limit(50)
-        .all()
-    )
-
-    failed_ids = [row[0] for row in failed_card_ids if row[0] not in due_ids]
-    if not failed_ids:
-        return due_cards
-
-    fallback_query = db.query(Card).filter(Card.owner_id == user_id)
     if collection_id is not None:
         fallback_query = fallback_query.join(card_collection).filter(
             card_collection.c.collection_id == collection_id
         )
     fallback_cards = (
         fallback_query
-        .filter(Card.id.in_(failed_ids))
-        .limit(remaining)
+        .order_by(Card.last_failed_at.desc())
+        .limit(n - len(due_cards))
         .all()
     )
 
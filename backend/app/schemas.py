@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import List, Optional
 
 from pydantic import BaseModel, ConfigDict, Field
@@ -102,6 +102,22 @@ class CardOut(BaseModel):
     last_modified: datetime
 
 
+class CardMineRequest(BaseModel):
+    text: str = Field(max_length=1_000_000)
+    collection_id: int
+
+
+class CardMineResponse(BaseModel):
+    collection_id: int
+    chars: int
+    # Distinct dictionary words found in the text.
+    words: int
+    created: int
+    existing: int
+    # Words that share a headword with a card created by this same request.
+    duplicates: int = 0
+
+
 class CardUpdate(BaseModel):
     simplified: str | None = None
     pinyin: str | None = None
@@ -129,6 +145,59 @@ class StudyResponseOut(BaseModel):
     logged_at: datetime
 
 
+class StudySessionCreate(BaseModel):
+    n: int = Field(default=20, ge=1, le=500)
+    collection_id: Optional[int] = None
+
+
+class StudySessionOut(BaseModel):
+    session_id: str
+    remaining: int
+    reviewed: int
+    expires_at: datetime
+
+
+class StudySessionNextOut(BaseModel):
+    session_id: str
+    remaining: int
+    reviewed: int
+    cards: List[CardOut]
+
+
+class StudyForecastOut(BaseModel):
+    start: date
+    days: int
+    overdue: int
+    counts: List[int]
+
+
+class StudyBatchItem(BaseModel):
+    card_id: int
+    q: int = Field(ge=0, le=5)
+    response_time_ms: int = 0
+    idempotency_key: str = Field(min_length=1, max_length=128)
+
+
+class StudyBatchIn(BaseModel):
+    responses: List[StudyBatchItem] = Field(default_factory=list, max_length=5000)
+
+
+class StudyCardState(BaseModel):
+    id: int
+    easiness: float
+    interval_days: int
+    repetitions: int
+    next_due: datetime
+    last_modified: datetime
+
+
+class StudyBatchOut(BaseModel):
+    applied: int
+    skipped: int
+    logged_at: datetime
+    cards: List[StudyCardState]
+
+
 class DumpResponse(BaseModel):
     user: dict
     collections: list
@@ -185,6 +254,14 @@ class SyncResponse(BaseModel):
     id_map: dict = Field(default_factory=dict)
 
 
+class ReplayResponse(BaseModel):
+    users: int
+    cards: int
+    logs: int
+    seconds: float
+    cards_per_second: float
+
+
 class ImportUploadResponse(BaseModel):
     file_id: str
     filename: str
@@ -199,6 +276,9 @@ class ImportTriggerRequest(BaseModel):
     pinyin_style: str = Field(default="numbers", pattern="^(numbers|diacritics|none)$")
     dedupe: bool = True
     replace: bool = False
+    # Sync dict_word to the file by key instead of appending or replacing;
+    # existing ids are kept. Takes precedence over dedupe and replace.
+    diff: bool = False
 
 
 class ImportJobResponse(BaseModel):
@@ -257,6 +337,7 @@ class DatasetPackResponse(BaseModel):
     offset: int
     limit: int
     items: List[DictWordOut]
+    next_cursor: Optional[str] = None
 
 
 class DictFacetCounts(BaseModel):
@@ -264,7 +345,85 @@ class DictFacetCounts(BaseModel):
     pos: dict
 
 
+class DictCacheStats(BaseModel):
+    generation: int
+    size: int
+    max_entries: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+
+
+class DictSuggestion(BaseModel):
+    id: int
+    simplified: str
+    traditional: str | None = None
+    pinyin: str | None = None
+    gloss: str | None = None
+    hsk_level: int | None = None
+    frequency: float | None = None
+    match: str
+
+
+class DictSuggestResponse(BaseModel):
+    query: str
+    results: List[DictSuggestion]
+
+
+class DictWordKey(BaseModel):
+    simplified: str = Field(min_length=1)
+    # Tone marks or numbers; any reading matches when left out.
+    pinyin: str | None = None
+
+
+class DictWordsRequest(BaseModel):
+    ids: List[int] = Field(default_factory=list, max_length=2000)
+    keys: List[DictWordKey] = Field(default_factory=list, max_length=2000)
+
+
+class DictWordsResponse(BaseModel):
+    # Each entry once, in the order first requested.
+    results: List[DictWordOut]
+    missing_ids: List[int] = Field(default_factory=list)
+    missing_keys: List[DictWordKey] = Field(default_factory=list)
+
+
+class DictSegmentRequest(BaseModel):
+    text: str = Field(max_length=1_000_000)
+    # Newline-delimited JSON, one token per line, as segments are found.
+    stream: bool = False
+
+
+class DictSegment(BaseModel):
+    start: int
+    text: str
+    # Unset for runs with no dictionary entry: punctuation, Latin text and
+    # unknown characters.
+    id: int | None = None
+    traditional: str | None = None
+    pinyin: str | None = None
+    gloss: str | None = None
+    hsk_level: int | None = None
+
+
+class DictSegmentResponse(BaseModel):
+    tokens: List[DictSegment]
+    chars: int
+    matched_chars: int
+
+
 class DictSearchResponse(BaseModel):
+    # Same as total_estimate; kept for older clients.
     total: int
     results: List[DictWordOut]
-    facets: DictFacetCounts
+    facets: Optional[DictFacetCounts] = None
+    next_cursor: Optional[str] = None
+    total_estimate: int = 0
+    total_is_exact: bool = True
+    # Set when the facets were counted over only the first matches, because
+    # the total passed the count cap.
+    facets_approximate: bool = False
+    # Set when the query ran out of time and only part of the page is back.
+    partial: bool = False
@@ -1,16 +1,30 @@
 from __future__ import annotations
 
 import json
-from datetime import datetime
+import logging
+import pickle
+import tempfile
+import threading
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 from uuid import uuid4
 
-from sqlalchemy.orm import Session
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import Session, aliased
 
+from ..config import settings
 from ..db import SessionLocal
+from ..dict_snapshot import refresh_snapshot
 from ..models import ImportFile, ImportJob, ImportJobLog
-from .importer import CsvMapping, run_import
+from .importer import CsvMapping, DictEntry, ImportStats, chunk_entries, read_entries, write_entries
+
+# A job whose worker died this many times is failed instead of requeued.
+MAX_IMPORT_ATTEMPTS = 3
+# Statuses of a job held by a worker lease: parsing, then writing dict_word.
+ACTIVE_STATUSES = ("running", "writing")
+
+logger = logging.getLogger(__name__)
 
 
 def create_import_file(db: Session, path: Path, filename: str, size: int) -> ImportFile:
@@ -33,7 +47,8 @@ def create_import_job(
     mapping: Optional[CsvMapping],
     pinyin_style: str,
     dedupe: bool,
-    replace: bool
+    replace: bool,
+    diff: bool = False
 ) -> ImportJob:
     job_id = uuid4().hex
     mapping_json = json.dumps(mapping.__dict__, ensure_ascii=False) if mapping else None
@@ -45,6 +60,7 @@ def create_import_job(
         pinyin_style=pinyin_style,
         dedupe=dedupe,
         replace=replace,
+        diff=diff,
         status="queued",
         progress=0
     )
@@ -81,60 +97,319 @@ def update_job(
     return job
 
 
-def run_job(job_id: str) -> None:
+def claim_next_job(db: Session, owner: str, lease_seconds: float, limit: int) -> Optional[str]:
+    """Lease the oldest queued job to `owner` and return its id.
+
+    The claim is a compare-and-set on the status, so workers in other
+    processes, or on other hosts sharing the database, never run the same
+    job twice. It also fails while `limit` jobs already hold live leases,
+    which caps concurrent imports across all of those processes.
+    """
+    now = datetime.utcnow()
+    leased = aliased(ImportJob)
+    active = (
+        select(func.count())
+        .select_from(leased)
+        .where(leased.status.in_(ACTIVE_STATUSES), leased.lease_expires_at > now)
+        .scalar_subquery()
+    )
+    candidates = db.execute(
+        select(ImportJob.id)
+        .where(ImportJob.status == "queued")
+        .order_by(ImportJob.created_at, ImportJob.id)
+        .limit(8)
+    ).scalars().all()
+    for job_id in candidates:
+        claimed = db.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job_id, ImportJob.status == "queued", active < limit)
+            .values(
+                status="running",
+                lease_owner=owner,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                attempts=func.coalesce(ImportJob.attempts, 0) + 1
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if claimed:
+            return job_id
+    return None
+
+
+def renew_lease(db: Session, job_id: str, owner: str, lease_seconds: float) -> bool:
+    """Extend the lease; False when it was recovered after expiring."""
+    renewed = db.execute(
+        update(ImportJob)
+        .where(
+            ImportJob.id == job_id,
+            ImportJob.lease_owner == owner,
+            ImportJob.status.in_(ACTIVE_STATUSES)
+        )
+        .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return bool(renewed)
+
+
+def should_stop(db: Session, job_id: str, owner: str) -> bool:
+    """Whether the job was asked to cancel or its lease is no longer ours."""
+    row = db.execute(
+        select(ImportJob.lease_owner, ImportJob.cancel_requested).where(ImportJob.id == job_id)
+    ).first()
+    return row is None or row.lease_owner != owner or bool(row.cancel_requested)
+
+
+def acquire_writer(db: Session, job_id: str, owner: str) -> bool:
+    """Move a running job to 'writing' unless another job holds that slot.
+
+    Imports parse in parallel but write dict_word one at a time: replace
+    imports share the staging tables, and SQLite has a single writer
+    anyway. A writer whose lease expired no longer holds the slot.
+    """
+    writer = aliased(ImportJob)
+    busy = (
+        select(writer.id)
+        .where(writer.status == "writing", writer.id != job_id, writer.lease_expires_at > datetime.utcnow())
+        .exists()
+    )
+    acquired = db.execute(
+        update(ImportJob)
+        .where(
+            ImportJob.id == job_id,
+            ImportJob.lease_owner == owner,
+            ImportJob.status == "running",
+            ~busy
+        )
+        .values(status="writing")
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return bool(acquired)
+
+
+def release_lease(db: Session, job_id: str, owner: str) -> None:
+    db.execute(
+        update(ImportJob)
+        .where(ImportJob.id == job_id, ImportJob.lease_owner == owner)
+        .values(lease_owner=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def recover_stale_jobs(db: Session) -> int:
+    """Requeue active jobs whose supervisor stopped renewing the lease.
+
+    Jobs asked to cancel are cancelled instead, and a job that already
+    used MAX_IMPORT_ATTEMPTS fails rather than take down workers forever.
+    Returns the number of jobs recovered.
+    """
+    now = datetime.utcnow()
+    expired = or_(ImportJob.lease_expires_at.is_(None), ImportJob.lease_expires_at < now)
+    stale = db.execute(
+        select(ImportJob.id, ImportJob.status, ImportJob.attempts, ImportJob.cancel_requested)
+        .where(ImportJob.status.in_(ACTIVE_STATUSES), expired)
+    ).all()
+    recovered = 0
+    for row in stale:
+        if row.cancel_requested:
+            values = {"status": "cancelled", "finished_at": now}
+            message, level = "Import cancelled", "info"
+        elif (row.attempts or 0) >= MAX_IMPORT_ATTEMPTS:
+            values = {"status": "error", "finished_at": now}
+            message, level = "Import failed: worker lost too many times", "error"
+        else:
+            values = {"status": "queued", "progress": 0}
+            message, level = "Worker lease expired; job requeued", "warning"
+        claimed = db.execute(
+            update(ImportJob)
+            .where(ImportJob.id == row.id, ImportJob.status == row.status, expired)
+            .values(lease_owner=None, lease_expires_at=None, **values)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if claimed:
+            add_log(db, row.id, message, level=level)
+            recovered += 1
+    return recovered
+
+
+def cancel_import_job(db: Session, job: ImportJob) -> ImportJob:
+    """Cancel a queued job now, or ask the worker running it to stop."""
+    if job.status == "queued":
+        cancelled = db.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job.id, ImportJob.status == "queued")
+            .values(status="cancelled", cancel_requested=True, finished_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if cancelled:
+            add_log(db, job.id, "Import cancelled")
+            db.refresh(job)
+            return job
+        db.refresh(job)
+    if job.status in ACTIVE_STATUSES and not job.cancel_requested:
+        job.cancel_requested = True
+        db.commit()
+        add_log(db, job.id, "Cancellation requested")
+        db.refresh(job)
+    return job
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+class _Watch:
+    """Polls from a background thread whether a running job should stop.
+
+    The lease itself is renewed by the supervisor that claimed the job, so
+    it outlives a slow worker start but not the supervisor's process.
+    """
+
+    def __init__(self, job_id: str, owner: str) -> None:
+        self.job_id = job_id
+        self.owner = owner
+        self.cancelled = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._poll, name=f"import-watch-{job_id}", daemon=True)
+
+    def __enter__(self) -> _Watch:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _poll(self) -> None:
+        while not self._stopped.wait(settings.import_poll_seconds):
+            db = SessionLocal()
+            try:
+                if should_stop(db, self.job_id, self.owner):
+                    self.cancelled.set()
+                    return
+            except Exception as exc:  # pragma: no cover - retried next poll
+                logger.warning("Cancel check for import %s failed: %s", self.job_id, exc)
+            finally:
+                db.close()
+
+    def check(self) -> None:
+        if self.cancelled.is_set():
+            raise ImportCancelled()
+
+
+def _spool_entries(entries: Iterable[DictEntry], watch: _Watch, spool) -> None:
+    for chunk in chunk_entries(entries):
+        watch.check()
+        pickle.dump(chunk, spool, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _unspool_entries(spool, watch: _Watch) -> Iterator[DictEntry]:
+    spool.seek(0)
+    while True:
+        watch.check()
+        try:
+            chunk = pickle.load(spool)
+        except EOFError:
+            return
+        yield from chunk
+
+
+def _wait_for_writer(db: Session, watch: _Watch) -> None:
+    while not acquire_writer(db, watch.job_id, watch.owner):
+        watch.check()
+        if watch.cancelled.wait(settings.import_poll_seconds):
+            watch.check()
+
+
+def run_job(job_id: str, owner: str) -> None:
+    """Run a job claimed by `owner`; called in an import worker process.
+
+    The file is parsed and normalized into a temporary spool while other
+    jobs may be writing, then the writer slot is taken for the database
+    phase. A requested cancellation, or a lease lost to recovery,
+    stops the job at the next chunk.
+    """
     db: Session = SessionLocal()
     try:
-        job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+        job = db.query(ImportJob).filter(ImportJob.id == job_id, ImportJob.lease_owner == owner).first()
         if not job:
             return
+        with _Watch(job_id, owner) as watch, tempfile.TemporaryFile() as spool:
+            try:
+                _run_leased_job(db, job, watch, spool)
+            except ImportCancelled:
+                db.rollback()
+                job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+                if job and job.lease_owner == owner:
+                    add_log(db, job.id, "Import cancelled")
+                    update_job(db, job, status="cancelled", finished_at=datetime.utcnow())
+    except Exception as exc:
+        db.rollback()
+        job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+        if job and job.lease_owner == owner:
+            add_log(db, job.id, f"Import failed: {exc}", level="error")
+            update_job(db, job, status="error", finished_at=datetime.utcnow())
+    finally:
+        release_lease(db, job_id, owner)
+        db.close()
 
-        update_job(db, job, progress=5, status="running")
-        add_log(db, job.id, "Reading input file")
 
-        file_record = db.query(ImportFile).filter(ImportFile.id == job.file_id).first()
-        if not file_record:
-            add_log(db, job.id, "Missing uploaded file", level="error")
-            update_job(db, job, status="error", finished_at=datetime.utcnow())
-            return
+def _run_leased_job(db: Session, job: ImportJob, watch: _Watch, spool) -> None:
+    update_job(db, job, progress=5)
+    add_log(db, job.id, "Reading input file")
 
-        mapping = None
-        if job.mapping_json:
-            mapping = CsvMapping(**json.loads(job.mapping_json))
+    file_record = db.query(ImportFile).filter(ImportFile.id == job.file_id).first()
+    if not file_record:
+        add_log(db, job.id, "Missing uploaded file", level="error")
+        update_job(db, job, status="error", finished_at=datetime.utcnow())
+        return
 
-        add_log(db, job.id, "Parsing entries")
-        stats = run_import(
-            db,
-            file_path=Path(file_record.path),
-            file_type=job.file_type,
-            mapping=mapping,
-            pinyin_style=job.pinyin_style,
-            dedupe=job.dedupe,
-            replace=job.replace
-        )
+    mapping = None
+    if job.mapping_json:
+        mapping = CsvMapping(**json.loads(job.mapping_json))
 
-        update_job(
+    add_log(db, job.id, "Parsing entries")
+    stats = ImportStats(parsed=0, normalized=0, deduped=0, inserted=0)
+    entries = read_entries(Path(file_record.path), job.file_type, mapping, job.pinyin_style, stats)
+    _spool_entries(entries, watch, spool)
+    update_job(db, job, progress=40)
+
+    add_log(db, job.id, f"Parsed {stats.parsed} entries; waiting for the writer")
+    _wait_for_writer(db, watch)
+    db.refresh(job)
+    add_log(db, job.id, "Writing entries")
+    write_entries(db, _unspool_entries(spool, watch), job.dedupe, job.replace, bool(job.diff), stats)
+
+    summary = {
+        "parsed": stats.parsed,
+        "normalized": stats.normalized,
+        "deduped": stats.deduped,
+        "inserted": stats.inserted
+    }
+    if job.diff:
+        summary.update(updated=stats.updated, deleted=stats.deleted, unchanged=stats.unchanged)
+    update_job(db, job, progress=90, stats=summary)
+    if job.diff:
+        add_log(
             db,
-            job,
-            progress=90,
-            status="running",
-            stats={
-                "parsed": stats.parsed,
-                "normalized": stats.normalized,
-                "deduped": stats.deduped,
-                "inserted": stats.inserted
-            }
+            job.id,
+            f"Inserted {stats.inserted}, updated {stats.updated}, deleted {stats.deleted} rows "
+            f"({stats.unchanged} unchanged)"
         )
+    else:
         add_log(db, job.id, f"Inserted {stats.inserted} rows")
-        update_job(db, job, progress=100, status="done", finished_at=datetime.utcnow())
-        add_log(db, job.id, "Import complete")
-    except Exception as exc:
-        if db:
-            add_log(db, job_id, f"Import failed: {exc}", level="error")
-            job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
-            if job:
-                update_job(db, job, status="error", finished_at=datetime.utcnow())
-    finally:
-        db.close()
+    update_job(db, job, progress=100, status="done", finished_at=datetime.utcnow())
+    add_log(db, job.id, "Import complete")
+    try:
+        if refresh_snapshot(db):
+            add_log(db, job.id, "Dictionary snapshot rebuilt")
+    except OSError as exc:
+        add_log(db, job.id, f"Dictionary snapshot not rebuilt: {exc}", level="warning")
 
 
 def get_import_job(db: Session, job_id: str) -> Optional[ImportJob]:
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from uuid import uuid4
+
+from ..config import settings
+from ..db import SessionLocal
+from ..dict_cache import bump_dict_generation
+from .import_jobs import claim_next_job, recover_stale_jobs, renew_lease, run_job
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_supervisor: Optional[ImportSupervisor] = None
+
+
+class ImportSupervisor:
+    """Claims queued import jobs and runs them in a process pool.
+
+    Jobs live in import_jobs, not in memory: each claim leases the job to
+    a token of this supervisor, which renews it every poll until the
+    worker returns. Any process sharing the database may claim a job, and
+    one whose supervisor died is requeued once its lease expires. Claims
+    count the live leases, so at most `workers` jobs run at a time across
+    every process and host sharing the database, not per supervisor.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = max(1, workers)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._running: dict[Future, tuple[str, str]] = {}
+        self._executor = self._new_executor()
+        self._thread = threading.Thread(target=self._loop, name="import-supervisor", daemon=True)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # Spawned workers start with a fresh interpreter instead of forking
+        # the server's threads and open SQLite connections.
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join()
+        # Running jobs keep their leases and are recovered by the next start.
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _loop(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._poll()
+            except Exception as exc:  # pragma: no cover - retried next poll
+                logger.warning("Import supervisor poll failed: %s", exc)
+            self._wake.wait(settings.import_poll_seconds)
+            self._wake.clear()
+
+    def _poll(self) -> None:
+        db = SessionLocal()
+        try:
+            for job_id, token in dict(self._running).values():
+                renew_lease(db, job_id, token, settings.import_lease_seconds)
+            recover_stale_jobs(db)
+            while len(self._running) < self.workers and not self._stopped.is_set():
+                # A fresh token per claim: should the job be requeued and
+                # claimed again, a late worker for the old claim finds its
+                # lease gone and does nothing.
+                token = f"{self.owner}:{uuid4().hex[:8]}"
+                job_id = claim_next_job(db, token, settings.import_lease_seconds, self.workers)
+                if job_id is None:
+                    return
+                self._submit(job_id, token)
+        finally:
+            db.close()
+
+    def _submit(self, job_id: str, token: str) -> None:
+        try:
+            future = self._executor.submit(run_job, job_id, token)
+        except BrokenProcessPool:
+            # A worker died hard and failed every job in the pool; they stop
+            # being renewed and are recovered when their leases expire.
+            logger.warning("Import worker pool broke; restarting it")
+            self._executor = self._new_executor()
+            future = self._executor.submit(run_job, job_id, token)
+        self._running[future] = (job_id, token)
+        future.add_done_callback(self._finished)
+
+    def _finished(self, future: Future) -> None:
+        self._running.pop(future, None)
+        # Any finished job may have touched dict_word, even a failed one.
+        # The bump reaches this process's caches at once; other processes
+        # see the import through dict_marker(), which the caches check too.
+        bump_dict_generation()
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning("Import worker failed: %s", future.exception())
+        self._wake.set()
+
+
+def start_import_workers() -> None:
+    global _supervisor
+    with _lock:
+        if _supervisor is None:
+            _supervisor = ImportSupervisor(settings.import_workers)
+            _supervisor.start()
+
+
+def stop_import_workers() -> None:
+    global _supervisor
+    with _lock:
+        supervisor, _supervisor = _supervisor, None
+    if supervisor is not None:
+        supervisor.stop()
+
+
+def wake_import_workers() -> None:
+    """Claim newly queued jobs now instead of at the next poll."""
+    supervisor = _supervisor
+    if supervisor is not None:
+        supervisor.wake()
@@ -4,14 +4,33 @@ import csv
 import gzip
 import json
 import re
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from dataclasses import dataclass
+from functools import lru_cache
+from itertools import groupby
 from pathlib import Path
-from typing import Iterable, Iterator, List, Optional
+from typing import Iterable, Iterator, Optional
 
+from sqlalchemy import func, select, text
 from sqlalchemy.orm import Session
 
+from ..db import begin_immediate
+from ..dict_hash import content_hash
+from ..dict_rank import rank_prior
+from ..migrations import (
+    DICT_STAGING_STEPS,
+    RETIRED_SUFFIX,
+    STAGING_SUFFIX,
+    create_dict_staging,
+    drop_dict_tables,
+    rebuild_fts_index,
+    rebuild_ngram_index,
+    swap_dict_staging
+)
 from ..models import DictWord
+from ..pinyin import syllable_key
 
 CEDICT_PATTERN = re.compile(
     r"^(?P<trad>\S+)\s+(?P<simp>\S+)\s+\[(?P<pinyin>[^\]]+)\]\s+/(?P<defs>.+)/$"
@@ -74,6 +93,15 @@ DIACRITIC_MAP = {
 
 VOWELS = ["a", "e", "i", "o", "u", "v"]
 
+# Entries written per INSERT batch; memory use is bounded by this, not by
+# the size of the file.
+IMPORT_CHUNK_SIZE = 2000
+# A staging load commits at least this often, then pauses long enough for
+# writers in SQLite's busy handler (which polls every 100ms at most) to
+# take the lock.
+STAGING_TRANSACTION_SECONDS = 0.5
+STAGING_PAUSE_SECONDS = 0.1
+
 
 @dataclass
 class DictEntry:
@@ -95,6 +123,9 @@ class ImportStats:
     normalized: int
     deduped: int
     inserted: int
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
 
 
 @dataclass
@@ -126,8 +157,7 @@ def split_values(raw: str) -> list[str]:
     return [part.strip() for part in parts if part.strip()]
 
 
-def parse_cedict_file(path: Path) -> list[DictEntry]:
-    entries: list[DictEntry] = []
+def parse_cedict_file(path: Path) -> Iterator[DictEntry]:
     for line in open_text(path):
         line = line.strip()
         if not line or line.startswith("#"):
@@ -137,21 +167,17 @@ def parse_cedict_file(path: Path) -> list[DictEntry]:
             continue
         defs_raw = match.group("defs")
         meanings = [d for d in defs_raw.split("/") if d]
-        entries.append(
-            DictEntry(
-                simplified=match.group("simp"),
-                traditional=match.group("trad"),
-                pinyin=match.group("pinyin"),
-                meanings=meanings,
-                examples=[],
-                tags=[]
-            )
+        yield DictEntry(
+            simplified=match.group("simp"),
+            traditional=match.group("trad"),
+            pinyin=match.group("pinyin"),
+            meanings=meanings,
+            examples=[],
+            tags=[]
         )
-    return entries
 
 
-def parse_csv_file(path: Path, mapping: CsvMapping) -> list[DictEntry]:
-    entries: list[DictEntry] = []
+def parse_csv_file(path: Path, mapping: CsvMapping) -> Iterator[DictEntry]:
     with open(path, "r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
@@ -184,20 +210,17 @@ def parse_csv_file(path: Path, mapping: CsvMapping) -> list[DictEntry]:
             if mapping.part_of_speech:
                 pos = (row.get(mapping.part_of_speech) or "").strip() or None
 
-            entries.append(
-                DictEntry(
-                    simplified=simplified,
-                    traditional=traditional,
-                    pinyin=pinyin,
-                    meanings=meanings,
-                    examples=examples,
-                    tags=tags,
-                    hsk_level=hsk_level,
-                    pos=pos,
-                    frequency=frequency
-                )
+            yield DictEntry(
+                simplified=simplified,
+                traditional=traditional,
+                pinyin=pinyin,
+                meanings=meanings,
+                examples=examples,
+                tags=tags,
+                hsk_level=hsk_level,
+                pos=pos,
+                frequency=frequency
             )
-    return entries
 
 
 def normalize_pinyin_search(pinyin: str) -> str:
@@ -259,6 +282,8 @@ def normalize_pinyin(pinyin: str, style: str = "numbers") -> str:
     return " ".join(normalized)
 
 
+# Imports convert the same few thousand syllables over and over.
+@lru_cache(maxsize=8192)
 def _to_numbers(token: str) -> str:
     if re.search(r"\d", token):
         return token.replace("u:", "v").replace("\u00fc", "v")
@@ -278,6 +303,7 @@ def _to_numbers(token: str) -> str:
     return f"{core}{tone}" if tone else core
 
 
+@lru_cache(maxsize=8192)
 def _to_diacritics(token: str) -> str:
     match = re.match(r"^(?P<body>[a-zv:]+)(?P<tone>[1-5])$", token, re.IGNORECASE)
     if not match:
@@ -314,8 +340,7 @@ def _select_vowel_index(body: str) -> Optional[int]:
     return None
 
 
-def normalize_entries(entries: Iterable[DictEntry], pinyin_style: str) -> list[DictEntry]:
-    normalized: list[DictEntry] = []
+def normalize_entries(entries: Iterable[DictEntry], pinyin_style: str) -> Iterator[DictEntry]:
     for entry in entries:
         entry.pinyin = normalize_pinyin(entry.pinyin, style=pinyin_style)
         entry.pinyin_normalized = normalize_pinyin_search(entry.pinyin)
@@ -328,67 +353,475 @@ def normalize_entries(entries: Iterable[DictEntry], pinyin_style: str) -> list[D
             entry.pos = extract_pos(entry.tags)
         if entry.frequency is None:
             entry.frequency = extract_frequency(entry.tags)
-        normalized.append(entry)
-    return normalized
+        yield entry
+
+
+def merge_entry(existing: DictEntry, entry: DictEntry) -> None:
+    if not existing.traditional and entry.traditional:
+        existing.traditional = entry.traditional
+    existing.meanings = sorted(set(existing.meanings + entry.meanings))
+    existing.examples = sorted(set(existing.examples + entry.examples))
+    existing.tags = sorted(set(existing.tags + entry.tags))
+    if existing.hsk_level is None and entry.hsk_level is not None:
+        existing.hsk_level = entry.hsk_level
+    if existing.pos is None and entry.pos:
+        existing.pos = entry.pos
+    if existing.frequency is None and entry.frequency is not None:
+        existing.frequency = entry.frequency
 
 
 def dedupe_entries(entries: Iterable[DictEntry]) -> list[DictEntry]:
     merged: dict[tuple[str, str], DictEntry] = {}
     for entry in entries:
         key = (entry.simplified, entry.pinyin)
-        if key not in merged:
+        if key in merged:
+            merge_entry(merged[key], entry)
+        else:
             merged[key] = entry
-            continue
-        existing = merged[key]
-        if not existing.traditional and entry.traditional:
-            existing.traditional = entry.traditional
-        existing.meanings = sorted(set(existing.meanings + entry.meanings))
-        existing.examples = sorted(set(existing.examples + entry.examples))
-        existing.tags = sorted(set(existing.tags + entry.tags))
-        if existing.hsk_level is None and entry.hsk_level is not None:
-            existing.hsk_level = entry.hsk_level
-        if existing.pos is None and entry.pos:
-            existing.pos = entry.pos
-        if existing.frequency is None and entry.frequency is not None:
-            existing.frequency = entry.frequency
     return list(merged.values())
 
 
-def insert_dict_entries(db: Session, entries: Iterable[DictEntry], replace: bool = False) -> int:
-    if replace:
-        db.query(DictWord).delete()
-
-    objects = [
-        DictWord(
-            simplified=entry.simplified,
-            traditional=entry.traditional or None,
-            pinyin=entry.pinyin,
-            pinyin_normalized=entry.pinyin_normalized or None,
-            meanings=json.dumps(entry.meanings, ensure_ascii=False),
-            examples=json.dumps(entry.examples, ensure_ascii=False),
-            tags=json.dumps(entry.tags, ensure_ascii=False),
-            hsk_level=entry.hsk_level,
-            pos=entry.pos,
-            frequency=entry.frequency,
-            last_modified=datetime.utcnow()
-        )
-        for entry in entries
-    ]
+def chunk_entries(entries: Iterable[DictEntry], size: int = IMPORT_CHUNK_SIZE) -> Iterator[list[DictEntry]]:
+    chunk: list[DictEntry] = []
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Column order of the rows insert_dict_entries writes. The model's Python
+# defaults do not run on this path, so derived columns are filled here.
+_INSERT_COLUMNS = (
+    "simplified",
+    "traditional",
+    "pinyin",
+    "pinyin_normalized",
+    "pinyin_syllables",
+    "meanings",
+    "examples",
+    "tags",
+    "hsk_level",
+    "pos",
+    "frequency",
+    "rank_prior",
+    "content_hash",
+    "last_modified"
+)
+
+
+def _insert_sql(table: str) -> str:
+    return (
+        f"INSERT INTO {table} ({', '.join(_INSERT_COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in _INSERT_COLUMNS)})"
+    )
+
+
+def _merge_sql(table: str) -> str:
+    return (
+        f"UPDATE {table} SET traditional = ?, meanings = ?, examples = ?, tags = ?, hsk_level = ?, "
+        "pos = ?, frequency = ?, rank_prior = ?, content_hash = ?, last_modified = ? WHERE id = ?"
+    )
+
+
+_INSERT_SQL = _insert_sql("dict_word")
+# Diff imports never change a row's key, so traditional stays out of the
+# SET list and the n-gram update trigger does not fire.
+_UPDATE_SQL = (
+    "UPDATE dict_word SET meanings = ?, examples = ?, tags = ?, hsk_level = ?, pos = ?, "
+    "frequency = ?, rank_prior = ?, content_hash = ?, last_modified = ? WHERE id = ?"
+)
+_HASH_INDEX = _INSERT_COLUMNS.index("content_hash")
+_ROW_SELECT = text(
+    "SELECT simplified, traditional, pinyin, pinyin_normalized, meanings, examples, tags, "
+    "hsk_level, pos, frequency FROM dict_word WHERE id = :id"
+)
+
+
+_encode_list = json.JSONEncoder(ensure_ascii=False).encode
+
+
+def _encode_lists(entry: DictEntry) -> tuple[str, str, str]:
+    return (
+        _encode_list(entry.meanings) if entry.meanings else "[]",
+        _encode_list(entry.examples) if entry.examples else "[]",
+        _encode_list(entry.tags) if entry.tags else "[]"
+    )
+
+
+def _entry_hash(entry: DictEntry) -> str:
+    return content_hash(*_encode_lists(entry), entry.hsk_level, entry.pos, entry.frequency)
+
+
+def _entry_values(entry: DictEntry, now: datetime) -> tuple:
+    meanings, examples, tags = _encode_lists(entry)
+    return (
+        entry.simplified,
+        entry.traditional or None,
+        entry.pinyin,
+        entry.pinyin_normalized or None,
+        syllable_key(entry.pinyin_normalized),
+        meanings,
+        examples,
+        tags,
+        entry.hsk_level,
+        entry.pos,
+        entry.frequency,
+        rank_prior(entry.frequency, entry.hsk_level),
+        content_hash(meanings, examples, tags, entry.hsk_level, entry.pos, entry.frequency),
+        now
+    )
+
+
+def _load_json_list(raw: Optional[str]) -> list[str]:
+    try:
+        value = json.loads(raw) if raw else []
+    except json.JSONDecodeError:
+        return [raw]
+    return value if isinstance(value, list) else [value]
+
+
+def _merge_duplicates(
+    db: Session,
+    floor: int,
+    now: datetime,
+    chunk_size: int,
+    table: str = "dict_word"
+) -> int:
+    """Fold rows this import wrote more than once into the first of them.
+
+    Chunks are deduplicated as they stream in; keys repeated across chunks
+    are merged here with one pass over the imported rows, instead of a
+    lookup per chunk. Returns the number of rows removed.
+    """
+    conn = db.connection()
+    rows = conn.execute(
+        text(
+            """
+            SELECT id, simplified, traditional, pinyin, pinyin_normalized,
+                   meanings, examples, tags, hsk_level, pos, frequency
+            FROM {table}
+            WHERE id > :floor AND (simplified, pinyin) IN (
+              SELECT simplified, pinyin FROM {table}
+              WHERE id > :floor
+              GROUP BY simplified, pinyin
+              HAVING COUNT(*) > 1
+            )
+            ORDER BY simplified, pinyin, id
+            """.format(table=table)
+        ),
+        {"floor": floor}
+    )
+    updates: list[tuple] = []
+    deletes: list[tuple] = []
+    removed = 0
+    for _, group in groupby(rows, key=lambda row: (row.simplified, row.pinyin)):
+        first, *rest = group
+        existing = _row_entry(first)
+        for row in rest:
+            merge_entry(existing, _row_entry(row))
+            deletes.append((row.id,))
+        values = _entry_values(existing, now)
+        updates.append((values[1], *values[5:], first.id))
+        if len(deletes) >= chunk_size:
+            removed += _write_merges(conn, table, updates, deletes)
+            updates, deletes = [], []
+    return removed + _write_merges(conn, table, updates, deletes)
+
+
+def _row_entry(row) -> DictEntry:
+    return DictEntry(
+        simplified=row.simplified,
+        traditional=row.traditional or "",
+        pinyin=row.pinyin,
+        meanings=_load_json_list(row.meanings),
+        examples=_load_json_list(row.examples),
+        tags=_load_json_list(row.tags),
+        pinyin_normalized=row.pinyin_normalized or "",
+        hsk_level=row.hsk_level,
+        pos=row.pos,
+        frequency=row.frequency
+    )
+
 
-    db.bulk_save_objects(objects)
+def _write_merges(conn, table: str, updates: list[tuple], deletes: list[tuple]) -> int:
+    if updates:
+        conn.exec_driver_sql(_merge_sql(table), updates)
+    if deletes:
+        conn.exec_driver_sql(f"DELETE FROM {table} WHERE id = ?", deletes)
+    return len(deletes)
+
+
+@contextmanager
+def _deferred_dict_indexes(db: Session, floor: int) -> Iterator[None]:
+    """Suspend per-row index maintenance on dict_word for one import.
+
+    The triggers feeding dict_word_fts and dict_word_ngram are dropped and
+    recreated from their stored SQL inside the import transaction, so other
+    connections never see them missing and a failed import restores them
+    on rollback. Every row the import touches is above `floor`. An import
+    into an empty table rebuilds both indexes and recreates dict_word's
+    own indexes after the load; an append indexes just its rows at the end.
+    """
+    conn = db.connection()
+    triggers = conn.execute(
+        text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'dict_word'")
+    ).fetchall()
+    indexes = []
+    if not floor:
+        indexes = conn.execute(
+            text(
+                "SELECT name, sql FROM sqlite_master "
+                "WHERE type = 'index' AND tbl_name = 'dict_word' AND sql IS NOT NULL"
+            )
+        ).fetchall()
+    for name, _ in triggers:
+        conn.execute(text(f'DROP TRIGGER "{name}"'))
+    for name, _ in indexes:
+        conn.execute(text(f'DROP INDEX "{name}"'))
+    yield
+    for _, sql in indexes:
+        conn.execute(text(sql))
+    after_id = floor or None
+    rebuild_fts_index(conn, after_id)
+    rebuild_ngram_index(conn, after_id)
+    for _, sql in triggers:
+        conn.execute(text(sql))
+
+
+def insert_dict_entries(
+    db: Session,
+    entries: Iterable[DictEntry],
+    dedupe: bool = False,
+    stats: Optional[ImportStats] = None,
+    chunk_size: int = IMPORT_CHUNK_SIZE
+) -> int:
+    """Append entries in chunks of `chunk_size` within one transaction.
+
+    Rows go through DBAPI executemany with per-row index maintenance
+    suspended; the full-text and n-gram indexes are brought up to date
+    once, before the commit. With `dedupe`, entries sharing (simplified, pinyin)
+    anywhere in the stream are merged into the first one. Counts are added
+    to `stats` as chunks are written. Returns the number of rows inserted.
+    """
+    if stats is None:
+        stats = ImportStats(parsed=0, normalized=0, deduped=0, inserted=0)
+    now = datetime.utcnow()
+    inserted = 0
+    try:
+        begin_immediate(db)
+        floor = db.scalar(select(func.max(DictWord.id))) or 0
+        with _deferred_dict_indexes(db, floor):
+            conn = db.connection()
+            for chunk in chunk_entries(entries, chunk_size):
+                stats.normalized += len(chunk)
+                if dedupe:
+                    chunk = dedupe_entries(chunk)
+                conn.exec_driver_sql(_INSERT_SQL, [_entry_values(entry, now) for entry in chunk])
+                inserted += len(chunk)
+                stats.inserted = inserted
+            if dedupe:
+                inserted -= _merge_duplicates(db, floor, now, chunk_size)
+                stats.inserted = inserted
+        stats.deduped = inserted
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return inserted
+
+
+def _yield_to_writers(db: Session) -> None:
     db.commit()
-    return len(objects)
+    time.sleep(STAGING_PAUSE_SECONDS)
+    begin_immediate(db)
 
 
-def run_import(
+def stage_dict_entries(
+    db: Session,
+    entries: Iterable[DictEntry],
+    dedupe: bool = False,
+    stats: Optional[ImportStats] = None,
+    chunk_size: int = IMPORT_CHUNK_SIZE
+) -> int:
+    """Replace the dictionary by building a staging copy and swapping it in.
+
+    Entries are loaded into the staging tables, then indexed, full-text
+    indexed and analyzed a step at a time, committing in between so other
+    writers are held up for one step at most. Searches read the live
+    tables throughout; the swap itself only renames tables. A failure
+    before the swap drops the staging tables and leaves the live ones as
+    they were. Returns the number of rows inserted.
+    """
+    if stats is None:
+        stats = ImportStats(parsed=0, normalized=0, deduped=0, inserted=0)
+    now = datetime.utcnow()
+    staging = "dict_word" + STAGING_SUFFIX
+    insert_sql = _insert_sql(staging)
+    inserted = 0
+    try:
+        begin_immediate(db)
+        create_dict_staging(db.connection())
+        started = time.monotonic()
+        for chunk in chunk_entries(entries, chunk_size):
+            stats.normalized += len(chunk)
+            if dedupe:
+                chunk = dedupe_entries(chunk)
+            db.connection().exec_driver_sql(insert_sql, [_entry_values(entry, now) for entry in chunk])
+            inserted += len(chunk)
+            stats.inserted = inserted
+            if time.monotonic() - started >= STAGING_TRANSACTION_SECONDS:
+                _yield_to_writers(db)
+                started = time.monotonic()
+        if dedupe:
+            inserted -= _merge_duplicates(db, 0, now, chunk_size, staging)
+            stats.inserted = inserted
+        for step in DICT_STAGING_STEPS:
+            _yield_to_writers(db)
+            step(db.connection())
+        _yield_to_writers(db)
+        swap_dict_staging(db.connection())
+        db.commit()
+    except Exception:
+        db.rollback()
+        begin_immediate(db)
+        drop_dict_tables(db.connection(), STAGING_SUFFIX)
+        db.commit()
+        raise
+    stats.deduped = inserted
+    begin_immediate(db)
+    drop_dict_tables(db.connection(), RETIRED_SUFFIX)
+    db.commit()
+    return inserted
+
+
+def _entry_key(entry: DictEntry) -> tuple[str, str, str]:
+    return entry.simplified, entry.traditional or "", entry.pinyin
+
+
+def diff_dict_entries(
     db: Session,
+    entries: Iterable[DictEntry],
+    stats: Optional[ImportStats] = None,
+    chunk_size: int = IMPORT_CHUNK_SIZE
+) -> int:
+    """Bring dict_word in line with `entries`, writing only what changed.
+
+    Rows are keyed by (simplified, traditional, pinyin); entries sharing a
+    key are merged. A key already stored keeps its row and id, and the row
+    is rewritten only when its content hash differs. Keys missing from the
+    stream are deleted, new ones inserted. The index triggers stay in
+    place: a refresh touches few rows, so per-row maintenance is cheaper
+    than rebuilding. Counts are added to `stats` as chunks are written.
+    Returns the number of rows inserted.
+    """
+    if stats is None:
+        stats = ImportStats(parsed=0, normalized=0, deduped=0, inserted=0)
+    now = datetime.utcnow()
+    seen: set[int] = set()
+    # Stored rows that may change, with the entry they will hold and their
+    # stored hash. A key can recur in a later chunk, so they are compared
+    # and written once the whole stream is merged.
+    pending: dict[int, tuple[DictEntry, Optional[str]]] = {}
+    try:
+        begin_immediate(db)
+        floor = db.scalar(select(func.max(DictWord.id))) or 0
+        conn = db.connection()
+        for chunk in chunk_entries(entries, chunk_size):
+            stats.normalized += len(chunk)
+            merged: dict[tuple[str, str, str], DictEntry] = {}
+            for entry in chunk:
+                key = _entry_key(entry)
+                if key in merged:
+                    merge_entry(merged[key], entry)
+                else:
+                    merged[key] = entry
+            headwords = list({key[0] for key in merged})
+            rows = conn.exec_driver_sql(
+                "SELECT id, simplified, traditional, pinyin, content_hash FROM dict_word "
+                f"WHERE simplified IN ({', '.join('?' for _ in headwords)}) ORDER BY id",
+                tuple(headwords)
+            ).fetchall()
+            stored = {}
+            for row_id, simplified, traditional, pinyin, stored_hash in rows:
+                stored.setdefault((simplified, traditional or "", pinyin), (row_id, stored_hash))
+            inserts: list[tuple] = []
+            updates: list[tuple] = []
+            for key, entry in merged.items():
+                found = stored.get(key)
+                if found is None:
+                    inserts.append(_entry_values(entry, now))
+                    continue
+                row_id, stored_hash = found
+                if row_id in pending:
+                    merge_entry(pending[row_id][0], entry)
+                elif row_id > floor or row_id in seen:
+                    # A key this import already inserted or found unchanged.
+                    existing = _row_entry(conn.execute(_ROW_SELECT, {"id": row_id}).one())
+                    merge_entry(existing, entry)
+                    if row_id > floor:
+                        values = _entry_values(existing, now)
+                        updates.append((*values[5:], row_id))
+                    else:
+                        pending[row_id] = (existing, stored_hash)
+                        stats.unchanged -= 1
+                else:
+                    seen.add(row_id)
+                    stats.deduped += 1
+                    if _entry_hash(entry) == stored_hash:
+                        stats.unchanged += 1
+                    else:
+                        pending[row_id] = (entry, stored_hash)
+            if inserts:
+                conn.exec_driver_sql(_INSERT_SQL, inserts)
+                stats.inserted += len(inserts)
+                stats.deduped += len(inserts)
+            if updates:
+                conn.exec_driver_sql(_UPDATE_SQL, updates)
+
+        updates = []
+        for row_id, (entry, stored_hash) in pending.items():
+            values = _entry_values(entry, now)
+            if values[_HASH_INDEX] == stored_hash:
+                stats.unchanged += 1
+                continue
+            updates.append((*values[5:], row_id))
+            stats.updated += 1
+        for start in range(0, len(updates), chunk_size):
+            conn.exec_driver_sql(_UPDATE_SQL, updates[start:start + chunk_size])
+        stale = [
+            (row_id,)
+            for (row_id,) in conn.execute(
+                text("SELECT id FROM dict_word WHERE id <= :floor"), {"floor": floor}
+            )
+            if row_id not in seen
+        ]
+        for start in range(0, len(stale), chunk_size):
+            conn.exec_driver_sql("DELETE FROM dict_word WHERE id = ?", stale[start:start + chunk_size])
+        stats.deleted += len(stale)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return stats.inserted
+
+
+def _count_parsed(entries: Iterable[DictEntry], stats: ImportStats) -> Iterator[DictEntry]:
+    for entry in entries:
+        stats.parsed += 1
+        yield entry
+
+
+def read_entries(
     file_path: Path,
     file_type: str,
     mapping: Optional[CsvMapping],
     pinyin_style: str,
-    dedupe: bool,
-    replace: bool
-) -> ImportStats:
+    stats: ImportStats
+) -> Iterator[DictEntry]:
+    """Parsed and normalized entries of an import file, counted into `stats`."""
     if file_type == "cedict":
         entries = parse_cedict_file(file_path)
     elif file_type == "csv":
@@ -397,14 +830,38 @@ def run_import(
         entries = parse_csv_file(file_path, mapping)
     else:
         raise ValueError("Unsupported file type")
+    return normalize_entries(_count_parsed(entries, stats), pinyin_style)
 
-    normalized = normalize_entries(entries, pinyin_style)
-    deduped = dedupe_entries(normalized) if dedupe else normalized
-    inserted = insert_dict_entries(db, deduped, replace=replace)
 
-    return ImportStats(
-        parsed=len(entries),
-        normalized=len(normalized),
-        deduped=len(deduped),
-        inserted=inserted
-    )
+def write_entries(
+    db: Session,
+    entries: Iterable[DictEntry],
+    dedupe: bool,
+    replace: bool,
+    diff: bool,
+    stats: ImportStats
+) -> None:
+    if diff:
+        diff_dict_entries(db, entries, stats=stats)
+    elif replace:
+        stage_dict_entries(db, entries, dedupe=dedupe, stats=stats)
+    else:
+        insert_dict_entries(db, entries, dedupe=dedupe, stats=stats)
+
+
+def run_import(
+    db: Session,
+    file_path: Path,
+    file_type: str,
+    mapping: Optional[CsvMapping],
+    pinyin_style: str,
+    dedupe: bool,
+    replace: bool,
+    diff: bool = False
+) -> ImportStats:
+    # Each stage is a generator: a chunk is parsed, normalized, merged and
+    # written before the next line of the file is read.
+    stats = ImportStats(parsed=0, normalized=0, deduped=0, inserted=0)
+    entries = read_entries(file_path, file_type, mapping, pinyin_style, stats)
+    write_entries(db, entries, dedupe, replace, diff, stats)
+    return stats
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from ..crud import LAPSE_MAX_EASE
+from ..db import SessionLocal
+from ..forecast import invalidate_forecast
+from ..models import Card, StudyLog, User
+from ..srs import CardStateBatch, SchedulerEngine, SM2Engine
+from .srs import engine_for_user
+
+DEFAULT_CHUNK_SIZE = 20000
+
+
+@dataclass
+class ReplayStats:
+    users: int = 0
+    cards: int = 0
+    logs: int = 0
+    seconds: float = 0.0
+
+    @property
+    def cards_per_second(self) -> float:
+        return self.cards / self.seconds if self.seconds > 0 else 0.0
+
+    def merge(self, other: ReplayStats) -> None:
+        self.users += other.users
+        self.cards += other.cards
+        self.logs += other.logs
+
+
+def _iter_card_chunks(rows: Iterable, chunk_size: int) -> Iterator[list]:
+    # Rows arrive ordered by card, so a chunk is only cut on a card boundary.
+    chunk: list = []
+    for row in rows:
+        if len(chunk) >= chunk_size and row[0] != chunk[-1][0]:
+            yield chunk
+            chunk = []
+        chunk.append(row)
+    if chunk:
+        yield chunk
+
+
+def fold_logs(
+    card_ids: np.ndarray,
+    timestamps: np.ndarray,
+    eases: np.ndarray,
+    now: datetime,
+    engine: Optional[SchedulerEngine] = None
+) -> List[dict]:
+    if engine is None:
+        engine = SM2Engine()
+    starts = np.flatnonzero(np.r_[True, card_ids[1:] != card_ids[:-1]])
+    counts = np.diff(np.r_[starts, len(card_ids)])
+    state = CardStateBatch.initial(len(starts), timestamps[starts])
+
+    # Round r applies the r-th review of every card that has one.
+    for review in range(int(counts.max())):
+        active = np.flatnonzero(counts > review)
+        rows = starts[active] + review
+        state.put(active, engine.review_batch(state.take(active), eases[rows], timestamps[rows]))
+
+    failed = eases <= LAPSE_MAX_EASE
+    lapse_count = np.add.reduceat(failed.astype(np.int64), starts)
+    missing = np.iinfo(np.int64).min
+    failed_at = np.maximum.reduceat(
+        np.where(failed, timestamps.astype(np.int64), missing), starts
+    )
+    failed_at_values = failed_at.astype("datetime64[us]").tolist()
+
+    return [
+        {
+            "id": int(card_ids[start]),
+            **state.row(pos),
+            "lapse_count": int(lapse_count[pos]),
+            "last_failed_at": failed_at_values[pos] if failed_at[pos] != missing else None,
+            "updated_at": now,
+            "last_modified": now
+        }
+        for pos, start in enumerate(starts)
+    ]
+
+
+def replay_user_logs(db: Session, user_id: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> ReplayStats:
+    now = datetime.utcnow()
+    stats = ReplayStats(users=1)
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        return ReplayStats()
+    engine = engine_for_user(user)
+    rows = (
+        db.query(StudyLog.card_id, StudyLog.timestamp, StudyLog.ease)
+        .join(Card, Card.id == StudyLog.card_id)
+        .filter(StudyLog.user_id == user_id, Card.owner_id == user_id)
+        .filter(StudyLog.timestamp.isnot(None))
+        .order_by(StudyLog.card_id.asc(), StudyLog.timestamp.asc(), StudyLog.id.asc())
+        .yield_per(chunk_size)
+    )
+
+    updates: List[dict] = []
+    for chunk in _iter_card_chunks(rows, chunk_size):
+        card_ids = np.fromiter((row[0] for row in chunk), dtype=np.int64, count=len(chunk))
+        timestamps = np.array([row[1] for row in chunk], dtype="datetime64[us]")
+        eases = np.fromiter((row[2] for row in chunk), dtype=np.int64, count=len(chunk))
+        updates.extend(fold_logs(card_ids, timestamps, eases, now, engine=engine))
+        stats.logs += len(chunk)
+
+    # Cards without logs were never reviewed, whatever their columns say, so
+    # they go back to the starting state, due since they were created.
+    replayed = {row["id"] for row in updates}
+    unreviewed = [
+        row for row in db.query(Card.id, Card.created_at).filter(Card.owner_id == user_id)
+        if row[0] not in replayed
+    ]
+    if unreviewed:
+        created = np.array([row[1] or now for row in unreviewed], dtype="datetime64[us]")
+        state = CardStateBatch.initial(len(unreviewed), created)
+        updates.extend(
+            {
+                "id": row[0],
+                **state.row(pos),
+                "lapse_count": 0,
+                "last_failed_at": None,
+                "updated_at": now,
+                "last_modified": now
+            }
+            for pos, row in enumerate(unreviewed)
+        )
+
+    # Writes wait until the log cursor is exhausted so SQLite never sees a
+    # write while the streaming read is still open on the same connection.
+    for start in range(0, len(updates), chunk_size):
+        db.execute(update(Card), updates[start:start + chunk_size])
+    db.commit()
+    stats.cards = len(updates)
+    return stats
+
+
+def replay_user(user_id: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> ReplayStats:
+    db = SessionLocal()
+    try:
+        return replay_user_logs(db, user_id, chunk_size=chunk_size)
+    finally:
+        db.close()
+
+
+def replay_users(
+    user_ids: Optional[Sequence[int]] = None,
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> ReplayStats:
+    started = time.perf_counter()
+    if user_ids is None:
+        db = SessionLocal()
+        try:
+            user_ids = [row[0] for row in db.query(User.id).order_by(User.id.asc()).all()]
+        finally:
+            db.close()
+
+    stats = ReplayStats()
+    if workers <= 1 or len(user_ids) <= 1:
+        results = (replay_user(user_id, chunk_size=chunk_size) for user_id in user_ids)
+        for user_id, result in zip(user_ids, results):
+            stats.merge(result)
+            invalidate_forecast(user_id)
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            results = pool.map(replay_user, user_ids, [chunk_size] * len(user_ids))
+            # The forecast cache lives in this process, not in the pool's
+            # workers, so it is cleared here as each user's replay lands.
+            for user_id, result in zip(user_ids, results):
+                stats.merge(result)
+                invalidate_forecast(user_id)
+
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Rebuild card SRS state from study logs.")
+    parser.add_argument("--user-id", type=int, action="append", dest="user_ids")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    stats = replay_users(args.user_ids, workers=args.workers, chunk_size=args.chunk_size)
+    print(
+        f"Replayed {stats.logs} logs into {stats.cards} cards for {stats.users} users "
+        f"in {stats.seconds:.2f}s ({stats.cards_per_second:.0f} cards/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,120 @@
-from ..srs import apply_sm2
+from __future__ import annotations
 
-__all__ = ["apply_sm2"]
+import json
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..crud import update_user_settings
+from ..db import SessionLocal, begin_immediate
+from ..fsrs import ReviewHistory, fit_weights
+from ..models import Card, StudyLog, User
+from ..srs import (
+    CardStateBatch,
+    FSRSEngine,
+    SM2BatchResult,
+    SM2Engine,
+    SchedulerEngine,
+    apply_sm2,
+    apply_sm2_batch,
+    engine_from_settings
+)
+
+__all__ = [
+    "CardStateBatch",
+    "FSRSEngine",
+    "SM2BatchResult",
+    "SM2Engine",
+    "SchedulerEngine",
+    "apply_sm2",
+    "apply_sm2_batch",
+    "engine_for_user",
+    "engine_from_settings",
+    "load_review_history",
+    "refit_user_engine",
+    "refit_user_engine_job"
+]
+
+REFIT_MIN_NEW_LOGS = 200
+FIT_ITERATIONS = 40
+REFIT_ITERATIONS = 10
+
+
+def _get_settings(user: User) -> dict:
+    try:
+        return json.loads(user.settings_json or "{}")
+    except json.JSONDecodeError:
+        return {}
+
+
+def engine_for_user(user: User) -> SchedulerEngine:
+    return engine_from_settings(_get_settings(user))
+
+
+def load_review_history(db: Session, user_id: int) -> ReviewHistory:
+    rows = (
+        db.query(StudyLog.card_id, StudyLog.timestamp, StudyLog.ease)
+        .join(Card, Card.id == StudyLog.card_id)
+        .filter(StudyLog.user_id == user_id, Card.owner_id == user_id)
+        .filter(StudyLog.timestamp.isnot(None))
+        .order_by(StudyLog.card_id.asc(), StudyLog.timestamp.asc(), StudyLog.id.asc())
+        .all()
+    )
+    return ReviewHistory.from_logs(
+        np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+        np.array([row[1] for row in rows], dtype="datetime64[us]"),
+        np.fromiter((row[2] for row in rows), dtype=np.int64, count=len(rows))
+    )
+
+
+def refit_user_engine(db: Session, user: User, force: bool = False) -> bool:
+    settings = _get_settings(user)
+    scheduler = settings.get("scheduler") or {}
+    if scheduler.get("engine") != FSRSEngine.name:
+        return False
+
+    logged = db.query(func.count(StudyLog.id)).filter(StudyLog.user_id == user.id).scalar() or 0
+    if not force and logged - scheduler.get("fitted_logs", 0) < REFIT_MIN_NEW_LOGS:
+        return False
+
+    # Cached weights warm-start the optimizer, so a refit after a few hundred
+    # new reviews only needs a handful of steps.
+    previous = scheduler.get("weights")
+    weights = fit_weights(
+        load_review_history(db, user.id),
+        initial=previous,
+        iterations=REFIT_ITERATIONS if previous else FIT_ITERATIONS
+    )
+    fitted = {
+        "weights": [round(float(value), 4) for value in weights],
+        "fitted_logs": logged,
+        "fitted_at": datetime.utcnow().isoformat()
+    }
+
+    # The fit takes a while and the user may save settings meanwhile, so
+    # the row is read again under the write lock and only the fitted keys
+    # are merged into it.
+    db.rollback()
+    begin_immediate(db)
+    db.refresh(user)
+    settings = _get_settings(user)
+    scheduler = settings.get("scheduler") or {}
+    if scheduler.get("engine") != FSRSEngine.name:
+        db.rollback()
+        return False
+    scheduler.update(fitted)
+    settings["scheduler"] = scheduler
+    update_user_settings(db, user, settings)
+    return True
+
+
+def refit_user_engine_job(user_id: int) -> None:
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        if user:
+            refit_user_engine(db, user)
+    finally:
+        db.close()
@@ -1,8 +1,35 @@
+from __future__ import annotations
+
+import math
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from typing import Optional, Sequence
+
+import numpy as np
 
+from .fsrs import (
+    DEFAULT_RETENTION,
+    DEFAULT_WEIGHTS,
+    grade_from_quality,
+    initial_difficulty,
+    initial_stability,
+    next_difficulty,
+    next_interval,
+    next_stability,
+    retrievability
+)
 from .models import Card
 
 
+@dataclass
+class SM2BatchResult:
+    easiness: np.ndarray
+    interval_days: np.ndarray
+    repetitions: np.ndarray
+    next_due: np.ndarray
+
+
 def apply_sm2(card: Card, quality: int, now: datetime | None = None) -> Card:
     if now is None:
         now = datetime.utcnow()
@@ -25,3 +52,230 @@ def apply_sm2(card: Card, quality: int, now: datetime | None = None) -> Card:
     card.updated_at = now
     card.last_modified = now
     return card
+
+
+def apply_sm2_batch(
+    easiness: np.ndarray,
+    interval_days: np.ndarray,
+    repetitions: np.ndarray,
+    quality: np.ndarray,
+    now: datetime | np.ndarray | None = None
+) -> SM2BatchResult:
+    if now is None:
+        now = datetime.utcnow()
+
+    easiness = np.asarray(easiness, dtype=np.float64)
+    interval_days = np.asarray(interval_days, dtype=np.int64)
+    repetitions = np.asarray(repetitions, dtype=np.int64)
+    quality = np.asarray(quality, dtype=np.int64)
+    now_array = np.asarray(now, dtype="datetime64[us]")
+
+    passed = quality >= 3
+    new_repetitions = np.where(passed, repetitions + 1, 0)
+    # np.rint rounds half to even, matching Python's round() in apply_sm2.
+    grown = np.rint(interval_days * easiness).astype(np.int64)
+    new_interval = np.select(
+        [~passed, new_repetitions == 1, new_repetitions == 2],
+        [1, 1, 6],
+        default=grown
+    ).astype(np.int64)
+
+    lapse = 5 - quality
+    delta = 0.1 - lapse * (0.08 + lapse * 0.02)
+    new_easiness = np.maximum(1.3, easiness + delta)
+    next_due = now_array + new_interval.astype("timedelta64[D]")
+
+    return SM2BatchResult(
+        easiness=new_easiness,
+        interval_days=new_interval,
+        repetitions=new_repetitions,
+        next_due=next_due
+    )
+
+
+@dataclass
+class CardStateBatch:
+    easiness: np.ndarray
+    interval_days: np.ndarray
+    repetitions: np.ndarray
+    stability: np.ndarray
+    difficulty: np.ndarray
+    next_due: np.ndarray
+
+    @classmethod
+    def from_columns(
+        cls,
+        easiness: Sequence[float],
+        interval_days: Sequence[int],
+        repetitions: Sequence[int],
+        stability: Sequence[Optional[float]],
+        difficulty: Sequence[Optional[float]],
+        next_due: Sequence[datetime]
+    ) -> CardStateBatch:
+        return cls(
+            easiness=np.asarray(easiness, dtype=np.float64),
+            interval_days=np.asarray(interval_days, dtype=np.int64),
+            repetitions=np.asarray(repetitions, dtype=np.int64),
+            stability=np.array([np.nan if value is None else value for value in stability], dtype=np.float64),
+            difficulty=np.array([np.nan if value is None else value for value in difficulty], dtype=np.float64),
+            next_due=np.asarray(next_due, dtype="datetime64[us]")
+        )
+
+    @classmethod
+    def initial(cls, size: int, now: datetime | np.ndarray) -> CardStateBatch:
+        return cls(
+            easiness=np.full(size, 2.5),
+            interval_days=np.zeros(size, dtype=np.int64),
+            repetitions=np.zeros(size, dtype=np.int64),
+            stability=np.full(size, np.nan),
+            difficulty=np.full(size, np.nan),
+            next_due=np.broadcast_to(np.asarray(now, dtype="datetime64[us]"), (size,)).copy()
+        )
+
+    def take(self, index: np.ndarray) -> CardStateBatch:
+        return CardStateBatch(
+            easiness=self.easiness[index],
+            interval_days=self.interval_days[index],
+            repetitions=self.repetitions[index],
+            stability=self.stability[index],
+            difficulty=self.difficulty[index],
+            next_due=self.next_due[index]
+        )
+
+    def put(self, index: np.ndarray, other: CardStateBatch) -> None:
+        self.easiness[index] = other.easiness
+        self.interval_days[index] = other.interval_days
+        self.repetitions[index] = other.repetitions
+        self.stability[index] = other.stability
+        self.difficulty[index] = other.difficulty
+        self.next_due[index] = other.next_due
+
+    def row(self, pos: int) -> dict:
+        stability = float(self.stability[pos])
+        difficulty = float(self.difficulty[pos])
+        return {
+            "easiness": float(self.easiness[pos]),
+            "interval_days": int(self.interval_days[pos]),
+            "repetitions": int(self.repetitions[pos]),
+            "stability": None if math.isnan(stability) else stability,
+            "difficulty": None if math.isnan(difficulty) else difficulty,
+            "next_due": self.next_due[pos].item()
+        }
+
+
+class SchedulerEngine(ABC):
+    name = ""
+
+    @abstractmethod
+    def review_batch(
+        self,
+        state: CardStateBatch,
+        quality: np.ndarray,
+        now: datetime | np.ndarray
+    ) -> CardStateBatch:
+        """Review every card in `state` and return the new states."""
+
+    def review(self, card: Card, quality: int, now: datetime | None = None) -> Card:
+        if now is None:
+            now = datetime.utcnow()
+        state = CardStateBatch.from_columns(
+            [card.easiness],
+            [card.interval_days],
+            [card.repetitions],
+            [card.stability],
+            [card.difficulty],
+            [card.next_due or now]
+        )
+        for key, value in self.review_batch(state, np.array([quality]), now).row(0).items():
+            setattr(card, key, value)
+        card.updated_at = now
+        card.last_modified = now
+        return card
+
+
+class SM2Engine(SchedulerEngine):
+    name = "sm2"
+
+    def review(self, card: Card, quality: int, now: datetime | None = None) -> Card:
+        return apply_sm2(card, quality, now)
+
+    def review_batch(
+        self,
+        state: CardStateBatch,
+        quality: np.ndarray,
+        now: datetime | np.ndarray
+    ) -> CardStateBatch:
+        result = apply_sm2_batch(state.easiness, state.interval_days, state.repetitions, quality, now)
+        return CardStateBatch(
+            easiness=result.easiness,
+            interval_days=result.interval_days,
+            repetitions=result.repetitions,
+            stability=state.stability,
+            difficulty=state.difficulty,
+            next_due=result.next_due
+        )
+
+
+class FSRSEngine(SchedulerEngine):
+    name = "fsrs"
+
+    def __init__(self, weights: Optional[Sequence[float]] = None, retention: float = DEFAULT_RETENTION):
+        self.weights = DEFAULT_WEIGHTS if weights is None else np.asarray(weights, dtype=np.float64)
+        self.retention = retention
+
+    def review_batch(
+        self,
+        state: CardStateBatch,
+        quality: np.ndarray,
+        now: datetime | np.ndarray
+    ) -> CardStateBatch:
+        now_array = np.asarray(now, dtype="datetime64[us]")
+        grade = grade_from_quality(quality)
+
+        # Cards scheduled by SM-2 so far have no memory state yet; their last
+        # interval stands in for stability. Never-reviewed cards start fresh.
+        stability = np.where(
+            np.isnan(state.stability) & (state.interval_days > 0),
+            state.interval_days.astype(np.float64),
+            state.stability
+        )
+        difficulty = np.where(
+            np.isnan(state.difficulty), initial_difficulty(self.weights, 3), state.difficulty
+        )
+        fresh = np.isnan(stability)
+        stability = np.where(fresh, 1.0, stability)
+
+        last_review = state.next_due - state.interval_days.astype("timedelta64[D]")
+        elapsed = np.maximum((now_array - last_review) / np.timedelta64(1, "D"), 0.0)
+        recall = retrievability(elapsed, stability)
+
+        new_stability = np.where(
+            fresh,
+            initial_stability(self.weights, grade),
+            next_stability(self.weights, difficulty, stability, recall, grade)
+        )
+        new_difficulty = np.where(
+            fresh,
+            initial_difficulty(self.weights, grade),
+            next_difficulty(self.weights, difficulty, grade)
+        )
+        interval_days = next_interval(new_stability, self.retention)
+
+        return CardStateBatch(
+            easiness=state.easiness,
+            interval_days=interval_days,
+            repetitions=np.where(grade > 1, state.repetitions + 1, 0),
+            stability=new_stability,
+            difficulty=new_difficulty,
+            next_due=now_array + interval_days.astype("timedelta64[D]")
+        )
+
+
+def engine_from_settings(settings: dict) -> SchedulerEngine:
+    scheduler = settings.get("scheduler") or {}
+    if scheduler.get("engine") == FSRSEngine.name:
+        return FSRSEngine(
+            weights=scheduler.get("weights"),
+            retention=scheduler.get("retention", DEFAULT_RETENTION)
+        )
+    return SM2Engine()
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+from uuid import uuid4
+
+SESSION_TTL_SECONDS = 3600
+MAX_SESSIONS = 10000
+MAX_SESSIONS_PER_USER = 5
+MAX_QUEUE_SIZE = 500
+
+
+@dataclass
+class StudySession:
+    id: str
+    user_id: int
+    queue: deque
+    expires_at: float
+    reviewed: int = 0
+    queued: set = field(default_factory=set)
+
+
+# Sessions live in this process's memory, not the database: the server must
+# run as a single process (one uvicorn worker) or a session created by one
+# worker is unknown to the others. Threads within the process share the store.
+_lock = threading.Lock()
+_sessions: OrderedDict[str, StudySession] = OrderedDict()
+_user_sessions: dict[int, list[str]] = {}
+
+
+def _drop(session_id: str) -> None:
+    session = _sessions.pop(session_id, None)
+    if not session:
+        return
+    owned = _user_sessions.get(session.user_id, [])
+    if session_id in owned:
+        owned.remove(session_id)
+    if not owned:
+        _user_sessions.pop(session.user_id, None)
+
+
+def _expire(now: float) -> None:
+    # Sessions are kept in last-touched order, so expired ones sit at the front.
+    while _sessions:
+        session_id, session = next(iter(_sessions.items()))
+        if session.expires_at > now:
+            break
+        _drop(session_id)
+
+
+def expires_at(session: StudySession) -> datetime:
+    return datetime.utcnow() + timedelta(seconds=max(0.0, session.expires_at - time.monotonic()))
+
+
+def create_session(user_id: int, card_ids: Iterable[int]) -> StudySession:
+    queue = deque(list(card_ids)[:MAX_QUEUE_SIZE])
+    now = time.monotonic()
+    session = StudySession(
+        id=uuid4().hex,
+        user_id=user_id,
+        queue=queue,
+        expires_at=now + SESSION_TTL_SECONDS,
+        queued=set(queue)
+    )
+    with _lock:
+        _expire(now)
+        owned = _user_sessions.setdefault(user_id, [])
+        while len(owned) >= MAX_SESSIONS_PER_USER:
+            _drop(owned[0])
+        while len(_sessions) >= MAX_SESSIONS:
+            _drop(next(iter(_sessions)))
+        _sessions[session.id] = session
+        _user_sessions.setdefault(user_id, []).append(session.id)
+    return session
+
+
+def get_session(user_id: int, session_id: str) -> Optional[StudySession]:
+    now = time.monotonic()
+    with _lock:
+        _expire(now)
+        session = _sessions.get(session_id)
+        if not session or session.user_id != user_id:
+            return None
+        session.expires_at = now + SESSION_TTL_SECONDS
+        _sessions.move_to_end(session_id)
+        return session
+
+
+def peek_cards(session: StudySession, k: int = 1) -> List[int]:
+    with _lock:
+        return [session.queue[pos] for pos in range(min(k, len(session.queue)))]
+
+
+def delete_session(user_id: int, session_id: str) -> bool:
+    with _lock:
+        session = _sessions.get(session_id)
+        if not session or session.user_id != user_id:
+            return False
+        _drop(session_id)
+        return True
+
+
+def mark_reviewed(user_id: int, card_ids: Iterable[int]) -> None:
+    with _lock:
+        session_ids = list(_user_sessions.get(user_id, []))
+        if not session_ids:
+            return
+        reviewed = set(card_ids)
+        for session_id in session_ids:
+            session = _sessions[session_id]
+            hits = reviewed & session.queued
+            if not hits:
+                continue
+            session.queued -= hits
+            session.reviewed += len(hits)
+            # Answers usually come from the head of the queue, so this is O(1)
+            # in the common case and only rebuilds the deque on out-of-order answers.
+            while session.queue and session.queue[0] not in session.queued:
+                session.queue.popleft()
+            if len(session.queue) != len(session.queued):
+                session.queue = deque(card_id for card_id in session.queue if card_id in session.queued)
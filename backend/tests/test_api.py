@@ -45,3 +45,116 @@ def test_create_collection_and_card():
     response = client.get(f"/api/cards/?collection={collection['id']}", headers=headers)
     assert response.status_code == 200
     assert any(item["id"] == card["id"] for item in response.json())
+
+
+def test_schedule_fallback_returns_each_lapsed_card_once():
+    headers = get_auth_headers()
+    collection = client.post(
+        "/api/collections/", json={"name": "Lapses", "description": ""}, headers=headers
+    ).json()
+    card = client.post(
+        "/api/cards/",
+        json={"simplified": "LAPSE", "pinyin": "", "collection_ids": [collection["id"]]},
+        headers=headers
+    ).json()
+
+    for _ in range(3):
+        response = client.post(
+            "/api/study/response", json={"card_id": card["id"], "q": 1}, headers=headers
+        )
+        assert response.status_code == 200
+
+    response = client.get(
+        f"/api/study/schedule?n=5&collection_id={collection['id']}", headers=headers
+    )
+    assert response.status_code == 200
+    ids = [item["id"] for item in response.json()["cards"]]
+    assert ids == [card["id"]]
+
+
+def test_batch_responses_skip_retried_keys():
+    headers = get_auth_headers()
+    card = client.post(
+        "/api/cards/", json={"simplified": "BATCH", "pinyin": ""}, headers=headers
+    ).json()
+    payload = {
+        "responses": [
+            {"card_id": card["id"], "q": 5, "idempotency_key": f"batch-{card['id']}-1"},
+            {"card_id": card["id"], "q": 4, "idempotency_key": f"batch-{card['id']}-2"}
+        ]
+    }
+
+    response = client.post("/api/study/responses", json=payload, headers=headers)
+    assert response.status_code == 200
+    first = response.json()
+    assert first["applied"] == 2
+    assert first["skipped"] == 0
+    assert first["cards"][0]["repetitions"] == 2
+    assert first["cards"][0]["interval_days"] == 6
+
+    response = client.post("/api/study/responses", json=payload, headers=headers)
+    assert response.status_code == 200
+    retried = response.json()
+    assert retried["applied"] == 0
+    assert retried["skipped"] == 2
+    assert retried["cards"] == first["cards"]
+
+
+def test_forecast_counts_due_cards_and_refreshes_after_review():
+    headers = get_auth_headers()
+    collection = client.post(
+        "/api/collections/", json={"name": "Forecast", "description": ""}, headers=headers
+    ).json()
+    card = client.post(
+        "/api/cards/",
+        json={"simplified": "FORECAST", "pinyin": "", "collection_ids": [collection["id"]]},
+        headers=headers
+    ).json()
+
+    url = f"/api/study/forecast?days=10&collection_id={collection['id']}"
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    forecast = response.json()
+    assert len(forecast["counts"]) == 10
+    assert forecast["counts"][0] == 1
+
+    client.post("/api/study/response", json={"card_id": card["id"], "q": 5}, headers=headers)
+    forecast = client.get(url, headers=headers).json()
+    assert forecast["counts"][0] == 0
+    assert forecast["counts"][1] == 1
+
+
+def test_study_session_advances_as_cards_are_answered():
+    headers = get_auth_headers()
+    collection = client.post(
+        "/api/collections/", json={"name": "Session", "description": ""}, headers=headers
+    ).json()
+    card_ids = [
+        client.post(
+            "/api/cards/",
+            json={"simplified": f"SESSION{index}", "collection_ids": [collection["id"]]},
+            headers=headers
+        ).json()["id"]
+        for index in range(3)
+    ]
+
+    response = client.post(
+        "/api/study/sessions", json={"n": 10, "collection_id": collection["id"]}, headers=headers
+    )
+    assert response.status_code == 200
+    session = response.json()
+    assert session["remaining"] == 3
+
+    url = f"/api/study/sessions/{session['session_id']}/next"
+    first = client.get(url, headers=headers).json()["cards"][0]
+    assert first["id"] in card_ids
+
+    client.post("/api/study/response", json={"card_id": first["id"], "q": 5}, headers=headers)
+    payload = client.get(f"{url}?k=5", headers=headers).json()
+    assert payload["remaining"] == 2
+    assert payload["reviewed"] == 1
+    assert first["id"] not in [card["id"] for card in payload["cards"]]
+
+    response = client.delete(f"/api/study/sessions/{session['session_id']}", headers=headers)
+    assert response.status_code == 200
+    assert client.get(url, headers=headers).status_code == 404
@@ -1,12 +1,41 @@
 import json
-from datetime import datetime
+from dataclasses import replace
+from datetime import datetime, timedelta
 
 from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
 
-from app.db import SessionLocal
+from app import db as app_db
+from app.api import dict as dict_api
+from app.crud import create_cards_from_dict
+from app.db import Base, SessionLocal
+from app.dict_cache import bump_dict_generation
+from app.dict_snapshot import build_snapshot, get_snapshot
+from app.dict_suggest import get_suggest_index, rebuild_suggest_index
 from app.main import app
-from app.models import DictWord
-from app.services.importer import normalize_pinyin_search
+from app.migrations import apply_sqlite_migrations
+from app.models import Collection, DictWord, ImportJob, User
+from app.pagination import dict_marker
+from app.services.import_jobs import (
+    MAX_IMPORT_ATTEMPTS,
+    acquire_writer,
+    cancel_import_job,
+    claim_next_job,
+    create_import_job,
+    recover_stale_jobs,
+    renew_lease,
+    should_stop
+)
+from app.services.importer import (
+    ImportStats,
+    diff_dict_entries,
+    insert_dict_entries,
+    normalize_entries,
+    normalize_pinyin_search,
+    parse_cedict_file,
+    stage_dict_entries
+)
 
 client = TestClient(app)
 
@@ -63,3 +92,675 @@ def test_dict_search_filters():
     assert response.status_code == 200
     payload = response.json()
     assert any(item["simplified"] == "你好" for item in payload["results"])
+
+
+def test_dict_search_cursor_pages():
+    headers = get_auth_headers()
+    db = SessionLocal()
+    try:
+        if db.query(DictWord).filter(DictWord.simplified == "页0").count() == 0:
+            db.add_all(
+                DictWord(
+                    simplified=f"页{idx}",
+                    pinyin="ye4",
+                    pinyin_normalized="ye",
+                    meanings=json.dumps(["page"]),
+                    last_modified=datetime.utcnow()
+                )
+                for idx in range(5)
+            )
+            db.commit()
+    finally:
+        db.close()
+
+    seen = []
+    cursor = None
+    first_cursor = None
+    while True:
+        url = "/api/dict/search?query=页&mode=simplified&limit=2"
+        if cursor:
+            url += f"&cursor={cursor}"
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        payload = response.json()
+        assert payload["total"] == 5
+        seen.extend(item["id"] for item in payload["results"])
+        cursor = payload["next_cursor"]
+        first_cursor = first_cursor or cursor
+        if not cursor:
+            break
+    assert len(seen) == 5
+    assert seen == sorted(seen)
+
+    response = client.get(f"/api/dict/search?query=好&mode=simplified&cursor={first_cursor}", headers=headers)
+    assert response.status_code == 400
+
+
+def test_dict_search_facets_optional():
+    headers = get_auth_headers()
+    seed_word()
+    response = client.get("/api/dict/search?query=你好&mode=simplified", headers=headers)
+    payload = response.json()
+    assert payload["facets"]["hsk"].get("1", 0) >= 1
+    assert sum(payload["facets"]["hsk"].values()) <= payload["total"]
+
+    response = client.get("/api/dict/search?query=你好&mode=simplified&facets=false", headers=headers)
+    assert response.status_code == 200
+    lean = response.json()
+    assert lean["facets"] is None
+    assert lean["total"] == payload["total"]
+
+
+def test_dict_search_cache_generation():
+    headers = get_auth_headers()
+    seed_word()
+    url = "/api/dict/search?query=缓存&mode=simplified&facets=false"
+    before = client.get("/api/dict/cache", headers=headers).json()
+    assert client.get(url, headers=headers).json()["total"] == 0
+    assert client.get(url, headers=headers).json()["total"] == 0
+    stats = client.get("/api/dict/cache", headers=headers).json()
+    assert stats["hits"] == before["hits"] + 1
+    assert stats["misses"] == before["misses"] + 1
+
+    # New rows move the database marker, as an import in another process
+    # would; edits that keep it are seen once the generation is bumped.
+    db = SessionLocal()
+    try:
+        word = DictWord(simplified="缓存", pinyin="huan3 cun2", pinyin_normalized="huan cun", meanings="[]")
+        db.add(word)
+        db.commit()
+        assert client.get(url, headers=headers).json()["total"] == 1
+        word.simplified = "存储"
+        db.commit()
+    finally:
+        db.close()
+    assert client.get(url, headers=headers).json()["total"] == 1
+
+    bump_dict_generation()
+    assert client.get(url, headers=headers).json()["total"] == 0
+
+
+def test_dict_snapshot_matches_sqlite():
+    headers = get_auth_headers()
+    seed_word()
+    urls = [
+        "/api/dict/search?query=你好&mode=simplified&match=exact",
+        "/api/dict/search?query=ni&mode=pinyin&match=prefix&hsk=1",
+        "/api/dict/search?hsk=1&pos=interjection"
+    ]
+    bump_dict_generation()
+    expected = [client.get(url, headers=headers).json() for url in urls]
+    assert expected[0]["total"] >= 1
+
+    db = SessionLocal()
+    try:
+        marker = dict_marker(db)
+        build_snapshot(db, marker)
+        assert get_snapshot(marker) is not None
+    finally:
+        db.close()
+    bump_dict_generation()
+    assert [client.get(url, headers=headers).json() for url in urls] == expected
+
+
+def test_dict_search_han_substring():
+    headers = get_auth_headers()
+    db = SessionLocal()
+    try:
+        if not db.query(DictWord).filter(DictWord.simplified == "大学生").first():
+            db.add(DictWord(simplified="大学生", traditional="大學生", pinyin="da4 xue2 sheng1", meanings="[]"))
+            db.commit()
+    finally:
+        db.close()
+    bump_dict_generation()
+
+    for query, mode in [("学", "simplified"), ("学生", "simplified"), ("學", "traditional"), ("大學生", "all")]:
+        response = client.get(f"/api/dict/search?query={query}&mode={mode}", headers=headers)
+        assert response.status_code == 200
+        assert any(item["simplified"] == "大学生" for item in response.json()["results"]), query
+
+    response = client.get("/api/dict/search?query=大生&mode=simplified", headers=headers)
+    assert not any(item["simplified"] == "大学生" for item in response.json()["results"])
+
+
+def test_dict_search_unspaced_pinyin():
+    headers = get_auth_headers()
+    seed_word()
+    db = SessionLocal()
+    try:
+        if not db.query(DictWord).filter(DictWord.simplified == "西安").first():
+            db.add(DictWord(simplified="西安", pinyin="Xi1 an1", pinyin_normalized="xi an", meanings="[]"))
+            db.commit()
+        assert db.query(DictWord).filter(DictWord.simplified == "你好").one().pinyin_syllables == "ni hao"
+    finally:
+        db.close()
+    bump_dict_generation()
+
+    for query in ["nihao", "ni3hao3", "nǐhǎo", "ni hao", "nih"]:
+        response = client.get(f"/api/dict/search?query={query}&mode=pinyin", headers=headers)
+        assert response.status_code == 200
+        assert any(item["simplified"] == "你好" for item in response.json()["results"]), query
+
+    # "xian" also reads as "xi an".
+    response = client.get("/api/dict/search?query=xian&mode=pinyin", headers=headers)
+    assert any(item["simplified"] == "西安" for item in response.json()["results"])
+
+
+def test_dict_key_lookup_uses_indexes():
+    # The SQLite fallback for keyed lookups must not scan dict_word.
+    db = SessionLocal()
+    try:
+        for mode, match in [("pinyin", "exact"), ("pinyin", "prefix"), ("all", "exact"), ("all", "prefix")]:
+            params: dict = {}
+            clause = dict_api._key_clause("ni3hao3", mode, match, params)
+            plan = db.execute(text(f"EXPLAIN QUERY PLAN SELECT d.id FROM dict_word d WHERE {clause}"), params).all()
+            details = [row[-1] for row in plan]
+            assert not any(detail.startswith("SCAN d") for detail in details), (mode, match, details)
+            if mode == "pinyin":
+                assert any("idx_dict_word_pinyin_compact" in detail for detail in details), details
+    finally:
+        db.close()
+
+
+def test_dict_suggest_prefixes():
+    headers = get_auth_headers()
+    seed_word()
+    bump_dict_generation()
+
+    # Without a current index the endpoint answers from SQLite.
+    response = client.get("/api/dict/suggest?query=nih", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["results"][0]["simplified"] == "你好"
+
+    index = rebuild_suggest_index()
+    db = SessionLocal()
+    try:
+        assert get_suggest_index(dict_marker(db)) is index
+        # Rows written by another process move the marker without a bump.
+        db.add(DictWord(simplified="建议", pinyin="jian4 yi4", meanings="[]"))
+        db.commit()
+        assert get_suggest_index(dict_marker(db)) is None
+    finally:
+        db.close()
+    index = rebuild_suggest_index()
+    for query, match in [("你", "simplified"), ("nǐhǎ", "pinyin"), ("nh", "initials"), ("hel", "english")]:
+        response = client.get(f"/api/dict/suggest?query={query}&limit=5", headers=headers)
+        assert response.status_code == 200
+        results = response.json()["results"]
+        hit = next(item for item in results if item["simplified"] == "你好")
+        assert hit["match"] == match
+        assert hit["gloss"] == "hello"
+
+
+def test_dict_search_relevance_ranking():
+    headers = get_auth_headers()
+    db = SessionLocal()
+    try:
+        if not db.query(DictWord).filter(DictWord.simplified == "好").first():
+            db.add_all(
+                [
+                    DictWord(simplified="良品", pinyin="liang2 pin3", meanings=json.dumps(["goods of good quality"])),
+                    DictWord(simplified="好看", pinyin="hao3 kan4", meanings=json.dumps(["good-looking"]), frequency=20.0),
+                    DictWord(simplified="好", pinyin="hao3", meanings=json.dumps(["good", "well"]), hsk_level=1, frequency=90.0),
+                    DictWord(simplified="善", pinyin="shan4", meanings=json.dumps(["good", "kind"]), hsk_level=6)
+                ]
+            )
+            db.commit()
+    finally:
+        db.close()
+    bump_dict_generation()
+
+    response = client.get("/api/dict/search?query=good&mode=meanings&sort=relevance", headers=headers)
+    assert response.status_code == 200
+    ranked = [item["simplified"] for item in response.json()["results"]]
+    assert ranked[:2] == ["好", "善"]
+    assert set(ranked) >= {"良品", "好看"}
+
+    seen = []
+    cursor = None
+    while True:
+        url = "/api/dict/search?query=good&mode=meanings&sort=relevance&limit=1&facets=false"
+        response = client.get(url + (f"&cursor={cursor}" if cursor else ""), headers=headers)
+        payload = response.json()
+        seen.extend(item["simplified"] for item in payload["results"])
+        cursor = payload["next_cursor"]
+        if not cursor:
+            break
+    assert seen == ranked
+
+    # Exact headword hits fill the first page ahead of longer words.
+    db = SessionLocal()
+    try:
+        if not db.query(DictWord).filter(DictWord.simplified == "同").first():
+            db.add_all(
+                [
+                    DictWord(simplified="同学", meanings="[]", frequency=99.0),
+                    DictWord(simplified="同", meanings="[]", frequency=1.0),
+                    DictWord(simplified="同", meanings="[]", frequency=50.0)
+                ]
+            )
+            db.commit()
+    finally:
+        db.close()
+    bump_dict_generation()
+    response = client.get("/api/dict/search?query=同&mode=simplified&sort=relevance&limit=2", headers=headers)
+    payload = response.json()
+    assert [item["frequency"] for item in payload["results"]] == [50.0, 1.0]
+    assert payload["total"] == 3
+
+    response = client.get("/api/dict/search?query=good&sort=best", headers=headers)
+    assert response.status_code == 400
+
+
+def test_dict_search_capped_total_and_deadline(monkeypatch):
+    headers = get_auth_headers()
+    db = SessionLocal()
+    try:
+        if not db.query(DictWord).filter(DictWord.simplified == "测0").first():
+            db.add_all(DictWord(simplified=f"测{idx}", meanings="[]", hsk_level=1) for idx in range(4))
+            db.commit()
+    finally:
+        db.close()
+    bump_dict_generation()
+
+    response = client.get("/api/dict/search?query=测&mode=simplified&limit=4", headers=headers)
+    payload = response.json()
+    assert payload["facets"]["hsk"] == {"1": 4}
+    assert payload["facets_approximate"] is False
+
+    # Past the cap the facets only cover the first cap + 1 hits, and say so.
+    monkeypatch.setattr(dict_api, "settings", replace(dict_api.settings, search_count_cap=2))
+    response = client.get("/api/dict/search?query=测&mode=simplified&limit=3", headers=headers)
+    payload = response.json()
+    assert len(payload["results"]) == 3
+    assert payload["total_estimate"] == 2
+    assert payload["total_is_exact"] is False
+    assert payload["facets"]["hsk"] == {"1": 3}
+    assert payload["facets_approximate"] is True
+    second = client.get(f"/api/dict/search?query=测&mode=simplified&limit=3&cursor={payload['next_cursor']}", headers=headers)
+    assert second.json()["total_is_exact"] is False
+
+    # Every statement overruns a near-zero budget: the request still answers.
+    monkeypatch.setattr(app_db, "PROGRESS_STEPS", 1)
+    monkeypatch.setattr(dict_api, "settings", replace(dict_api.settings, search_deadline_ms=1e-6))
+    response = client.get("/api/dict/search?query=测&mode=simplified&facets=false", headers=headers)
+    assert response.status_code == 200
+    payload = response.json()
+    assert payload["partial"] is True
+    assert payload["total_is_exact"] is False
+    assert payload["results"] == []
+
+    # Partial answers are not cached.
+    monkeypatch.undo()
+    response = client.get("/api/dict/search?query=测&mode=simplified&facets=false", headers=headers)
+    assert response.json()["partial"] is False
+    assert response.json()["total"] == 4
+
+
+def test_dict_words_batch():
+    headers = get_auth_headers()
+    seed_word()
+    db = SessionLocal()
+    try:
+        if not db.query(DictWord).filter(DictWord.simplified == "行").first():
+            db.add_all(
+                [
+                    DictWord(simplified="行", pinyin="xing2", meanings=json.dumps(["to walk"])),
+                    DictWord(simplified="行", pinyin="hang2", meanings=json.dumps(["row"]))
+                ]
+            )
+            db.commit()
+        hello = db.query(DictWord).filter(DictWord.simplified == "你好").first().id
+        walk, row = [word.id for word in db.query(DictWord).filter(DictWord.simplified == "行").order_by(DictWord.id)]
+    finally:
+        db.close()
+
+    response = client.get(f"/api/dict/words?ids={row},{hello},999999,{row}", headers=headers)
+    assert response.status_code == 200
+    payload = response.json()
+    assert [item["id"] for item in payload["results"]] == [row, hello]
+    assert payload["missing_ids"] == [999999]
+
+    body = {
+        "ids": [hello],
+        "keys": [
+            {"simplified": "你好", "pinyin": "nǐ hǎo"},
+            {"simplified": "行", "pinyin": "XING2"},
+            {"simplified": "行"},
+            {"simplified": "没有"}
+        ]
+    }
+    response = client.post("/api/dict/words", json=body, headers=headers)
+    assert response.status_code == 200
+    payload = response.json()
+    assert [item["id"] for item in payload["results"]] == [hello, walk, row]
+    assert payload["missing_keys"] == [{"simplified": "没有", "pinyin": None}]
+
+    response = client.get("/api/dict/words?ids=1,two", headers=headers)
+    assert response.status_code == 400
+    response = client.post("/api/dict/words", json={"ids": list(range(1500)), "keys": [{"simplified": "行"}] * 600}, headers=headers)
+    assert response.status_code == 400
+
+
+def seed_segment_words():
+    db = SessionLocal()
+    try:
+        if not db.query(DictWord).filter(DictWord.simplified == "中国人").first():
+            db.add_all(
+                [
+                    DictWord(simplified="中国", pinyin="Zhong1 guo2", meanings=json.dumps(["China"]), hsk_level=1),
+                    DictWord(simplified="中国人", pinyin="Zhong1 guo2 ren2", meanings=json.dumps(["Chinese person"])),
+                    DictWord(simplified="人民", pinyin="ren2 min2", meanings=json.dumps(["the people"]), hsk_level=5)
+                ]
+            )
+            db.commit()
+            bump_dict_generation()
+    finally:
+        db.close()
+
+
+def test_dict_segment_maximal_match():
+    headers = get_auth_headers()
+    seed_segment_words()
+
+    body = {"text": "中国人，人民。 ok"}
+    response = client.post("/api/dict/segment", json=body, headers=headers)
+    assert response.status_code == 200
+    payload = response.json()
+    tokens = payload["tokens"]
+    assert [token["text"] for token in tokens] == ["中国人", "，", "人民", "。 ok"]
+    assert [token["start"] for token in tokens] == [0, 3, 4, 6]
+    assert tokens[2]["pinyin"] == "ren2 min2"
+    assert tokens[2]["hsk_level"] == 5
+    assert tokens[2]["gloss"] == "the people"
+    assert tokens[1]["id"] is None
+    assert payload["matched_chars"] == 5
+
+    response = client.post("/api/dict/segment", json={**body, "stream": True}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    streamed = [json.loads(line) for line in response.text.splitlines()]
+    assert [token["text"] for token in streamed] == [token["text"] for token in tokens]
+
+    # Words written by another process are picked up without a bump.
+    db = SessionLocal()
+    try:
+        if not db.query(DictWord).filter(DictWord.simplified == "国人").first():
+            db.add(DictWord(simplified="国人", pinyin="guo2 ren2", meanings=json.dumps(["compatriots"])))
+            db.commit()
+    finally:
+        db.close()
+    response = client.post("/api/dict/segment", json={"text": "国人"}, headers=headers)
+    assert [token["id"] is not None for token in response.json()["tokens"]] == [True]
+
+
+def test_mine_cards_from_text():
+    headers = get_auth_headers()
+    seed_segment_words()
+    collection = client.post("/api/collections/", json={"name": "Article", "description": ""}, headers=headers).json()
+    card = {"simplified": "中国", "pinyin": "zhong1 guo2", "collection_ids": []}
+    assert client.post("/api/cards/", json=card, headers=headers).status_code == 200
+
+    body = {"text": "中国，人民。人民！", "collection_id": collection["id"]}
+    response = client.post("/api/cards/mine", json=body, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {
+        "collection_id": collection["id"],
+        "chars": 9,
+        "words": 2,
+        "created": 1,
+        "existing": 1,
+        "duplicates": 0
+    }
+
+    cards = client.get(f"/api/cards/?collection={collection['id']}", headers=headers).json()
+    assert [(item["simplified"], item["meanings"]) for item in cards] == [("人民", ["the people"])]
+    assert cards[0]["created_from_dict_id"] is not None
+
+    response = client.post("/api/cards/mine", json=body, headers=headers)
+    assert response.json()["created"] == 0
+    assert response.json()["existing"] == 2
+
+    response = client.post("/api/cards/mine", json={**body, "collection_id": 999999}, headers=headers)
+    assert response.status_code == 404
+
+
+def test_import_streams_chunks_and_dedupes(tmp_path):
+    headers = get_auth_headers()
+    source = tmp_path / "cedict.u8"
+    source.write_text(
+        "# comment\n"
+        "導入甲 导入甲 [dao3 ru4 jia3] /first/\n"
+        "導入乙 导入乙 [dao3 ru4 yi3] /second/\n"
+        "導入丙 导入丙 [dao3 ru4 bing3] /third/\n"
+        "導入甲 导入甲 [dao3 ru4 jia3] /again/first/\n"
+        "not a cedict line\n",
+        encoding="utf-8"
+    )
+    stats = ImportStats(parsed=0, normalized=0, deduped=0, inserted=0)
+    db = SessionLocal()
+    try:
+        # Chunks of two put the duplicate in a later chunk than its first row.
+        inserted = insert_dict_entries(
+            db, normalize_entries(parse_cedict_file(source), "numbers"), dedupe=True, stats=stats, chunk_size=2
+        )
+        rows = db.query(DictWord).filter(DictWord.simplified == "导入甲").all()
+    finally:
+        db.close()
+    assert inserted == 3
+    assert (stats.normalized, stats.deduped, stats.inserted) == (4, 3, 3)
+    assert len(rows) == 1
+    assert json.loads(rows[0].meanings) == ["again", "first"]
+    assert rows[0].pinyin_syllables == "dao ru jia"
+
+    # Search indexes were filled once at the end and the triggers are back.
+    db = SessionLocal()
+    try:
+        db.add(DictWord(simplified="导入丁", pinyin="dao3 ru4 ding1", meanings=json.dumps(["fourth"])))
+        db.commit()
+    finally:
+        db.close()
+    bump_dict_generation()
+    searches = [
+        ("second", "meanings", "导入乙"),
+        ("入丙", "simplified", "导入丙"),
+        ("fourth", "meanings", "导入丁"),
+        ("入丁", "simplified", "导入丁")
+    ]
+    for query, mode, expected in searches:
+        response = client.get(f"/api/dict/search?query={query}&mode={mode}", headers=headers)
+        assert [item["simplified"] for item in response.json()["results"]] == [expected], query
+
+
+
+def test_cards_from_dict_counts_duplicates_apart(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'mine.db'}")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        user = User(username="miner", hashed_password="x")
+        collection = Collection(name="Mined", owner=user)
+        dry = DictWord(simplified="干", traditional="乾", pinyin="gan1", meanings="[]")
+        work = DictWord(simplified="干", traditional="幹", pinyin="gan4", meanings="[]")
+        db.add_all([user, collection, dry, work])
+        db.commit()
+
+        # The same id twice, then a second entry for the same headword:
+        # nothing was owned before, so nothing counts as existing.
+        ids = [dry.id, dry.id, work.id]
+        assert create_cards_from_dict(db, user.id, collection.id, ids) == (1, 0, 1)
+        assert create_cards_from_dict(db, user.id, collection.id, ids) == (0, 2, 0)
+    engine.dispose()
+
+
+def test_import_diff_keeps_ids(tmp_path):
+    # A diff deletes every key missing from the file, so it gets a database
+    # of its own rather than the shared one.
+    engine = create_engine(f"sqlite:///{tmp_path / 'diff.db'}")
+    Base.metadata.create_all(bind=engine)
+    apply_sqlite_migrations(engine)
+    source = tmp_path / "cedict.u8"
+
+    def sync(lines, chunk_size=2):
+        source.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+        stats = ImportStats(parsed=0, normalized=0, deduped=0, inserted=0)
+        with Session(engine) as db:
+            diff_dict_entries(db, normalize_entries(parse_cedict_file(source), "numbers"), stats, chunk_size)
+            rows = db.query(DictWord).order_by(DictWord.id).all()
+            words = {(row.simplified, row.traditional, row.pinyin): row for row in rows}
+            found = db.execute(
+                text("SELECT rowid FROM dict_word_fts WHERE dict_word_fts MATCH 'changed'")
+            ).scalars().all()
+        return stats, words, found
+
+    stats, before, _ = sync([
+        "乾 干 [gan1] /dry/",
+        "幹 干 [gan4] /to do/",
+        "同步 同步 [tong2 bu4] /synchronous/",
+        "刪除 删除 [shan1 chu2] /to delete/",
+        "不變 不变 [bu4 bian4] /unchanged/"
+    ])
+    assert (stats.inserted, stats.updated, stats.deleted, stats.unchanged) == (5, 0, 0, 0)
+    assert before[("干", "乾", "gan1")].content_hash
+
+    # Same simplified and pinyin with another traditional form is its own key.
+    stats, after, found = sync([
+        "乾 干 [gan1] /dry/",
+        "幹 干 [gan4] /to do/",
+        "同步 同步 [tong2 bu4] /changed/",
+        "新增 新增 [xin1 zeng1] /added/",
+        "不變 不变 [bu4 bian4] /unchanged/",
+        "乾 干 [gan1] /dried up/",
+        "幹 干 [gan1] /dry/"
+    ])
+    assert (stats.inserted, stats.updated, stats.deleted, stats.unchanged) == (2, 2, 1, 2)
+    assert ("删除", "刪除", "shan1 chu2") not in after
+    for key in [("干", "乾", "gan1"), ("干", "幹", "gan4"), ("同步", "同步", "tong2 bu4"), ("不变", "不變", "bu4 bian4")]:
+        assert after[key].id == before[key].id
+    assert after[("不变", "不變", "bu4 bian4")].last_modified == before[("不变", "不變", "bu4 bian4")].last_modified
+    assert json.loads(after[("干", "乾", "gan1")].meanings) == ["dried up", "dry"]
+    assert found == [before[("同步", "同步", "tong2 bu4")].id]
+    engine.dispose()
+
+
+def test_import_replace_swaps_staging_tables(tmp_path):
+    # Replaces the whole dictionary, so it runs on a database of its own.
+    engine = create_engine(f"sqlite:///{tmp_path / 'swap.db'}")
+    Base.metadata.create_all(bind=engine)
+    apply_sqlite_migrations(engine)
+    source = tmp_path / "cedict.u8"
+
+    def entries(lines):
+        source.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+        return normalize_entries(parse_cedict_file(source), "numbers")
+
+    def failing(lines):
+        yield from entries(lines)
+        raise RuntimeError("disk went away")
+
+    def catalog(db):
+        return {
+            row[0]: row[1]
+            for row in db.execute(text("SELECT name, type FROM sqlite_master WHERE tbl_name LIKE 'dict_word%'"))
+        }
+
+    with Session(engine) as db:
+        initial = catalog(db)
+        stage_dict_entries(db, entries(["舊詞 旧词 [jiu4 ci2] /old word/"]))
+        before = catalog(db)
+        try:
+            stage_dict_entries(db, failing(["新詞 新词 [xin1 ci2] /new word/"]))
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("import should have failed")
+        assert catalog(db) == before
+        assert [row.simplified for row in db.query(DictWord)] == ["旧词"]
+
+        stats = ImportStats(parsed=0, normalized=0, deduped=0, inserted=0)
+        inserted = stage_dict_entries(
+            db,
+            entries(["新詞 新词 [xin1 ci2] /new word/", "換 换 [huan4] /swap/", "新詞 新词 [xin1 ci2] /fresh/"]),
+            dedupe=True,
+            stats=stats,
+            chunk_size=2
+        )
+        assert inserted == 2
+        assert (stats.normalized, stats.deduped, stats.inserted) == (3, 2, 2)
+        assert sorted(row.simplified for row in db.query(DictWord)) == ["换", "新词"]
+        names = catalog(db)
+        assert not [name for name in names if name.endswith(("_staging", "_retired"))]
+        # Index names alternate between swaps; triggers are back on the new table.
+        assert "idx_dict_word_simplified" in initial
+        assert "idx_dict_word_simplified_swap" in before
+        assert "idx_dict_word_simplified" in names
+        assert {"dict_word_ai", "dict_word_ngram_ai"} <= set(names)
+        assert db.execute(text("SELECT COUNT(*) FROM sqlite_stat1 WHERE tbl = 'dict_word'")).scalar() > 0
+
+        db.add(DictWord(simplified="后加", pinyin="hou4 jia1", meanings=json.dumps(["added later"])))
+        db.commit()
+        found = db.execute(
+            text("SELECT simplified FROM dict_word_fts WHERE dict_word_fts MATCH :query ORDER BY rowid"),
+            {"query": "fresh OR later"}
+        ).scalars().all()
+        assert found == ["新词", "后加"]
+        ngrams = db.execute(
+            text("SELECT COUNT(*) FROM dict_word_ngram WHERE gram = '换' AND field = 0")
+        ).scalar()
+        assert ngrams == 1
+        db.execute(text("INSERT INTO dict_word_fts(dict_word_fts) VALUES('integrity-check')"))
+
+    # Restarting does not add indexes under the names the swap freed.
+    apply_sqlite_migrations(engine)
+    with Session(engine) as db:
+        assert "idx_dict_word_simplified_swap" not in catalog(db)
+    engine.dispose()
+
+
+def test_import_job_leases(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(bind=engine)
+    apply_sqlite_migrations(engine)
+    with Session(engine) as db:
+        first, second, third = (
+            create_import_job(db, "file", "cedict", None, "numbers", True, False).id for _ in range(3)
+        )
+
+        # Jobs are claimed oldest first, each by exactly one worker.
+        assert claim_next_job(db, "a", 60, 2) == first
+        # The limit counts live leases held by any process.
+        assert claim_next_job(db, "b", 60, 1) is None
+        assert claim_next_job(db, "b", 60, 2) == second
+        assert renew_lease(db, first, "a", 60)
+        assert not renew_lease(db, first, "b", 60)
+        assert not should_stop(db, first, "a")
+
+        # One writer at a time; the slot frees when its lease expires.
+        assert acquire_writer(db, first, "a")
+        assert not acquire_writer(db, second, "b")
+        db.query(ImportJob).filter(ImportJob.id == first).update(
+            {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)}
+        )
+        db.commit()
+        assert acquire_writer(db, second, "b")
+
+        # The expired job is requeued and its old worker told to stop.
+        assert recover_stale_jobs(db) == 1
+        assert should_stop(db, first, "a")
+        job = db.get(ImportJob, first)
+        db.refresh(job)
+        assert (job.status, job.lease_owner, job.attempts) == ("queued", None, 1)
+
+        # A job that keeps losing its worker eventually fails.
+        job.status, job.attempts = "running", MAX_IMPORT_ATTEMPTS
+        db.commit()
+        assert recover_stale_jobs(db) == 1
+        db.refresh(job)
+        assert job.status == "error"
+
+        # Queued jobs cancel at once, running ones at the worker's next renewal.
+        assert cancel_import_job(db, db.get(ImportJob, third)).status == "cancelled"
+        assert claim_next_job(db, "a", 60, 2) is None
+        job = cancel_import_job(db, db.get(ImportJob, second))
+        assert (job.status, job.cancel_requested) == ("writing", True)
+        assert should_stop(db, second, "b")
+    engine.dispose()
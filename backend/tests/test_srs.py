@@ -1,7 +1,20 @@
-from datetime import datetime
+import json
+from datetime import datetime, timedelta
+from itertools import product
 
-from app.models import Card
-from app.srs import apply_sm2
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import forecast
+from app.db import Base
+from app.fsrs import DEFAULT_WEIGHTS, ReviewHistory, fit_weights, log_loss
+from app.models import Card, StudyLog, User
+from app.scheduler import recommend
+from app.services import srs as srs_service
+from app.services.replay import fold_logs, replay_user_logs, replay_users
+from app.srs import FSRSEngine, SchedulerEngine, apply_sm2, apply_sm2_batch, engine_from_settings
 
 
 def test_apply_sm2_resets_on_low_quality():
@@ -24,3 +37,218 @@ def test_apply_sm2_resets_on_low_quality():
     assert updated.repetitions == 0
     assert updated.interval_days == 1
     assert updated.easiness >= 1.3
+
+
+def test_apply_sm2_batch_matches_apply_sm2():
+    now = datetime(2024, 1, 1, 8, 30)
+    states = list(product([1.3, 1.7, 2.36, 2.5, 3.1], [0, 1, 6, 15, 47], [0, 1, 2, 5], range(6)))
+
+    result = apply_sm2_batch(
+        [state[0] for state in states],
+        [state[1] for state in states],
+        [state[2] for state in states],
+        [state[3] for state in states],
+        now
+    )
+    next_due = result.next_due.tolist()
+
+    for pos, (easiness, interval_days, repetitions, quality) in enumerate(states):
+        card = Card(easiness=easiness, interval_days=interval_days, repetitions=repetitions)
+        apply_sm2(card, quality=quality, now=now)
+        assert result.easiness[pos] == card.easiness
+        assert result.interval_days[pos] == card.interval_days
+        assert result.repetitions[pos] == card.repetitions
+        assert next_due[pos] == card.next_due
+
+
+def test_fold_logs_matches_sequential_apply_sm2():
+    base = datetime(2024, 1, 1)
+    logs = [
+        (1, base, 5),
+        (1, base + timedelta(days=1), 2),
+        (1, base + timedelta(days=2), 4),
+        (2, base, 1),
+        (3, base, 5),
+        (3, base + timedelta(days=1), 5),
+        (3, base + timedelta(days=7), 3)
+    ]
+
+    updates = fold_logs(
+        np.array([log[0] for log in logs], dtype=np.int64),
+        np.array([log[1] for log in logs], dtype="datetime64[us]"),
+        np.array([log[2] for log in logs], dtype=np.int64),
+        now=base
+    )
+
+    by_id = {update["id"]: update for update in updates}
+    for card_id in (1, 2, 3):
+        card = Card(easiness=2.5, interval_days=0, repetitions=0)
+        for log_card_id, timestamp, ease in logs:
+            if log_card_id == card_id:
+                apply_sm2(card, quality=ease, now=timestamp)
+        assert by_id[card_id]["easiness"] == card.easiness
+        assert by_id[card_id]["interval_days"] == card.interval_days
+        assert by_id[card_id]["repetitions"] == card.repetitions
+        assert by_id[card_id]["next_due"] == card.next_due
+
+    assert by_id[1]["lapse_count"] == 1
+    assert by_id[1]["last_failed_at"] == base + timedelta(days=1)
+    assert by_id[3]["last_failed_at"] is None
+
+
+def test_scheduler_engine_requires_review_batch():
+    class Incomplete(SchedulerEngine):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_fsrs_engine_schedules_longer_after_success():
+    engine = engine_from_settings({"scheduler": {"engine": "fsrs"}})
+    assert isinstance(engine, FSRSEngine)
+
+    now = datetime(2024, 1, 1)
+    card = Card(easiness=2.5, interval_days=0, repetitions=0, next_due=now)
+    engine.review(card, quality=4, now=now)
+    first_interval = card.interval_days
+    assert card.stability is not None and card.difficulty is not None
+
+    engine.review(card, quality=4, now=card.next_due)
+    assert card.interval_days > first_interval
+    assert card.repetitions == 2
+
+    engine.review(card, quality=1, now=card.next_due)
+    assert card.repetitions == 0
+    assert card.interval_days < first_interval * 3
+
+
+def test_fit_weights_lowers_log_loss():
+    rng = np.random.default_rng(7)
+    card_ids, timestamps, quality = [], [], []
+    for card_id in range(200):
+        moment = np.datetime64("2024-01-01T00:00:00", "us")
+        for review in range(8):
+            card_ids.append(card_id)
+            timestamps.append(moment)
+            quality.append(5 if rng.random() < 0.97 else 1)
+            moment += np.timedelta64(int(rng.integers(1, 4 + review * 6)), "D")
+    history = ReviewHistory.from_logs(
+        np.array(card_ids), np.array(timestamps, dtype="datetime64[us]"), np.array(quality)
+    )
+
+    fitted = fit_weights(history, iterations=15)
+
+    assert log_loss(fitted, history)[0] < log_loss(DEFAULT_WEIGHTS, history)[0]
+
+
+def test_refit_keeps_settings_saved_during_fit(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'refit.db'}")
+    Base.metadata.create_all(bind=engine)
+    settings = {"theme": "light", "scheduler": {"engine": "fsrs"}}
+    with Session(engine) as db:
+        user = User(username="refit", hashed_password="x", settings_json=json.dumps(settings))
+        db.add(user)
+        db.commit()
+        user_id = user.id
+
+    def fit_while_user_saves(history, initial=None, iterations=0):
+        with Session(engine) as other:
+            saved = other.get(User, user_id)
+            saved.settings_json = json.dumps({**settings, "theme": "dark"})
+            other.commit()
+        return DEFAULT_WEIGHTS
+
+    monkeypatch.setattr(srs_service, "fit_weights", fit_while_user_saves)
+    with Session(engine) as db:
+        user = db.get(User, user_id)
+        assert srs_service.refit_user_engine(db, user, force=True)
+        saved = json.loads(db.get(User, user_id).settings_json)
+    assert saved["theme"] == "dark"
+    assert saved["scheduler"]["engine"] == "fsrs"
+    assert len(saved["scheduler"]["weights"]) == len(DEFAULT_WEIGHTS)
+    engine.dispose()
+
+
+def test_replay_resets_cards_without_logs(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'replay.db'}")
+    Base.metadata.create_all(bind=engine)
+    created = datetime(2024, 1, 1)
+    with Session(engine) as db:
+        user = User(username="replay", hashed_password="x")
+        db.add(user)
+        db.flush()
+        reviewed, untouched = (
+            Card(
+                owner_id=user.id,
+                simplified=word,
+                pinyin="",
+                easiness=1.3,
+                interval_days=40,
+                repetitions=7,
+                lapse_count=3,
+                last_failed_at=created,
+                next_due=created + timedelta(days=90),
+                created_at=created
+            )
+            for word in ("好", "坏")
+        )
+        db.add_all([reviewed, untouched])
+        db.flush()
+        db.add(StudyLog(user_id=user.id, card_id=reviewed.id, ease=4, timestamp=created + timedelta(days=1)))
+        db.commit()
+
+        stats = replay_user_logs(db, user.id)
+        assert (stats.cards, stats.logs) == (2, 1)
+        db.refresh(reviewed)
+        db.refresh(untouched)
+        assert reviewed.repetitions == 1
+        assert (untouched.easiness, untouched.interval_days, untouched.repetitions) == (2.5, 0, 0)
+        assert (untouched.lapse_count, untouched.last_failed_at, untouched.next_due) == (0, None, created)
+    engine.dispose()
+
+
+def test_replay_ignores_malformed_settings(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'replay.db'}")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        user = User(username="replay", hashed_password="x", settings_json="{not json")
+        db.add(user)
+        db.flush()
+        card = Card(owner_id=user.id, simplified="好", pinyin="")
+        db.add(card)
+        db.flush()
+        db.add(StudyLog(user_id=user.id, card_id=card.id, ease=4, timestamp=datetime(2024, 1, 2)))
+        db.commit()
+
+        stats = replay_user_logs(db, user.id)
+        assert (stats.cards, stats.logs) == (1, 1)
+    engine.dispose()
+
+
+def test_replay_users_invalidates_forecasts_in_caller():
+    # Replays in pool workers must still clear this process's forecast cache.
+    user_ids = [900001, 900002]
+    before = [forecast._versions.get(user_id, 0) for user_id in user_ids]
+    replay_users(user_ids, workers=2)
+    assert [forecast._versions.get(user_id, 0) for user_id in user_ids] == [version + 1 for version in before]
+
+
+def test_recommend_falls_back_to_failed_cards_without_due_date(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'recommend.db'}")
+    Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow()
+    with Session(engine) as db:
+        user = User(username="recommend", hashed_password="x")
+        db.add(user)
+        db.flush()
+        undated = Card(owner_id=user.id, simplified="忘", pinyin="", last_failed_at=now, next_due=None)
+        later = Card(owner_id=user.id, simplified="错", pinyin="", last_failed_at=now - timedelta(days=1))
+        later.next_due = now + timedelta(days=3)
+        db.add_all([undated, later])
+        db.commit()
+        db.execute(Card.__table__.update().where(Card.id == undated.id).values(next_due=None))
+        db.commit()
+
+        assert [card.simplified for card in recommend(db, user.id)] == ["忘", "错"]
+    engine.dispose()
@@ -7,6 +7,9 @@ import type {
   DatasetPack,
   DatasetSelection,
   DictSearchResponse,
+  DictSegmentResponse,
+  DictWordKey,
+  DictWordsResponse,
   ImportJob,
   StudyLog,
   StudyResponse,
@@ -187,12 +190,14 @@ export async function updateDatasetSelection(selected: string[]): Promise<Datase
 
 export async function fetchDatasetPack(
   datasetId: string,
-  offset = 0,
+  cursor: string | null = null,
   limit = 500
 ): Promise<DatasetPack> {
   const url = new URL(`${API_PREFIX}/datasets/pack`);
   url.searchParams.set("dataset_id", datasetId);
-  url.searchParams.set("offset", String(offset));
+  if (cursor) {
+    url.searchParams.set("cursor", cursor);
+  }
   url.searchParams.set("limit", String(limit));
   return request<DatasetPack>(url.toString());
 }
@@ -206,6 +211,8 @@ export async function searchDictionary(params: {
   freq_max?: number;
   limit?: number;
   offset?: number;
+  cursor?: string;
+  sort?: "id" | "relevance";
 }): Promise<DictSearchResponse> {
   const url = new URL(`${API_PREFIX}/dict/search`);
   url.searchParams.set("query", params.query);
@@ -230,9 +237,34 @@ export async function searchDictionary(params: {
   if (params.offset !== undefined) {
     url.searchParams.set("offset", String(params.offset));
   }
+  if (params.cursor) {
+    url.searchParams.set("cursor", params.cursor);
+  }
+  if (params.sort) {
+    url.searchParams.set("sort", params.sort);
+  }
   return request<DictSearchResponse>(url.toString());
 }
 
+export async function getDictionaryWords(payload: {
+  ids?: number[];
+  keys?: DictWordKey[];
+}): Promise<DictWordsResponse> {
+  return request<DictWordsResponse>(`${API_PREFIX}/dict/words`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ ids: payload.ids ?? [], keys: payload.keys ?? [] })
+  });
+}
+
+export async function segmentText(text: string): Promise<DictSegmentResponse> {
+  return request<DictSegmentResponse>(`${API_PREFIX}/dict/segment`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ text })
+  });
+}
+
 export async function syncUserData(payload: {
   cards: Card[];
   collections: Collection[];
@@ -291,6 +323,24 @@ export async function searchCards(params: {
   return request<Card[]>(url.toString());
 }
 
+export async function mineCards(payload: {
+  text: string;
+  collection_id: number;
+}): Promise<{
+  collection_id: number;
+  chars: number;
+  words: number;
+  created: number;
+  existing: number;
+  duplicates: number;
+}> {
+  return request(`${API_PREFIX}/cards/mine`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(payload)
+  });
+}
+
 export async function createCard(
   payload: {
     simplified: string;
@@ -377,6 +427,7 @@ export async function triggerImport(payload: {
   pinyin_style: "numbers" | "diacritics" | "none";
   dedupe: boolean;
   replace: boolean;
+  diff: boolean;
 }): Promise<{ job_id: string; status: string }> {
   return request(`${API_PREFIX}/admin/import/trigger`, {
     method: "POST",
@@ -388,3 +439,7 @@ export async function triggerImport(payload: {
 export async function getImportStatus(jobId: string): Promise<ImportJob> {
   return request(`${API_PREFIX}/admin/import/status/${jobId}`);
 }
+
+export async function cancelImport(jobId: string): Promise<{ job_id: string; status: string }> {
+  return request(`${API_PREFIX}/admin/import/cancel/${jobId}`, { method: "POST" });
+}
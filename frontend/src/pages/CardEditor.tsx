@@ -371,7 +371,8 @@ export default function CardEditor(): JSX.Element {
             const response = await searchDictionary({
               query: trimmed,
               mode: dictMode,
-              limit: 12
+              limit: 12,
+              sort: "relevance"
             });
             if (!active) {
               return;
@@ -120,7 +120,8 @@ export default function Collections(): JSX.Element {
             const response = await searchDictionary({
               query: trimmed,
               mode: dictMode,
-              limit: 10
+              limit: 10,
+              sort: "relevance"
             });
             if (!active) {
               return;
@@ -2,6 +2,7 @@ import React, { useEffect, useMemo, useState } from "react";
 
 import ProgressBar from "../components/ProgressBar";
 import {
+  cancelImport,
   fetchDatasetCatalog,
   fetchDatasetPack,
   getDatasetSelection,
@@ -19,6 +20,8 @@ import {
   storeDatasetEntries
 } from "../utils/indexedDb";
 
+const FINISHED_STATUSES = ["done", "error", "cancelled"];
+
 export default function Import(): JSX.Element {
   const { userData, updateUserData, enqueueAction, isOnline } = useAppStore();
   const [catalog, setCatalog] = useState<DatasetInfo[]>([]);
@@ -58,6 +61,7 @@ export default function Import(): JSX.Element {
   );
   const [dedupe, setDedupe] = useState(true);
   const [replace, setReplace] = useState(false);
+  const [diff, setDiff] = useState(false);
   const [job, setJob] = useState<ImportJob | null>(null);
   const [importStatus, setImportStatus] = useState<string | null>(null);
   const hasDownloadedDatasets = useMemo(
@@ -138,7 +142,7 @@ export default function Import(): JSX.Element {
   }, [selected.length, userData.user.settings]);
 
   useEffect(() => {
-    if (!job || job.status === "done" || job.status === "error") {
+    if (!job || FINISHED_STATUSES.includes(job.status)) {
       return;
     }
 
@@ -237,13 +241,12 @@ export default function Import(): JSX.Element {
 
     let offset = 0;
     let total = 0;
+    let cursor: string | null = null;
 
     try {
       while (true) {
-        const pack = await fetchDatasetPack(dataset.id, offset, pageSize);
-        if (offset === 0) {
-          total = pack.total;
-        }
+        const pack = await fetchDatasetPack(dataset.id, cursor, pageSize);
+        total = pack.total;
         if (pack.items.length === 0) {
           break;
         }
@@ -259,7 +262,8 @@ export default function Import(): JSX.Element {
         };
         setDownloadState((prev) => ({ ...prev, [dataset.id]: updatedMeta }));
         await setDatasetMeta(updatedMeta);
-        if (offset >= total) {
+        cursor = pack.next_cursor ?? null;
+        if (!cursor) {
           break;
         }
       }
@@ -337,7 +341,8 @@ export default function Import(): JSX.Element {
         csv_mapping: fileType === "csv" ? mapping : undefined,
         pinyin_style: pinyinStyle,
         dedupe,
-        replace
+        replace,
+        diff
       });
       setJob({
         job_id: response.job_id,
@@ -353,6 +358,18 @@ export default function Import(): JSX.Element {
     }
   }
 
+  async function handleCancelImport() {
+    if (!job) {
+      return;
+    }
+    try {
+      const response = await cancelImport(job.job_id);
+      setJob({ ...job, status: response.status });
+    } catch (error) {
+      setImportStatus("Unable to cancel the import.");
+    }
+  }
+
   const logs = useMemo(() => job?.logs ?? [], [job]);
   const mappingEntries = useMemo(
     () => Object.entries(mapping) as Array<[keyof CsvMapping, string]>,
@@ -530,6 +547,10 @@ export default function Import(): JSX.Element {
               <input type="checkbox" checked={replace} onChange={() => setReplace((prev) => !prev)} />
               Replace existing dictionary
             </label>
+            <label className="checkbox">
+              <input type="checkbox" checked={diff} onChange={() => setDiff((prev) => !prev)} />
+              Sync changes only (keeps entry ids)
+            </label>
             <button className="primary" onClick={handleTriggerImport} disabled={!fileId}>
               Trigger import
             </button>
@@ -545,7 +566,14 @@ export default function Import(): JSX.Element {
               <div className="inline-meta">
                 <span>Status: {job.status}</span>
                 {job.stats && <span>Inserted: {job.stats.inserted}</span>}
+                {job.stats?.updated !== undefined && <span>Updated: {job.stats.updated}</span>}
+                {job.stats?.deleted !== undefined && <span>Deleted: {job.stats.deleted}</span>}
               </div>
+              {!FINISHED_STATUSES.includes(job.status) && (
+                <button className="secondary" onClick={handleCancelImport}>
+                  Cancel import
+                </button>
+              )}
               {logs.length > 0 ? (
                 <ul className="log-list">
                   {logs.slice(-6).map((log, index) => (
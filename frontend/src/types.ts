@@ -36,6 +36,33 @@ export type DictWord = {
   frequency?: number | null;
 };
 
+export type DictWordKey = {
+  simplified: string;
+  pinyin?: string | null;
+};
+
+export type DictWordsResponse = {
+  results: DictWord[];
+  missing_ids: number[];
+  missing_keys: DictWordKey[];
+};
+
+export type DictSegment = {
+  start: number;
+  text: string;
+  id?: number | null;
+  traditional?: string | null;
+  pinyin?: string | null;
+  gloss?: string | null;
+  hsk_level?: number | null;
+};
+
+export type DictSegmentResponse = {
+  tokens: DictSegment[];
+  chars: number;
+  matched_chars: number;
+};
+
 export type DictFacetCounts = {
   hsk: Record<string, number>;
   pos: Record<string, number>;
@@ -44,7 +71,12 @@ export type DictFacetCounts = {
 export type DictSearchResponse = {
   total: number;
   results: DictWord[];
-  facets: DictFacetCounts;
+  facets: DictFacetCounts | null;
+  next_cursor?: string | null;
+  total_estimate: number;
+  total_is_exact: boolean;
+  facets_approximate: boolean;
+  partial: boolean;
 };
 
 export type DatasetInfo = {
@@ -70,6 +102,7 @@ export type DatasetPack = {
   offset: number;
   limit: number;
   items: DictWord[];
+  next_cursor?: string | null;
 };
 
 export type DatasetMeta = {
@@ -172,6 +205,9 @@ export type ImportJob = {
     normalized: number;
     deduped: number;
     inserted: number;
+    updated?: number;
+    deleted?: number;
+    unchanged?: number;
   } | null;
   created_at: string;
   finished_at?: string | null;
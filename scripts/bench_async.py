@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Compare requests/sec of the sync and async study schedule paths.
+
+Seeds a throwaway SQLite database, then drives the same scheduler query
+through a threadpool endpoint (Session + get_db) and an event-loop endpoint
+(AsyncSession.run_sync) with concurrent in-process requests.
+
+Usage examples:
+  python scripts/bench_async.py
+  python scripts/bench_async.py --requests 2000 --concurrency 64 --threadpool 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark sync vs async DB paths")
+    parser.add_argument("--cards", type=int, default=2000, help="Cards to seed")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per path")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients")
+    parser.add_argument("--threadpool", type=int, default=40, help="Worker threads for sync routes")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="fc-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{Path(workdir) / 'bench.db'}"
+    os.environ["THREADPOOL_SIZE"] = str(args.threadpool)
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+    import httpx
+    from anyio import to_thread
+    from fastapi import Depends, FastAPI
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import Session
+
+    from app.api.study import _schedule
+    from app.db import Base, SessionLocal, engine, get_async_db, get_db
+    from app.migrations import apply_sqlite_migrations
+    from app.models import Card, User
+
+    Base.metadata.create_all(bind=engine)
+    apply_sqlite_migrations(engine)
+    db = SessionLocal()
+    try:
+        user = User(username="bench", hashed_password="x")
+        db.add(user)
+        db.flush()
+        db.add_all(
+            Card(owner_id=user.id, simplified=f"字{i}", pinyin="zi")
+            for i in range(args.cards)
+        )
+        db.commit()
+        user_id = user.id
+    finally:
+        db.close()
+
+    app = FastAPI()
+
+    @app.get("/sync")
+    def sync_schedule(db: Session = Depends(get_db)):
+        return _schedule(db, user_id, 20, None)
+
+    @app.get("/async")
+    async def async_schedule(db: AsyncSession = Depends(get_async_db)):
+        return await db.run_sync(_schedule, user_id, 20, None)
+
+    async def drive(path: str) -> float:
+        to_thread.current_default_thread_limiter().total_tokens = args.threadpool
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            remaining = iter(range(args.requests))
+
+            async def worker() -> None:
+                for _ in remaining:
+                    response = await client.get(path)
+                    response.raise_for_status()
+
+            await client.get(path)
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            return args.requests / (time.perf_counter() - started)
+
+    for path in ("/sync", "/async"):
+        rate = asyncio.run(drive(path))
+        print(f"{path:>6}: {rate:8.1f} req/s ({args.requests} requests, concurrency {args.concurrency})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
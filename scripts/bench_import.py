@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Compare dictionary import throughput of the ORM path and the bulk path.
+
+Seeds a throwaway SQLite database with the app schema (FTS5 and n-gram
+triggers included), then loads the same CC-CEDICT file twice:
+
+  orm   the pre-bulk code path: full entry lists, bulk_save_objects and
+        per-row trigger maintenance, into an empty dict_word
+  bulk  services.importer.run_import with replace, which streams chunks
+        into staging tables, indexes them once and swaps them in
+
+and finally syncs the loaded table against the same file in diff mode,
+which should find every row unchanged and write nothing.
+
+Without --cedict a synthetic file with CC-CEDICT's shape is generated.
+
+Usage examples:
+  python scripts/bench_import.py
+  python scripts/bench_import.py --lines 120000
+  python scripts/bench_import.py --cedict data/raw/cedict_1_0_ts_utf-8_mdbg.txt.gz
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+SYLLABLES = ["ni", "hao", "zhong", "guo", "ren", "min", "xue", "sheng", "da", "xiao", "shui", "huo", "lü", "er"]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark dictionary import paths")
+    parser.add_argument("--cedict", type=Path, help="CC-CEDICT file (.u8 or .gz) to import")
+    parser.add_argument("--lines", type=int, default=120000, help="Synthetic entries when --cedict is not given")
+    parser.add_argument("--no-dedupe", action="store_true", help="Import without merging duplicate entries")
+    return parser.parse_args()
+
+
+def write_synthetic(path: Path, lines: int) -> None:
+    rng = random.Random(1)
+    han = [chr(code) for code in range(0x4E00, 0x4E00 + 3000)]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# synthetic CC-CEDICT\n")
+        for idx in range(lines):
+            size = rng.randint(1, 4)
+            word = "".join(rng.choice(han) for _ in range(size))
+            pinyin = " ".join(f"{rng.choice(SYLLABLES)}{rng.randint(1, 5)}" for _ in range(size))
+            f.write(f"{word} {word} [{pinyin}] /meaning {idx}/sense {idx % 97}/\n")
+
+
+def main() -> int:
+    args = parse_args()
+    workdir = Path(tempfile.mkdtemp(prefix="fc-bench-import-"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'bench.db'}"
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+    from sqlalchemy import text
+
+    from app.db import Base, SessionLocal, engine
+    from app.migrations import apply_sqlite_migrations
+    from app.models import DictWord
+    from app.services.importer import dedupe_entries, normalize_entries, parse_cedict_file, run_import
+
+    source = args.cedict
+    if source is None:
+        source = workdir / "cedict.u8"
+        write_synthetic(source, args.lines)
+    dedupe = not args.no_dedupe
+
+    Base.metadata.create_all(bind=engine)
+    apply_sqlite_migrations(engine)
+
+    def orm_import(db) -> int:
+        entries = list(normalize_entries(parse_cedict_file(source), "numbers"))
+        if dedupe:
+            entries = dedupe_entries(entries)
+        objects = [
+            DictWord(
+                simplified=entry.simplified,
+                traditional=entry.traditional or None,
+                pinyin=entry.pinyin,
+                pinyin_normalized=entry.pinyin_normalized or None,
+                meanings=json.dumps(entry.meanings, ensure_ascii=False),
+                examples=json.dumps(entry.examples, ensure_ascii=False),
+                tags=json.dumps(entry.tags, ensure_ascii=False),
+                hsk_level=entry.hsk_level,
+                pos=entry.pos,
+                frequency=entry.frequency,
+                last_modified=datetime.utcnow()
+            )
+            for entry in entries
+        ]
+        db.bulk_save_objects(objects)
+        db.commit()
+        return len(objects)
+
+    def bulk_import(db) -> int:
+        return run_import(db, source, "cedict", None, "numbers", dedupe, True).inserted
+
+    timings = {}
+    for name, load in (("orm", orm_import), ("bulk", bulk_import)):
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            rows = load(db)
+            elapsed = time.perf_counter() - started
+            # Raises if the full-text index disagrees with dict_word.
+            db.execute(text("INSERT INTO dict_word_fts(dict_word_fts) VALUES('integrity-check')"))
+            ngram_rows = db.execute(text("SELECT COUNT(*) FROM dict_word_ngram")).scalar()
+        finally:
+            db.close()
+        timings[name] = elapsed
+        print(
+            f"{name:>5}: {elapsed:7.2f}s  {rows / elapsed:9.0f} rows/s  "
+            f"({rows} rows, {ngram_rows} n-grams)"
+        )
+    print(f"speedup: {timings['orm'] / timings['bulk']:.1f}x")
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        stats = run_import(db, source, "cedict", None, "numbers", dedupe, False, diff=True)
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+    print(
+        f" diff: {elapsed:7.2f}s  inserted {stats.inserted}, updated {stats.updated}, "
+        f"deleted {stats.deleted}, unchanged {stats.unchanged}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())